@@ -0,0 +1,149 @@
+import json
+
+import falcon
+
+from signer.siglists import BadRegularExpressionLineError, load_siglists
+
+
+class SiglistsAdmin(object):
+    """Show the status of siglists, and reload them on POST requests, in
+    this process at once, and in others when they next poll the siglists
+    directory, see `SiglistsReloader.reload`.
+
+    `reloader` is a `SiglistsReloader`, or None if siglists are not loaded
+    from a directory and thus cannot be reloaded.
+    """
+
+    def __init__(self, registry, reloader=None):
+        self.registry = registry
+        self.reloader = reloader
+
+    def on_get(self, req, resp):
+        if self.reloader is None:
+            status = {
+                'directory': None,
+                'version': self.registry.siglists_version,
+            }
+        else:
+            status = self.reloader.status()
+
+        resp.body = json.dumps(status)
+
+    def on_post(self, req, resp):
+        if self.reloader is None:
+            raise falcon.HTTPBadRequest(
+                'Reloading disabled',
+                'Siglists can only be reloaded when SIGLISTS_DIR is set.'
+            )
+
+        try:
+            self.reloader.reload(notify=True)
+        except (BadRegularExpressionLineError, IOError) as ex:
+            raise falcon.HTTPBadRequest(
+                'Invalid siglists',
+                'Siglists were not reloaded: {}'.format(ex)
+            )
+
+        resp.body = json.dumps(self.reloader.status())
+
+
+class CachesAdmin(object):
+    """Show the counters of the results cache, of the signature tools'
+    caches, and of the frame dictionaries if any. """
+
+    def __init__(self, registry, results, dictionaries=None):
+        self.registry = registry
+        self.results = results
+        self.dictionaries = dictionaries
+
+    def on_get(self, req, resp):
+        classifications = {}
+        for lang in self.registry.languages:
+            cache = getattr(
+                self.registry.get(lang), 'classification_cache', None
+            )
+            if cache is not None:
+                classifications[lang] = cache.stats()
+
+        caches = {
+            'results': self.results.stats(),
+            'frame_classifications': classifications,
+        }
+        if self.dictionaries is not None:
+            caches['frame_dictionaries'] = self.dictionaries.stats()
+        resp.body = json.dumps(caches)
+
+
+class ProfilesAdmin(object):
+    """Show the siglists profiles of a `SignatureToolRegistry`, with the
+    counters of the cache of their tools, and how many times each one was
+    used. """
+
+    def __init__(self, registry):
+        self.registry = registry
+
+    def on_get(self, req, resp):
+        resp.body = json.dumps(self.registry.profile_stats())
+
+
+class AdmissionAdmin(object):
+    """Show the counters of an `admission.ConcurrencyLimiter`. """
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+
+    def on_get(self, req, resp):
+        resp.body = json.dumps(self.limiter.stats())
+
+
+class TopSignaturesAdmin(object):
+    """Show the most frequent signatures counted by a
+    `heavy_hitters.HeavyHitters`, in each window and for each language, or
+    for the `lang` query parameter. `top` is the number of signatures of
+    each window, 10 by default. """
+
+    def __init__(self, heavy_hitters):
+        self.heavy_hitters = heavy_hitters
+
+    def on_get(self, req, resp):
+        top = req.get_param_as_int('top', min=0)
+        if top is None:
+            top = 10
+        resp.body = json.dumps(
+            self.heavy_hitters.status(top, req.get_param('lang'))
+        )
+
+
+class ShadowAdmin(object):
+    """Show the counts of a `ShadowEvaluator`, and load its candidate
+    siglists again on POST requests, which resets them.
+
+    `directory` is that of the candidate siglists, or None if shadow
+    evaluation is disabled.
+    """
+
+    def __init__(self, shadow, directory=None):
+        self.shadow = shadow
+        self.directory = directory
+
+    def on_get(self, req, resp):
+        top = req.get_param_as_int('top', min=0)
+        resp.body = json.dumps(self.shadow.status(top))
+
+    def on_post(self, req, resp):
+        if self.directory is None:
+            raise falcon.HTTPBadRequest(
+                'Shadow evaluation disabled',
+                'Candidate siglists can only be loaded when '
+                'SHADOW_SIGLISTS_DIR is set.'
+            )
+
+        try:
+            self.shadow.set_candidate(load_siglists(self.directory))
+        except (BadRegularExpressionLineError, IOError) as ex:
+            raise falcon.HTTPBadRequest(
+                'Invalid siglists',
+                'Candidate siglists were not loaded: {}'.format(ex)
+            )
+
+        resp.body = json.dumps(self.shadow.status())
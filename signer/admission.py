@@ -0,0 +1,95 @@
+"""Admission control: bounding how many requests are processed at once, and
+how long each one is processed.
+
+During crash storms, requests would otherwise queue up in the server, and
+every caller's latency would suffer. A `ConcurrencyLimiter` lets a few
+requests wait for their turn, and rejects others at once, so that clients
+are told to retry later (with a `503` error and a `Retry-After` header, see
+`middleware.AdmissionControl`) instead of waiting. Limits are those of
+each process, and only apply to processes handling more requests at once
+than they admit: threaded workers, not synchronous ones, which handle one
+request at a time.
+
+Admitted requests get a deadline, past which signature tools stop walking
+frames and return what they have, with a note, see `CSignatureTool`.
+"""
+import threading
+import time
+
+
+def get_deadline(timeout):
+    """Return the time at which processing started now must stop, or None
+    if `timeout` is 0 or None. """
+    if not timeout:
+        return None
+    return time.time() + timeout
+
+
+class ConcurrencyLimiter(object):
+    """Let at most `max_concurrent` requests be processed at once.
+
+    When that many are, at most `max_waiting` others wait for one of them to
+    end, for at most `wait_timeout` seconds, and others are rejected at
+    once. `max_concurrent` being 0 means no limit.
+    """
+
+    def __init__(self, max_concurrent, max_waiting, wait_timeout):
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+
+        self._condition = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        # Requests rejected at once, as too many were waiting.
+        self.rejected = 0
+        # Requests rejected after waiting for `wait_timeout` seconds.
+        self.timed_out = 0
+
+    def acquire(self):
+        """Return True once the caller can be processed, which must then
+        call `release`, or False if it is rejected. """
+        with self._condition:
+            if not self.max_concurrent or self.active < self.max_concurrent:
+                self.active += 1
+                self.admitted += 1
+                return True
+
+            if self.waiting >= self.max_waiting:
+                self.rejected += 1
+                return False
+
+            self.waiting += 1
+            try:
+                end = time.time() + self.wait_timeout
+                while self.active >= self.max_concurrent:
+                    remaining = end - time.time()
+                    if remaining <= 0:
+                        self.timed_out += 1
+                        return False
+                    self._condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+
+            self.active += 1
+            self.admitted += 1
+            return True
+
+    def release(self):
+        """Let the next waiting request, if any, be processed. """
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'max_waiting': self.max_waiting,
+                'active': self.active,
+                'waiting': self.waiting,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+            }
@@ -0,0 +1,142 @@
+"""The signing service, as a WSGI application built by `create_app`.
+
+The application is built, and its settings read, when `create_app` is
+called, so that command line tools importing modules of this package only
+build what they use. Servers load `signer.wsgi:app`, which builds it once.
+"""
+import logging
+
+import falcon
+
+from signer import (
+    admin,
+    admission,
+    heavy_hitters,
+    media,
+    metrics,
+    middleware,
+    settings,
+    shadow,
+    signer_service,
+)
+from signer.cache import LRUCache
+from signer.frame_dictionary import FrameDictionaryStore
+from signer.languages.registry import registry
+from signer.siglists import load_siglists
+from signer.siglists.profiles import load_profiles
+from signer.siglists.reloader import SiglistsReloader
+
+
+def create_app():
+    """Return the WSGI application, configured from `settings`.
+
+    Signature tools are built, and siglists and profiles loaded, before
+    returning, so that workers forked after the application was loaded
+    (`gunicorn --preload`) share them.
+    """
+    logging.basicConfig(level=settings.LOG_LEVEL)
+
+    reloader = None
+    if settings.SIGLISTS_DIR:
+        registry.set_siglists(load_siglists(settings.SIGLISTS_DIR))
+        reloader = SiglistsReloader(
+            registry,
+            settings.SIGLISTS_DIR,
+            settings.SIGLISTS_POLL_INTERVAL,
+        )
+
+    # Tools of profiles are built when first used.
+    if settings.SIGLIST_PROFILES_DIR:
+        registry.set_profiles(load_profiles(settings.SIGLIST_PROFILES_DIR))
+
+    # Sign a sample of crashes with candidate siglists, if any.
+    shadow_evaluator = shadow.ShadowEvaluator(
+        settings.SHADOW_SAMPLE_RATE,
+        settings.SHADOW_QUEUE_SIZE,
+        settings.SHADOW_MAX_DIVERGENCES,
+    )
+    if settings.SHADOW_SIGLISTS_DIR:
+        shadow_evaluator.set_candidate(
+            load_siglists(settings.SHADOW_SIGLISTS_DIR)
+        )
+
+    # Count the most frequent signatures of recent crashes.
+    top_signatures = heavy_hitters.HeavyHitters(
+        settings.HEAVY_HITTERS_ENABLED,
+        settings.HEAVY_HITTERS_WINDOWS,
+        settings.HEAVY_HITTERS_BUCKET_DURATION,
+        settings.HEAVY_HITTERS_SKETCH_WIDTH,
+        settings.HEAVY_HITTERS_SKETCH_DEPTH,
+        settings.HEAVY_HITTERS_CAPACITY,
+        settings.HEAVY_HITTERS_QUEUE_SIZE,
+    )
+
+    # Build all signature tools now, so that they are shared by all workers
+    # when the app is preloaded (`gunicorn --preload`) instead of being built
+    # again on each request.
+    registry.warm_up()
+
+    # Signing requests wait for their turn before their body is read.
+    limiter = admission.ConcurrencyLimiter(
+        settings.MAX_CONCURRENT_REQUESTS,
+        settings.MAX_WAITING_REQUESTS,
+        settings.ADMISSION_WAIT_TIMEOUT,
+    )
+    app_middleware = [
+        middleware.RequireJSON(),
+        middleware.AdmissionControl(
+            limiter,
+            settings.ADMISSION_RETRY_AFTER,
+            settings.REQUEST_DEADLINE,
+        ),
+        middleware.JSONTranslator(),
+    ]
+    if reloader is not None:
+        app_middleware.append(middleware.PollSiglists(reloader))
+
+    # Results and frame dictionaries are shared by single and batch signing.
+    results = LRUCache(settings.RESULT_CACHE_SIZE, settings.RESULT_CACHE_TTL)
+    dictionaries = FrameDictionaryStore(settings.FRAME_DICTIONARY_CACHE_SIZE)
+
+    app = falcon.API(middleware=app_middleware)
+    app.set_error_serializer(media.serialize_error)
+    app.add_route(
+        '/sign',
+        signer_service.SignerService(
+            results=results,
+            dictionaries=dictionaries,
+            shadow=shadow_evaluator,
+            heavy_hitters=top_signatures,
+        )
+    )
+    app.add_route(
+        '/sign/batch',
+        signer_service.BatchSignerService(
+            results=results,
+            dictionaries=dictionaries,
+            heavy_hitters=top_signatures,
+        )
+    )
+    dictionary_service = signer_service.FrameDictionaryService(
+        dictionaries=dictionaries
+    )
+    app.add_route('/dictionaries', dictionary_service)
+    app.add_route('/dictionaries/{dictionary_id}', dictionary_service)
+    app.add_route('/admin/siglists', admin.SiglistsAdmin(registry, reloader))
+    app.add_route('/admin/profiles', admin.ProfilesAdmin(registry))
+    app.add_route(
+        '/admin/caches',
+        admin.CachesAdmin(registry, results, dictionaries)
+    )
+    app.add_route(
+        '/admin/shadow',
+        admin.ShadowAdmin(shadow_evaluator, settings.SHADOW_SIGLISTS_DIR)
+    )
+    app.add_route('/admin/admission', admin.AdmissionAdmin(limiter))
+    app.add_route(
+        '/admin/top_signatures',
+        admin.TopSignaturesAdmin(top_signatures)
+    )
+    if settings.METRICS_ENABLED:
+        app.add_route('/metrics', metrics.MetricsResource(metrics.metrics))
+    return app
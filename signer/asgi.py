@@ -0,0 +1,328 @@
+"""Serve the application with an ASGI server, like `uvicorn signer.asgi:app`.
+
+With synchronous WSGI workers, a client slowly uploading a body ties up a
+whole worker until it is done. Here, bodies are received by the event loop,
+which only costs a coroutine per client. Requests are handed to the WSGI
+application (`signer.wsgi`, with the same routes and middleware) in a thread
+of a bounded pool, where signing does not block the event loop, once their
+body is received, up to `settings.MAX_BODY_SIZE` bytes.
+
+Batches (`settings.ASGI_STREAMED_PATHS`) and newline-delimited JSON bodies,
+which can be of any size, are streamed instead: they are handed to a thread
+of another pool once their first `buffer_size` bytes are received, and the
+rest of their body is fed to the application as it is received, through a
+bounded queue, so that they are never held in memory whole. A slow upload
+then ties up a thread of that pool only, not one signing other requests.
+
+This module requires Python 3.5 or later.
+"""
+import asyncio
+import concurrent.futures
+import io
+import sys
+
+import falcon
+
+from signer import settings
+from signer.media import NDJSON_CONTENT_TYPE
+from signer.wsgi import app as signer_app
+
+
+class _BodyStream(object):
+    """The `wsgi.input` of a request whose body is still being received by
+    the event loop `loop`, starting with `head`. Reading it waits for the
+    chunks put in `queue`, an `asyncio.Queue`, by `ASGIAdapter.feed_body`:
+    bytes, then None at the end of the body, or an exception to raise. """
+
+    def __init__(self, loop, queue, head):
+        self.loop = loop
+        self.queue = queue
+        self._buffer = head
+        self._done = False
+
+    def _get(self):
+        if self._done:
+            return b''
+
+        chunk = asyncio.run_coroutine_threadsafe(
+            self.queue.get(), self.loop
+        ).result()
+        if chunk is None:
+            self._done = True
+            return b''
+        if isinstance(chunk, Exception):
+            self._done = True
+            raise chunk
+        return chunk
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            chunks = [self._buffer]
+            self._buffer = b''
+            while True:
+                chunk = self._get()
+                if not chunk:
+                    return b''.join(chunks)
+                chunks.append(chunk)
+
+        # Return what was received, without waiting for `size` bytes.
+        while not self._buffer:
+            self._buffer = self._get()
+            if not self._buffer:
+                return b''
+        data = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return data
+
+
+class ASGIAdapter(object):
+    """Serve the WSGI application `wsgi_app` as an ASGI application.
+
+    Requests are processed in `max_workers` threads once their body is
+    received. At most `max_pending` requests wait for, or are processed by,
+    these threads, others wait for their turn in the event loop.
+
+    Requests whose body is streamed (see `is_streamed`) are processed in
+    `stream_workers` other threads once its first `buffer_size` bytes are
+    received, the rest being fed to the application through a queue of at
+    most `queue_size` chunks. Others wait for one of these threads in the
+    event loop without holding anything but the beginning of their body.
+    """
+
+    def __init__(self, wsgi_app, max_workers, max_pending, buffer_size,
+                 queue_size, stream_workers):
+        self.wsgi_app = wsgi_app
+        self.max_pending = max_pending
+        self.buffer_size = buffer_size
+        self.queue_size = queue_size
+        self.stream_workers = stream_workers
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers)
+        self.stream_executor = concurrent.futures.ThreadPoolExecutor(
+            stream_workers
+        )
+        # Created with the event loop, on the first request.
+        self._pending = None
+        self._streams = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError(
+                'Unsupported scope type `{}`'.format(scope['type'])
+            )
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                self.stream_executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def http(self, scope, receive, send):
+        headers = dict(
+            (name.decode('latin-1').lower(), value.decode('latin-1'))
+            for name, value in scope.get('headers', ())
+        )
+
+        streamed = self.is_streamed(scope, headers)
+        head, more_body = await self.read_head(
+            receive, self.buffer_size if streamed else settings.MAX_BODY_SIZE
+        )
+        if head is None:
+            # The client went away.
+            return
+
+        if self._pending is None:
+            self._pending = asyncio.Semaphore(self.max_pending)
+            self._streams = asyncio.Semaphore(self.stream_workers)
+
+        if streamed:
+            pending, executor = self._streams, self.stream_executor
+        else:
+            pending, executor = self._pending, self.executor
+
+        loop = asyncio.get_event_loop()
+        async with pending:
+            feed = None
+            if more_body and streamed:
+                queue = asyncio.Queue(self.queue_size)
+                feed = asyncio.ensure_future(self.feed_body(receive, queue))
+                body = _BodyStream(loop, queue, head)
+            else:
+                # Bodies that are not streamed are only cut short when
+                # bigger than any the application accepts, which rejects
+                # them from what was received.
+                body = io.BytesIO(head)
+
+            if not more_body:
+                headers['content-length'] = str(len(head))
+            elif 'content-length' not in headers:
+                # Tell the application to read the body until its end,
+                # as HTTP/2 requests have no Transfer-Encoding.
+                headers['transfer-encoding'] = 'chunked'
+
+            result = None
+            try:
+                status, response_headers, result = (
+                    await loop.run_in_executor(
+                        executor,
+                        self.call_wsgi_app,
+                        self.get_environ(scope, headers, body),
+                    )
+                )
+                await self.send_response(
+                    loop, executor, status, response_headers, iter(result),
+                    send
+                )
+            finally:
+                if feed is not None:
+                    # The application might not have read the whole body.
+                    feed.cancel()
+                close = getattr(result, 'close', None)
+                if close is not None:
+                    # Streamed responses release what they hold, like their
+                    # place in admission control, when closed.
+                    await loop.run_in_executor(executor, close)
+
+    @staticmethod
+    def is_streamed(scope, headers):
+        """Return whether the body of a request is fed to the application
+        as it is received, rather than received whole first. """
+        return (
+            scope['path'] in settings.ASGI_STREAMED_PATHS or
+            headers.get('content-type', '').startswith(NDJSON_CONTENT_TYPE)
+        )
+
+    async def send_response(self, loop, executor, status, headers, chunks,
+                            send):
+        await send({
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers
+            ],
+        })
+
+        # Streamed responses are computed while being iterated.
+        while True:
+            chunk = await loop.run_in_executor(executor, next, chunks, None)
+            if chunk is None:
+                break
+            if chunk:
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                })
+
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def read_head(self, receive, max_size):
+        """Return a tuple (head, more_body): the body, or its beginning once
+        more than `max_size` bytes are received, and whether there is more
+        of it.
+        Return (None, False) if the client disconnected. """
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None, False
+
+            chunk = message.get('body', b'')
+            chunks.append(chunk)
+            size += len(chunk)
+
+            more_body = message.get('more_body', False)
+            if not more_body or size > max_size:
+                return b''.join(chunks), more_body
+
+    async def feed_body(self, receive, queue):
+        """Put the chunks of the rest of a body in `queue`, then None, see
+        `_BodyStream`. """
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                await queue.put(falcon.HTTPBadRequest(
+                    'Client disconnected',
+                    'The client disconnected before sending the whole body.'
+                ))
+                return
+
+            chunk = message.get('body', b'')
+            if chunk:
+                await queue.put(chunk)
+            if not message.get('more_body', False):
+                await queue.put(None)
+                return
+
+    @staticmethod
+    def get_environ(scope, headers, body):
+        """Return the WSGI environ of a request, whose body is read from
+        `body`. """
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', ''),
+            'PATH_INFO': scope['path'],
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': 'HTTP/{}'.format(
+                scope.get('http_version', '1.1')
+            ),
+            'REMOTE_ADDR': client[0],
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+
+        for name, value in headers.items():
+            if name == 'content-type':
+                environ['CONTENT_TYPE'] = value
+            elif name == 'content-length':
+                environ['CONTENT_LENGTH'] = value
+            else:
+                environ['HTTP_' + name.upper().replace('-', '_')] = value
+
+        return environ
+
+    def call_wsgi_app(self, environ):
+        """Call the WSGI application. Return the response status and
+        headers, and the iterable of the body, to be closed once sent. """
+        response = []
+
+        def start_response(status, headers, exc_info=None):
+            response[:] = [status, headers]
+
+        result = self.wsgi_app(environ, start_response)
+        return response[0], response[1], result
+
+
+def get_app(wsgi_app=signer_app):
+    """Return an `ASGIAdapter` for `wsgi_app`, configured from the
+    settings. """
+    return ASGIAdapter(
+        wsgi_app,
+        settings.ASGI_WORKERS,
+        settings.ASGI_MAX_PENDING,
+        settings.ASGI_BODY_BUFFER_SIZE,
+        settings.ASGI_BODY_QUEUE_SIZE,
+        settings.ASGI_STREAM_WORKERS,
+    )
+
+
+app = get_app()
@@ -0,0 +1,87 @@
+"""A bounded queue of items processed by a background thread.
+
+Requests put items in it without waiting for them to be processed: the
+queue lock is only held while the item is appended, or counted as dropped
+if the queue is full. Used by `signer.shadow` and `signer.heavy_hitters`.
+"""
+import collections
+import logging
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# Number of seconds the background thread waits for items to process.
+POLL_INTERVAL = 0.1
+
+
+class BackgroundQueue(object):
+    """Process items with `process(item)` in a background thread named
+    `name`.
+
+    At most `size` items wait to be processed, others are dropped. The
+    thread is started by the first item, so that it runs in workers forked
+    after the app was loaded. `flush` processes the queued items at once,
+    holding `flush_lock`, a new lock if None, as the thread does.
+    """
+
+    def __init__(self, process, size, name, flush_lock=None):
+        self.process = process
+        self.size = size
+        self.name = name
+
+        self._queue = collections.deque()
+        self._lock = threading.Lock()
+        self._flush_lock = flush_lock or threading.Lock()
+        self._thread = None
+        self.reset()
+
+    def __len__(self):
+        return len(self._queue)
+
+    def reset(self):
+        """Forget how many items were put and dropped. """
+        with self._lock:
+            self.submitted = 0
+            self.dropped = 0
+
+    def put(self, item):
+        """Queue `item`, or drop it if the queue is full, and return whether
+        it was queued. This never waits for items to be processed. """
+        with self._lock:
+            self.submitted += 1
+            if len(self._queue) >= self.size:
+                self.dropped += 1
+                return False
+            self._queue.append(item)
+
+            # The thread never stops.
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=self.name
+                )
+                self._thread.daemon = True
+                self._thread.start()
+        return True
+
+    def _run(self):
+        while True:
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to process the items of %s',
+                                 self.name)
+            time.sleep(POLL_INTERVAL)
+
+    def flush(self):
+        """Process all queued items now, or wait until the background
+        thread has processed them. """
+        pop = self._queue.popleft
+        with self._flush_lock:
+            while True:
+                try:
+                    item = pop()
+                except IndexError:
+                    return
+                self.process(item)
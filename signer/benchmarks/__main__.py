@@ -0,0 +1,6 @@
+import sys
+
+from signer.benchmarks.suite import main
+
+
+sys.exit(main())
@@ -0,0 +1,72 @@
+"""Compare signing stacks one at a time with `CSignatureTool.generate` and
+together with `CSignatureTool.generate_batch`, for batches of growing size.
+
+Run with `python -m signer.benchmarks.batch`.
+
+Stacks are those of `signer.benchmarks.encoding`, mostly made of common
+frames. Frames are classified once before timing, as they are by a service
+that has been running for a while. Times are in microseconds per stack.
+"""
+from __future__ import print_function
+
+import argparse
+import timeit
+
+from signer.benchmarks.encoding import get_payloads
+from signer.languages.c import CSignatureTool
+
+
+BATCH_SIZES = (1, 10, 100, 1000)
+
+
+def run(function, number):
+    """Return the time, in seconds, of a call to `function`. """
+    return min(timeit.repeat(function, number=number, repeat=3)) / number
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--number',
+        type=int,
+        default=5,
+        help='number of times each batch is signed'
+    )
+    parser.add_argument(
+        '--frames',
+        type=int,
+        default=200,
+        help='number of frames of each stack'
+    )
+    args = parser.parse_args(argv)
+
+    tool = CSignatureTool()
+    stacks = [
+        x['frames'] for x in get_payloads(max(BATCH_SIZES), args.frames)
+    ]
+    expected = [tool.generate(x, 0) for x in stacks]
+    assert tool.generate_batch(stacks, [0] * len(stacks)) == expected
+
+    print('{:<8} {:>10} {:>10} {:>8}'.format(
+        'stacks', 'generate', 'batch', 'speedup'
+    ))
+    for size in BATCH_SIZES:
+        batch = stacks[:size]
+        crashed_threads = [0] * size
+
+        def generate(batch=batch):
+            for stack in batch:
+                tool.generate(stack, 0)
+
+        def generate_batch(batch=batch, crashed_threads=crashed_threads):
+            tool.generate_batch(batch, crashed_threads)
+
+        one_by_one = run(generate, args.number) / size * 1e6
+        together = run(generate_batch, args.number) / size * 1e6
+        print('{:<8} {:>10.1f} {:>10.1f} {:>7.2f}x'.format(
+            size, one_by_one, together, one_by_one / together
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""Compare JSON and MessagePack encodings of requests and responses, and
+JSON requests whose frames are ids of a frame dictionary.
+
+Run with `python -m signer.benchmarks.encoding`.
+
+Payloads are synthetic stacks of 200 frames, see
+`signer.benchmarks.stacks`, mostly made of a thousand common frames. The
+dictionary has the frames found in several payloads. Times are in
+microseconds per payload.
+"""
+from __future__ import print_function
+
+import argparse
+import collections
+import json
+import timeit
+
+from falcon import testing
+
+from signer import msgpack_stream
+from signer.app import create_app
+from signer.benchmarks.stacks import StackGenerator
+from signer.frame_dictionary import FrameDictionary
+from signer.languages.registry import registry
+
+
+def get_payloads(count, frames=200, seed=0):
+    """Return `count` request payloads of `frames` frames. As in real
+    stacks, most frames below the top of the stack are shared by many
+    stacks. """
+    generator = StackGenerator(seed)
+    common_frames = [generator.frame() for _ in range(frames * 5)]
+    payloads = []
+    for _ in range(count):
+        stack = generator.stack('typical')
+        while len(stack) < frames:
+            if generator.random.random() < 0.1:
+                stack.append(generator.frame())
+            else:
+                stack.append(generator.random.choice(common_frames))
+        payloads.append({'frames': stack[:frames]})
+    return payloads
+
+
+def encode_payloads(payloads):
+    """Return the frames found in several of `payloads`, and `payloads`
+    with those frames replaced by their index in that list. """
+    counts = collections.Counter(
+        x for payload in payloads for x in set(payload['frames'])
+    )
+    frames = sorted(x for x, count in counts.items() if count > 1)
+    ids = dict((x, index) for index, x in enumerate(frames))
+    encoded = [
+        {'frames': [ids.get(x, x) for x in payload['frames']]}
+        for payload in payloads
+    ]
+    return frames, encoded
+
+
+def run(function, values, number):
+    """Return the time, in microseconds, of calling `function` on a value of
+    `values`. """
+    def run_all():
+        for value in values:
+            function(value)
+
+    seconds = min(timeit.repeat(run_all, number=number, repeat=3))
+    return seconds / number / len(values) * 1e6
+
+
+def _post(app, content_type, path='/sign', query_string=''):
+    def post(body):
+        environ = testing.create_environ(
+            path=path,
+            query_string=query_string,
+            method='POST',
+            headers={'Content-Type': content_type, 'Accept': content_type},
+            body=body,
+        )
+        return b''.join(app(environ, testing.StartResponseMock()))
+    return post
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--number',
+        type=int,
+        default=20,
+        help='number of times each payload is processed'
+    )
+    parser.add_argument(
+        '--payloads',
+        type=int,
+        default=50,
+        help='number of payloads'
+    )
+    args = parser.parse_args(argv)
+
+    payloads = get_payloads(args.payloads)
+    json_bodies = [json.dumps(x).encode('utf-8') for x in payloads]
+    msgpack_bodies = [msgpack_stream.dumps(x) for x in payloads]
+    for payload, body in zip(payloads, msgpack_bodies):
+        assert msgpack_stream.loads(body) == payload
+
+    dictionary_frames, encoded_payloads = encode_payloads(payloads)
+    encoded_bodies = [
+        json.dumps(x).encode('utf-8') for x in encoded_payloads
+    ]
+    app = create_app()
+    post_json = _post(app, 'application/json')
+    post_dictionary = _post(app, 'application/json', '/dictionaries')
+    dictionary_id = json.loads(post_dictionary(
+        json.dumps({'frames': dictionary_frames}).encode('utf-8')
+    ).decode('utf-8'))['id']
+    # The frames of the dictionary of the service, to sign them with the
+    # tool directly.
+    dictionary = FrameDictionary(dictionary_frames)
+
+    # Results are cached by the first requests, so that the service mostly
+    # decodes and encodes afterwards.
+    post_encoded = _post(
+        app, 'application/json', query_string='dictionary=' + dictionary_id
+    )
+    results = [json.loads(post_json(x).decode('utf-8')) for x in json_bodies]
+    for body in encoded_bodies:
+        post_encoded(body)
+
+    # Frames are classified once, then found in caches.
+    tool = registry.get('c')
+    for payload, encoded in zip(payloads, encoded_payloads):
+        tool.generate(payload['frames'])
+        tool.generate(encoded['frames'], None, dictionary)
+
+    def size(bodies):
+        return sum(len(x) for x in bodies) // len(bodies)
+
+    def decode_json(body):
+        return json.loads(body.decode('utf-8'))
+
+    print('Dictionary of {} frames'.format(len(dictionary_frames)))
+    print('{:<24} {:>10} {:>12} {:>12}'.format(
+        'per payload', 'JSON', 'dictionary', 'MessagePack'
+    ))
+    print('{:<24} {:>10} {:>12} {:>12}'.format(
+        'bytes',
+        size(json_bodies),
+        size(encoded_bodies),
+        size(msgpack_bodies),
+    ))
+    for name, json_args, encoded_args, msgpack_args in (
+        (
+            'us to decode request',
+            (decode_json, json_bodies),
+            (decode_json, encoded_bodies),
+            (msgpack_stream.loads, msgpack_bodies),
+        ),
+        (
+            'us to encode request',
+            (json.dumps, payloads),
+            (json.dumps, encoded_payloads),
+            (msgpack_stream.dumps, payloads),
+        ),
+        (
+            'us to encode response',
+            (json.dumps, results),
+            None,
+            (msgpack_stream.dumps, results),
+        ),
+        (
+            'us to generate',
+            (lambda x: tool.generate(x['frames']), payloads),
+            (
+                lambda x: tool.generate(x['frames'], None, dictionary),
+                encoded_payloads,
+            ),
+            None,
+        ),
+        (
+            'us per cached request',
+            (post_json, json_bodies),
+            (post_encoded, encoded_bodies),
+            (_post(app, 'application/msgpack'), msgpack_bodies),
+        ),
+    ):
+        print('{:<24} {:>10} {:>12} {:>12}'.format(name, *[
+            '-' if x is None else '{:.1f}'.format(run(x[0], x[1], args.number))
+            for x in (json_args, encoded_args, msgpack_args)
+        ]))
+
+
+if __name__ == '__main__':
+    main()
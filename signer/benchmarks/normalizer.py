@@ -0,0 +1,98 @@
+"""Compare `normalize_function` with a chain of regular expressions, with
+all normalizations enabled.
+
+Run with `python -m signer.benchmarks.normalizer`.
+"""
+import argparse
+import re
+import timeit
+
+from signer.languages.c import normalize_function
+
+
+# Frames looking like those of Breakpad stacks.
+FRAMES = (
+    'KiFastSystemCallRet',
+    'xul.dll@0x1b2c3d',
+    'js::RunScript',
+    'mozilla::dom::Element::SetAttr(int,nsIAtom *,nsAString const &,bool)',
+    'nsTArray_Impl<nsCOMPtr<nsIRunnable>,nsTArrayInfallibleAllocator>'
+    '::AppendElement<nsIRunnable *>(nsIRunnable * &&)',
+    'std::vector<std::pair<int, float>,std::allocator<std::pair<int, float> '
+    '> >::_M_insert_aux(iterator, value_type const &)',
+    'mozilla::detail::RunnableMethodImpl<void (mozilla::Foo::*)(),1,0>::Run()',
+    'nsThread::ProcessNextEvent(bool,bool *)',
+    'PR_Lock',
+    'moz_xmalloc',
+)
+
+_TEMPLATE_RE = re.compile(r'<[^<>]*>')
+_ARGUMENTS_RE = re.compile(r'\([^()]*\)')
+_SPACE_RE = re.compile(r' (?=[\*&,])')
+_COMMA_RE = re.compile(r',(?! )')
+
+
+def _collapse(regex, function, replacement):
+    # Collapse the innermost brackets first, using a placeholder so that
+    # collapsed brackets are not matched again.
+    count = 1
+    while count:
+        function, count = regex.subn('\0', function)
+    return function.replace('\0', replacement)
+
+
+def normalize_with_regexes(function, collapse_templates, collapse_arguments,
+                           fix_spaces):
+    """Normalize `function` with one `re.sub` per rule. Unlike
+    `normalize_function`, it does not handle operators. """
+    if collapse_templates:
+        function = _collapse(_TEMPLATE_RE, function, '<T>')
+    if collapse_arguments:
+        function = _collapse(_ARGUMENTS_RE, function, '()')
+    if fix_spaces:
+        function = _SPACE_RE.sub('', function)
+        function = _COMMA_RE.sub(', ', function)
+    return function
+
+
+def run(normalize, frames, collapse_arguments, number):
+    """Return the average time, in microseconds, to normalize a frame. """
+    def normalize_all():
+        for frame in frames:
+            normalize(frame, True, collapse_arguments, True)
+
+    seconds = min(timeit.repeat(normalize_all, number=number, repeat=3))
+    return seconds / number / len(frames) * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--number',
+        type=int,
+        default=10000,
+        help='number of times each frame is normalized'
+    )
+    args = parser.parse_args(argv)
+
+    for collapse_arguments in (False, True):
+        for frame in FRAMES:
+            expected = normalize_with_regexes(
+                frame, True, collapse_arguments, True
+            )
+            actual = normalize_function(frame, True, collapse_arguments, True)
+            assert actual == expected, (actual, expected)
+
+        print('Collapsing arguments: {}'.format(collapse_arguments))
+        for name, normalize in (
+            ('normalizer', normalize_function),
+            ('regex chain', normalize_with_regexes),
+        ):
+            print('  {:<12} {:6.2f} us/frame'.format(
+                name,
+                run(normalize, FRAMES, collapse_arguments, args.number)
+            ))
+
+
+if __name__ == '__main__':
+    main()
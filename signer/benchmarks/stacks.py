@@ -0,0 +1,223 @@
+"""Generate synthetic, reproducible crash stacks for benchmarks.
+
+Breakpad-style C/C++ stacks are built from the shipped siglists, so that
+they exercise the same code paths as real crashes: irrelevant frames on
+top, prefix frames, sentinels, runs of frames in DLLs that get trimmed,
+and very deep recursions. Java traces look like those of Android crashes.
+The same seed always gives the same stacks, for a given Python version.
+"""
+import random
+import re
+
+from signer import siglists
+
+
+# Characters with a special meaning in a regular expression, once `\.` has
+# been replaced with `.`.
+_SPECIAL_CHARACTERS_RE = re.compile(r'[\\^$*+?{}\[\]|()]')
+
+_NAMESPACES = (
+    'mozilla', 'mozilla::dom', 'mozilla::layers', 'mozilla::net', 'js',
+    'js::jit', 'nsContentUtils', 'mozilla::gfx', 'mozilla::ipc',
+)
+_CLASSES = (
+    'Element', 'Document', 'HTMLMediaElement', 'CompositorBridgeParent',
+    'nsHttpChannel', 'Runnable', 'TextureClient', 'ScriptLoader',
+    'MessageChannel', 'PresShell', 'nsFrame', 'EventDispatcher',
+)
+_METHODS = (
+    'Run', 'Init', 'Dispatch', 'HandleEvent', 'OnStartRequest', 'Flush',
+    'SetAttr', 'Paint', 'Update', 'Send', 'Notify', 'Destroy',
+)
+_TYPES = (
+    'int', 'bool', 'unsigned int', 'char const *', 'nsAString const &',
+    'nsIAtom *', 'JSContext *', 'void *', 'mozilla::ErrorResult &',
+)
+_TEMPLATES = (
+    'nsTArray', 'RefPtr', 'nsCOMPtr', 'UniquePtr', 'Maybe', 'Vector',
+)
+_MODULES = (
+    'xul.dll', 'nss3.dll', 'mozglue.dll', 'ntdll.dll', 'kernel32.dll',
+)
+
+_JAVA_EXCEPTIONS = (
+    'java.lang.NullPointerException',
+    'java.lang.IllegalStateException',
+    'java.lang.OutOfMemoryError',
+    'java.lang.IllegalArgumentException',
+    'android.database.sqlite.SQLiteException',
+)
+_JAVA_CLASSES = (
+    'GeckoApp', 'GeckoAppShell', 'BrowserApp', 'Tabs', 'GeckoView',
+    'TabsPanel', 'GeckoThread', 'HomePager',
+)
+_JAVA_METHODS = (
+    'onCreate', 'onResume', 'handleMessage', 'run', 'loadUrl', 'notify',
+)
+
+
+def _get_literals(patterns):
+    """Return strings matched by those of `patterns` that are plain strings,
+    possibly followed by `.*`. """
+    literals = set()
+    for pattern in patterns:
+        if isinstance(pattern, tuple):
+            continue
+        literal = pattern
+        if literal.endswith('.*'):
+            literal = literal[:-2]
+        literal = literal.replace('\\.', '.')
+        if (
+            literal and
+            not _SPECIAL_CHARACTERS_RE.search(literal) and
+            re.match(pattern, literal)
+        ):
+            literals.add(literal)
+    return sorted(literals)
+
+
+class StackGenerator(object):
+    """Generate stacks of different kinds, see `KINDS`, from a random
+    `seed` and the siglists of `siglist_set` (those shipped with the package
+    by default). """
+
+    KINDS = (
+        'typical',
+        'prefix_heavy',
+        'sentinel',
+        'trim_dll',
+        'deep_recursion',
+    )
+
+    def __init__(self, seed=0, siglist_set=None):
+        self.random = random.Random(seed)
+        lists = siglist_set or siglists
+
+        self.irrelevant = _get_literals(lists.IRRELEVANT_SIGNATURE_RE)
+        self.prefixes = _get_literals(lists.PREFIX_SIGNATURE_RE)
+        self.trimmed_modules = _get_literals(
+            x[:-2] if x.endswith('.*') else x
+            for x in lists.TRIM_DLL_SIGNATURE_RE
+        )
+        self.sentinels = sorted(
+            x for x in lists.SIGNATURE_SENTINELS if not isinstance(x, tuple)
+        )
+
+    def _choice(self, values):
+        return values[self.random.randint(0, len(values) - 1)]
+
+    def _address(self):
+        return '0x{:x}'.format(self.random.randint(0x1000, 0xffffff))
+
+    def _siglist_frame(self, literals):
+        frame = self._choice(literals)
+        if frame.endswith('@'):
+            frame += self._address()
+        elif frame.endswith('@0x'):
+            frame = frame[:-2] + self._address()
+        return frame
+
+    def function(self):
+        """Return the name of an application function. """
+        name = '{}::{}::{}'.format(
+            self._choice(_NAMESPACES),
+            self._choice(_CLASSES),
+            self._choice(_METHODS),
+        )
+        if self.random.random() < 0.2:
+            name = '{}<{}>::{}'.format(
+                self._choice(_TEMPLATES),
+                self._choice(_TYPES),
+                name,
+            )
+        arguments = [
+            self._choice(_TYPES) for _ in range(self.random.randint(0, 4))
+        ]
+        return '{}({})'.format(name, ','.join(arguments))
+
+    def frame(self):
+        """Return an application frame, sometimes without symbols. """
+        if self.random.random() < 0.1:
+            return '{}@{}'.format(self._choice(_MODULES), self._address())
+        return self.function()
+
+    def _top(self):
+        return [
+            self._siglist_frame(self.irrelevant)
+            for _ in range(self.random.randint(1, 4))
+        ]
+
+    def _prefixes(self, low, high):
+        return [
+            self._siglist_frame(self.prefixes)
+            for _ in range(self.random.randint(low, high))
+        ]
+
+    def _frames(self, low, high):
+        return [self.frame() for _ in range(self.random.randint(low, high))]
+
+    def stack(self, kind='typical'):
+        """Return a stack of the given kind. """
+        if kind == 'typical':
+            return self._top() + self._prefixes(0, 2) + self._frames(20, 60)
+
+        if kind == 'prefix_heavy':
+            return (
+                self._top() + self._prefixes(15, 30) + self._frames(20, 40)
+            )
+
+        if kind == 'sentinel':
+            return (
+                self._top() +
+                self._frames(5, 20) +
+                [self._choice(self.sentinels)] +
+                self._prefixes(0, 3) +
+                self._frames(10, 30)
+            )
+
+        if kind == 'trim_dll':
+            module = self._choice(self.trimmed_modules)
+            run = [
+                '{}@{}'.format(module, self._address())
+                for _ in range(self.random.randint(5, 15))
+            ]
+            return self._top() + run + self._frames(20, 40)
+
+        if kind == 'deep_recursion':
+            cycle = [self.function() for _ in range(self.random.randint(2, 4))]
+            depth = self.random.randint(1000, 2000)
+            return (
+                self._top() +
+                self._prefixes(0, 2) +
+                [cycle[i % len(cycle)] for i in range(depth)] +
+                self._frames(10, 20)
+            )
+
+        raise ValueError('Unknown kind of stack `{}`'.format(kind))
+
+    def stacks(self, kind, count):
+        return [self.stack(kind) for _ in range(count)]
+
+    def java_trace(self):
+        """Return the lines of a Java stack trace. """
+        exception = self._choice(_JAVA_EXCEPTIONS)
+        message = 'Attempt to invoke {} on a null object reference@{:08x}'
+        lines = ['{}: {}'.format(
+            exception,
+            message.format(
+                self._choice(_JAVA_METHODS),
+                self.random.randint(0, 0xffffffff)
+            ),
+        )]
+        for _ in range(self.random.randint(5, 40)):
+            java_class = self._choice(_JAVA_CLASSES)
+            lines.append('at org.mozilla.gecko.{}.{}({}.java:{})'.format(
+                java_class,
+                self._choice(_JAVA_METHODS),
+                java_class,
+                self.random.randint(1, 3000),
+            ))
+        return lines
+
+    def java_traces(self, count):
+        return [self.java_trace() for _ in range(count)]
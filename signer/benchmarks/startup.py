@@ -0,0 +1,93 @@
+"""Measure how long `import signer.wsgi`, which builds the application,
+takes, and how much of it is spent reading siglists and building the C
+signature tool, with and without the siglists snapshot (see
+`signer.siglists.snapshot`).
+
+Run with `python -m signer.benchmarks.startup`.
+
+`import signer.wsgi` is timed in new Python processes, as modules are only
+imported once per process. Other steps are repeated in this process, where
+`re` caches compiled regular expressions, so they mostly measure what the
+snapshot saves besides compiling them. Times are in milliseconds.
+"""
+from __future__ import print_function
+
+import argparse
+import subprocess
+import sys
+import timeit
+
+from signer import siglists
+from signer.languages.c import CSignatureTool
+
+
+IMPORT_SCRIPT = (
+    'import time; start = time.time(); import signer.wsgi; '
+    'print(time.time() - start)'
+)
+
+
+def time_import(number):
+    """Return the median time, in seconds, of `import signer.wsgi` in a new
+    process. """
+    times = []
+    for _ in range(number):
+        output = subprocess.check_output([sys.executable, '-c', IMPORT_SCRIPT])
+        times.append(float(output.decode('ascii').strip().splitlines()[-1]))
+    times.sort()
+    return times[len(times) // 2]
+
+
+def run(function, number):
+    """Return the time, in seconds, of a call to `function`. """
+    return min(timeit.repeat(function, number=number, repeat=3)) / number
+
+
+def without_snapshot():
+    """Read the siglists of this package from their files. """
+    return siglists.SiglistSet(dict(
+        (name, siglists._extend(name, siglists.read_siglist(name)))
+        for name in siglists.SIGLIST_NAMES
+    ))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--number',
+        type=int,
+        default=10,
+        help='number of times each step is run'
+    )
+    args = parser.parse_args(argv)
+
+    if siglists.load_snapshot() is None:
+        print('Warning: the siglists snapshot is missing or stale, run '
+              '`python -m signer.siglists.snapshot`')
+
+    with_snapshot = siglists.load_siglists()
+    from_files = without_snapshot()
+
+    steps = (
+        ('load_siglists', siglists.load_siglists, without_snapshot),
+        (
+            'CSignatureTool',
+            lambda: CSignatureTool(with_snapshot),
+            lambda: CSignatureTool(from_files),
+        ),
+    )
+
+    print('{:<16} {:>10} {:>10}'.format('', 'snapshot', 'files'))
+    for name, snapshot_step, files_step in steps:
+        print('{:<16} {:>10.1f} {:>10.1f}'.format(
+            name,
+            run(snapshot_step, args.number) * 1e3,
+            run(files_step, args.number) * 1e3,
+        ))
+    print('{:<16} {:>10.1f}'.format(
+        'import wsgi', time_import(args.number) * 1e3
+    ))
+
+
+if __name__ == '__main__':
+    main()
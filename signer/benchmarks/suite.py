@@ -0,0 +1,424 @@
+"""Measure the cost of signing, from building tools to serving requests.
+
+    python -m signer.benchmarks -o results.json
+    python -m signer.benchmarks --baseline results.json
+
+Stacks are synthetic and reproducible, see `signer.benchmarks.stacks`.
+Each benchmark is run `--repeat` times, and the minimum, median and mean
+time of one operation (signing one stack, building one tool, ...) are
+reported, in microseconds. Results are printed, and written as JSON with
+`--output`. With `--baseline`, a previous output is compared with these
+results, and the command exits with an error if a benchmark got slower by
+more than `--threshold`. Minimums are compared, being the least noisy.
+"""
+from __future__ import print_function
+
+import argparse
+import datetime
+import io
+import json
+import platform
+import re
+import sys
+import timeit
+
+import falcon
+from falcon import testing
+
+from signer import middleware, settings
+from signer.app import create_app
+from signer.benchmarks.stacks import StackGenerator
+from signer.cache import LRUCache
+from signer.heavy_hitters import HeavyHitters
+from signer.languages.c import CSignatureTool, normalize_function
+from signer.languages.java import JavaSignatureTool
+from signer.signature_tool_base import SignatureToolBase
+from signer.signer_service import SignerService
+
+
+# Incremented when the format of results changes.
+RESULTS_VERSION = 1
+
+
+class Benchmark(object):
+    """Run `function`, which does `operations` operations at once. """
+
+    def __init__(self, name, function, operations=1):
+        self.name = name
+        self.function = function
+        self.operations = operations
+
+    def run(self, number, repeat):
+        """Return the time of one operation for each of `repeat` runs, in
+        microseconds. """
+        timer = timeit.Timer(self.function)
+        return [
+            x / number / self.operations * 1e6
+            for x in timer.repeat(repeat=repeat, number=number)
+        ]
+
+
+class _FixedSignatureTool(SignatureToolBase):
+    """Return the same signature, to measure `SignatureToolBase.generate`
+    alone. """
+
+    def __init__(self, signature):
+        super(_FixedSignatureTool, self).__init__()
+        self.signature = signature
+
+    def _do_generate(self, frames, crashed_thread):
+        return self.signature, []
+
+
+def _construction_benchmarks(generator, count):
+    def build():
+        # Compiled regular expressions are cached by `re`.
+        re.purge()
+        CSignatureTool()
+
+    yield Benchmark('c.construction', build)
+
+
+def _c_stage_benchmarks(generator, count):
+    tool = CSignatureTool()
+
+    for kind in generator.KINDS:
+        stacks = generator.stacks(kind, count)
+
+        walked = []
+        for stack in stacks:
+            index = tool.find_sentinel(stack)
+            walked.append(stack if index is None else stack[index:])
+
+        def normalize(stacks=stacks):
+            for stack in stacks:
+                [tool.normalize_frame(x) for x in stack]
+
+        def find_sentinel(stacks=stacks):
+            for stack in stacks:
+                tool.find_sentinel(stack)
+
+        def walk_frames_cold(stacks=walked):
+            tool.classification_cache.clear()
+            for stack in stacks:
+                tool.walk_frames(stack)
+
+        def walk_frames_warm(stacks=walked):
+            for stack in stacks:
+                tool.walk_frames(stack)
+
+        def do_generate(stacks=stacks):
+            for stack in stacks:
+                tool._do_generate(stack, 0)
+
+        for name, function in (
+            ('normalize', normalize),
+            ('find_sentinel', find_sentinel),
+            ('walk_frames_cold', walk_frames_cold),
+            ('walk_frames_warm', walk_frames_warm),
+            ('do_generate', do_generate),
+        ):
+            yield Benchmark(
+                'c.{}.{}'.format(name, kind),
+                function,
+                len(stacks)
+            )
+
+
+def _normalize_function_benchmarks(generator, count):
+    frames = [generator.function() for _ in range(count)]
+
+    def normalize():
+        for frame in frames:
+            normalize_function(
+                frame,
+                settings.COLLAPSE_TEMPLATES,
+                settings.COLLAPSE_ARGUMENTS,
+                settings.FIX_SPACES,
+            )
+
+    yield Benchmark('c.normalize_function', normalize, len(frames))
+
+
+def _generate_benchmarks(generator, count):
+    for name, signature in (
+        ('short', 'mozilla::dom::Element::SetAttr'),
+        ('escaped', "js::RunScript | operator'new'" * 2),
+        ('truncated', "js::RunScript | operator'new' | " * 20),
+    ):
+        tool = _FixedSignatureTool(signature)
+        yield Benchmark(
+            'base.generate.{}'.format(name),
+            lambda tool=tool: tool.generate([], 0),
+        )
+
+
+def _java_benchmarks(generator, count):
+    tool = JavaSignatureTool()
+    traces = generator.java_traces(count)
+
+    def generate():
+        for trace in traces:
+            tool.generate(trace)
+
+    yield Benchmark('java.generate', generate, len(traces))
+
+
+def _heavy_hitters_benchmarks(generator, count):
+    def get_heavy_hitters():
+        return HeavyHitters(
+            True,
+            settings.HEAVY_HITTERS_WINDOWS,
+            settings.HEAVY_HITTERS_BUCKET_DURATION,
+            settings.HEAVY_HITTERS_SKETCH_WIDTH,
+            settings.HEAVY_HITTERS_SKETCH_DEPTH,
+            settings.HEAVY_HITTERS_CAPACITY,
+            count,
+        )
+
+    tool = CSignatureTool()
+    signatures = [
+        tool.generate(x, 0)[0] for x in generator.stacks('typical', count)
+    ]
+    # What requests do: the queue is emptied after each run, but never by
+    # the background thread, which is not started.
+    queued = get_heavy_hitters()
+    queued._thread = True
+
+    def submit():
+        for signature in signatures:
+            queued.submit('c', signature)
+        queued._queue.clear()
+
+    # What the background thread does.
+    counted = get_heavy_hitters()
+
+    def add():
+        for signature in signatures:
+            counted.add('c', signature, 0)
+
+    yield Benchmark('heavy_hitters.submit', submit, len(signatures))
+    yield Benchmark('heavy_hitters.add', add, len(signatures))
+
+
+def _get_environ(stack):
+    body = json.dumps({'frames': stack}).encode('utf-8')
+    return testing.create_environ(
+        path='/sign',
+        method='POST',
+        query_string='crashed_thread=0',
+        headers={'Content-Type': 'application/json'},
+        body=body,
+    ), body
+
+
+def _service_benchmarks(generator, count):
+    # Without any result cache, everything is done for each request.
+    uncached_app = falcon.API(middleware=[
+        middleware.RequireJSON(),
+        middleware.JSONTranslator(),
+    ])
+    uncached_app.add_route('/sign', SignerService(results=LRUCache(0)))
+    signer_app = create_app()
+
+    for kind in ('typical', 'deep_recursion'):
+        stacks = generator.stacks(kind, count)
+        environs = [_get_environ(x) for x in stacks]
+
+        for name, app in (
+            ('uncached', uncached_app),
+            # The result of each stack is cached after the first run.
+            ('cached', signer_app),
+        ):
+            def on_post(environs=environs, app=app):
+                for environ, body in environs:
+                    # The body is read by each request.
+                    environ['wsgi.input'] = io.BytesIO(body)
+                    start_response = testing.StartResponseMock()
+                    b''.join(app(environ, start_response))
+
+            yield Benchmark(
+                'service.on_post.{}.{}'.format(name, kind),
+                on_post,
+                len(environs)
+            )
+
+
+BENCHMARKS = (
+    _construction_benchmarks,
+    _c_stage_benchmarks,
+    _normalize_function_benchmarks,
+    _generate_benchmarks,
+    _java_benchmarks,
+    _heavy_hitters_benchmarks,
+    _service_benchmarks,
+)
+
+
+def get_benchmarks(seed=0, count=100, name_filter=None):
+    """Return all benchmarks, or those with `name_filter` in their name,
+    running on `count` stacks generated from `seed`. """
+    benchmarks = []
+    for make_benchmarks in BENCHMARKS:
+        generator = StackGenerator(seed)
+        benchmarks.extend(
+            x for x in make_benchmarks(generator, count)
+            if name_filter is None or name_filter in x.name
+        )
+    return benchmarks
+
+
+def get_stats(times):
+    times = sorted(times)
+    middle = len(times) // 2
+    if len(times) % 2:
+        median = times[middle]
+    else:
+        median = (times[middle - 1] + times[middle]) / 2
+    return {
+        'min': times[0],
+        'median': median,
+        'mean': sum(times) / len(times),
+    }
+
+
+def run(benchmarks, number, repeat, on_result=None):
+    """Run `benchmarks`. Return the stats of each one by name, see
+    `get_stats`. `on_result` is called with each name and its stats. """
+    results = {}
+    for benchmark in benchmarks:
+        stats = get_stats(benchmark.run(number, repeat))
+        results[benchmark.name] = stats
+        if on_result is not None:
+            on_result(benchmark.name, stats)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Return `(name, baseline, current)` minimum times of the benchmarks
+    slower in `results` than in `baseline` by more than `threshold`, a
+    fraction of the baseline. """
+    regressions = []
+    for name, stats in sorted(results.items()):
+        try:
+            expected = baseline[name]['min']
+        except KeyError:
+            continue
+        if stats['min'] > expected * (1 + threshold):
+            regressions.append((name, expected, stats['min']))
+    return regressions
+
+
+def get_meta(args):
+    return {
+        'version': RESULTS_VERSION,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'created': datetime.datetime.utcnow().isoformat() + 'Z',
+        'seed': args.seed,
+        'stacks': args.stacks,
+        'number': args.number,
+        'repeat': args.repeat,
+    }
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m signer.benchmarks',
+        description=__doc__.split('\n\n', 1)[0],
+    )
+    parser.add_argument(
+        '-o', '--output',
+        help='JSON file to write results to'
+    )
+    parser.add_argument(
+        '--baseline',
+        help='JSON file of previous results to compare with'
+    )
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=0.2,
+        help='slowdown, as a fraction of the baseline, reported as a '
+             'regression (default: 0.2)'
+    )
+    parser.add_argument(
+        '-k', '--filter',
+        help='only run benchmarks with this in their name'
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='seed of the generated stacks'
+    )
+    parser.add_argument(
+        '--stacks',
+        type=int,
+        default=100,
+        help='number of stacks of each kind'
+    )
+    parser.add_argument(
+        '--number',
+        type=int,
+        default=5,
+        help='number of times each benchmark is run in a row'
+    )
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=5,
+        help='number of times runs are repeated'
+    )
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+
+    def on_result(name, stats):
+        print('{:<48} {:>12.2f} {:>12.2f} {:>12.2f}'.format(
+            name, stats['min'], stats['median'], stats['mean']
+        ))
+
+    print('{:<48} {:>12} {:>12} {:>12}'.format(
+        'benchmark (us per operation)', 'min', 'median', 'mean'
+    ))
+    results = run(
+        get_benchmarks(args.seed, args.stacks, args.filter),
+        args.number,
+        args.repeat,
+        on_result,
+    )
+
+    if args.output:
+        with io.open(args.output, 'wb') as output:
+            output.write(json.dumps(
+                {'meta': get_meta(args), 'results': results},
+                indent=2,
+                sort_keys=True,
+            ).encode('utf-8'))
+
+    if not args.baseline:
+        return 0
+
+    with io.open(args.baseline, 'r', encoding='utf-8') as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline['meta']['version'] != RESULTS_VERSION:
+        print('The baseline has another format, it cannot be compared')
+        return 2
+
+    regressions = compare(results, baseline['results'], args.threshold)
+    for name, expected, actual in regressions:
+        print('Regression: {} took {:.2f} us instead of {:.2f} us'.format(
+            name, actual, expected
+        ))
+    if regressions:
+        return 1
+    print('No regression compared to {}'.format(args.baseline))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+import collections
+import threading
+import time
+
+
+class LRUCache(object):
+    """A thread-safe mapping holding at most `maxsize` items.
+
+    When full, adding an item evicts the least recently used one. If `ttl`
+    is set, items also expire `ttl` seconds after being added. The cache
+    counts hits, misses, evictions and expirations, see `stats`.
+    """
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                # Move the key to the end, as the most recently used one.
+                value, expires = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+
+            if expires is not None and expires <= time.time():
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._data[key] = (value, expires)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires = None
+        if self.ttl is not None:
+            expires = time.time() + self.ttl
+
+        with self._lock:
+            self._data.pop(key, None)
+            if self.maxsize <= 0:
+                return
+
+            while len(self._data) >= self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+            self._data[key] = (value, expires)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
@@ -0,0 +1,113 @@
+"""Dictionaries of frames, so that requests can send frames as ids.
+
+Clients upload a list of frames they send often, and get the id of that
+dictionary. Requests naming that dictionary can then send, in place of any
+frame, its index in the dictionary: `{"frames": [0, "foo", 2]}`.
+
+Dictionaries are immutable, and identified by a hash of their frames: a new
+version of a dictionary is another dictionary, with another id, while the
+previous one can still be used until it is evicted. A client can thus check
+whether a dictionary is known by its id, and upload it only if it is not.
+
+Each dictionary keeps what each signature tool computed about its frames,
+like their classifications, so that tools find it by index instead of
+computing it again or looking it up in their own caches, see
+`CSignatureTool`.
+"""
+import hashlib
+import json
+import threading
+import weakref
+
+import six
+
+from signer.cache import LRUCache
+
+
+def get_dictionary_id(frames):
+    """Return the id of the dictionary of `frames`. """
+    content = json.dumps(frames, sort_keys=True)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+class FrameDictionary(object):
+    """A list of frames, which frames of stacks refer to by index. """
+
+    def __init__(self, frames):
+        self.frames = list(frames)
+        self.id = get_dictionary_id(self.frames)
+        self._frames_by_id = dict(enumerate(self.frames))
+
+        # What tools computed about the frames, dropped with the tool when
+        # siglists change.
+        self._tool_caches = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.frames)
+
+    def is_valid_id(self, frame_id):
+        return (
+            isinstance(frame_id, six.integer_types) and
+            not isinstance(frame_id, bool) and
+            0 <= frame_id < len(self.frames)
+        )
+
+    def decode(self, frames):
+        """Return `frames`, with ids replaced by the frames they refer to.
+        Ids must be valid. """
+        try:
+            # Looking up each frame is faster than checking its type.
+            return list(six.moves.map(self._frames_by_id.get, frames, frames))
+        except TypeError:
+            # Frames given as dicts cannot be looked up.
+            dictionary_frames = self.frames
+            return [
+                dictionary_frames[x] if isinstance(x, six.integer_types)
+                else x
+                for x in frames
+            ]
+
+    def get_tool_cache(self, tool, build):
+        """Return what `tool` keeps about the frames of this dictionary,
+        calling `build(self)` the first time. """
+        try:
+            return self._tool_caches[tool]
+        except KeyError:
+            pass
+
+        with self._lock:
+            if tool not in self._tool_caches:
+                self._tool_caches[tool] = build(self)
+            return self._tool_caches[tool]
+
+
+class FrameDictionaryStore(object):
+    """The dictionaries uploaded by clients, holding at most `maxsize` of
+    them. When full, adding a dictionary evicts the least recently used
+    one. """
+
+    def __init__(self, maxsize):
+        self._dictionaries = LRUCache(maxsize)
+
+    def __len__(self):
+        return len(self._dictionaries)
+
+    def get(self, dictionary_id):
+        """Return the dictionary of id `dictionary_id`, or None. """
+        return self._dictionaries.get(dictionary_id)
+
+    def add(self, frames):
+        """Return a tuple (dictionary, created), the dictionary of `frames`
+        being created if it was not already there. """
+        dictionary = FrameDictionary(frames)
+        # Keep the classifications of a dictionary uploaded again.
+        existing = self._dictionaries.get(dictionary.id)
+        if existing is not None:
+            return existing, False
+
+        self._dictionaries.set(dictionary.id, dictionary)
+        return dictionary, True
+
+    def stats(self):
+        return self._dictionaries.stats()
@@ -0,0 +1,279 @@
+"""An index of the crashes of a corpus by the frames they contain.
+
+    python -m signer.frame_index crashes.jsonl.gz -o frames.db
+
+The index is a SQLite database, built from the same crash records as
+`signer.resign` reads. It keeps C crashes, and the names of each distinct
+frame with the crashes containing it, so that the crashes
+affected by a siglist change can be found without going through the whole
+corpus (see `signer.resign_changes`).
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import logging
+import sqlite3
+import sys
+
+import six
+
+from signer import settings
+from signer.languages.c import normalize_function
+from signer.resign import open_input
+from signer.signer_service import SignerService
+
+
+logger = logging.getLogger(__name__)
+
+# Incremented when the format of the index changes.
+INDEX_VERSION = 3
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)',
+    'CREATE TABLE IF NOT EXISTS crashes ('
+    '  id INTEGER PRIMARY KEY, record_id TEXT, crashed_thread TEXT,'
+    '  frames TEXT)',
+    'CREATE TABLE IF NOT EXISTS frames (id INTEGER PRIMARY KEY, name TEXT)',
+    'CREATE UNIQUE INDEX IF NOT EXISTS frames_name ON frames (name)',
+    'CREATE TABLE IF NOT EXISTS postings ('
+    '  frame INTEGER, crash INTEGER, PRIMARY KEY (frame, crash))',
+)
+
+# Maximum number of parameters of a SQLite query.
+_MAX_PARAMETERS = 500
+
+
+class IndexVersionError(Exception):
+    """Raised when opening an index built differently than expected."""
+
+
+def get_frame_names(frame):
+    """Return the names a frame is indexed by: its function, which siglists
+    are matched against, the module of a DLL frame (`module@0x...`), which
+    prefix signatures are matched against once trimmed by the trim DLL
+    signatures, its normalized function if different, which the signatures
+    with line numbers are matched against, and that followed by its line
+    number if it has one. """
+    line = None
+    if isinstance(frame, dict):
+        line = frame.get('line')
+        frame = frame['function']
+
+    names = (frame,)
+    # Indexed whatever the trim DLL signatures, which can change.
+    module = frame.split('@', 1)[0]
+    if module and module != frame:
+        names += (module,)
+
+    function = normalize_function(
+        frame,
+        settings.COLLAPSE_TEMPLATES,
+        settings.COLLAPSE_ARGUMENTS,
+        settings.FIX_SPACES,
+    )
+    if function != frame:
+        names += (function,)
+    if line is None:
+        return names
+    return names + ('{}:{}'.format(function, line),)
+
+
+class FrameIndex(object):
+    """A persisted mapping of frame names to the crashes containing them.
+
+    Crashes are identified by their index in the corpus. Frames are indexed
+    as normalized with the current settings, which are saved with the index:
+    an `IndexVersionError` is raised when opening an index built with
+    other settings.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        for statement in _SCHEMA:
+            self.db.execute(statement)
+
+        expected = self.get_meta()
+        saved = dict(self.db.execute('SELECT key, value FROM meta'))
+        if not saved:
+            self.db.executemany(
+                'INSERT INTO meta (key, value) VALUES (?, ?)',
+                expected.items()
+            )
+            self.db.commit()
+        elif saved != expected:
+            raise IndexVersionError(
+                'The index {} was built with {}, expected {}'.format(
+                    path, saved, expected
+                )
+            )
+
+        # Frame ids by name, to avoid a query for each frame.
+        self._frame_ids = {}
+
+    @staticmethod
+    def get_meta():
+        return {
+            'version': str(INDEX_VERSION),
+            'collapse_templates': str(settings.COLLAPSE_TEMPLATES),
+            'collapse_arguments': str(settings.COLLAPSE_ARGUMENTS),
+            'fix_spaces': str(settings.FIX_SPACES),
+        }
+
+    def close(self):
+        self.db.close()
+
+    def _get_frame_id(self, name):
+        try:
+            return self._frame_ids[name]
+        except KeyError:
+            pass
+
+        row = self.db.execute(
+            'SELECT id FROM frames WHERE name = ?', (name,)
+        ).fetchone()
+        if row is None:
+            frame_id = self.db.execute(
+                'INSERT INTO frames (name) VALUES (?)', (name,)
+            ).lastrowid
+        else:
+            frame_id = row[0]
+        self._frame_ids[name] = frame_id
+        return frame_id
+
+    def add(self, index, record_id, frames, crashed_thread=None):
+        """Index the crash at `index` in the corpus. """
+        if crashed_thread is not None:
+            crashed_thread = six.text_type(crashed_thread)
+        self.db.execute(
+            'INSERT OR REPLACE INTO crashes '
+            '(id, record_id, crashed_thread, frames) VALUES (?, ?, ?, ?)',
+            (index, record_id, crashed_thread, json.dumps(frames))
+        )
+
+        frame_ids = set()
+        for frame in frames:
+            for name in get_frame_names(frame):
+                frame_ids.add(self._get_frame_id(name))
+        self.db.executemany(
+            'INSERT OR IGNORE INTO postings (frame, crash) VALUES (?, ?)',
+            ((x, index) for x in frame_ids)
+        )
+
+    def commit(self):
+        self.db.commit()
+
+    def iter_frames(self):
+        """Yield `(frame_id, name)` for all indexed frames. """
+        return self.db.execute('SELECT id, name FROM frames')
+
+    def _select_in(self, query, values):
+        """Run `query`, which has an `IN ({})` clause, for all `values`. """
+        values = list(values)
+        for start in range(0, len(values), _MAX_PARAMETERS):
+            chunk = values[start:start + _MAX_PARAMETERS]
+            for row in self.db.execute(
+                query.format(', '.join('?' * len(chunk))), chunk
+            ):
+                yield row
+
+    def get_crash_ids(self, frame_ids):
+        """Return the sorted indexes of the crashes containing one of the
+        frames of `frame_ids`. """
+        return sorted(set(
+            row[0] for row in self._select_in(
+                'SELECT crash FROM postings WHERE frame IN ({})',
+                frame_ids
+            )
+        ))
+
+    def get_crashes(self, crash_ids):
+        """Yield `(index, record_id, frames, crashed_thread)` for each crash
+        of `crash_ids`, by index. """
+        rows = self._select_in(
+            'SELECT id, record_id, frames, crashed_thread FROM crashes '
+            'WHERE id IN ({}) ORDER BY id',
+            crash_ids
+        )
+        for index, record_id, frames, crashed_thread in rows:
+            yield index, record_id, json.loads(frames), crashed_thread
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM crashes').fetchone()[0]
+
+
+def build_index(index, lines, id_field='id', commit_every=10000):
+    """Add the C crash records of JSON `lines` to `index`. Return the
+    number of crashes indexed. """
+    count = 0
+    records = (x for x in lines if x.strip())
+    for position, line in enumerate(records):
+        try:
+            record = json.loads(line.decode('utf-8'))
+        except (ValueError, UnicodeDecodeError):
+            continue
+        if not isinstance(record, dict):
+            continue
+
+        lang = record.get('lang') or settings.DEFAULT_LANGUAGE
+        frames = record.get('frames')
+        if (
+            lang != 'c' or
+            not isinstance(frames, list) or
+            not all(SignerService.is_valid_frame(x) for x in frames)
+        ):
+            continue
+
+        record_id = record.get(id_field)
+        index.add(
+            position,
+            None if record_id is None else six.text_type(record_id),
+            frames,
+            record.get('crashed_thread'),
+        )
+        count += 1
+        if count % commit_every == 0:
+            index.commit()
+            logger.info('Indexed %s crashes', count)
+
+    index.commit()
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m signer.frame_index',
+        description=__doc__.split('\n\n', 1)[0],
+    )
+    parser.add_argument(
+        'input',
+        help='JSONL file of crash records, optionally gzip compressed, or - '
+             'for the standard input'
+    )
+    parser.add_argument(
+        '-o', '--output',
+        required=True,
+        help='index file to create'
+    )
+    parser.add_argument(
+        '--id-field',
+        default='id',
+        help='field of records identifying them'
+    )
+    args = parser.parse_args(argv)
+
+    index = FrameIndex(args.output)
+    lines = open_input(args.input)
+    try:
+        count = build_index(index, lines, args.id_field)
+    finally:
+        lines.close()
+        index.close()
+
+    print('Indexed {} crashes'.format(count))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
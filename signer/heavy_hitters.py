@@ -0,0 +1,300 @@
+"""Most frequent signatures of recent crashes, in a fixed amount of memory.
+
+Signatures returned by `/sign` and `/sign/batch` are counted by language
+over sliding time windows, to see which ones are spiking right now. Time is
+divided into buckets of `bucket_duration` seconds, and each bucket counts
+signatures in a count-min sketch, whose memory does not depend on how many
+different signatures there are, and keeps its `capacity` most frequent
+signatures in a heap. The top signatures of a window are those of its
+buckets, counted again with their sketches. Counts are estimates: they can
+be too high, by at most a small fraction of all counts of the window (see
+`CountMinSketch`), and never too low.
+
+Signatures are counted by a background thread, so that requests do not
+wait for it: they only put their signature in a `BackgroundQueue`, which
+drops it if the queue is full. `GET /admin/top_signatures` shows the top
+signatures.
+"""
+import array
+import heapq
+import math
+import threading
+import time
+
+from signer.background_queue import BackgroundQueue
+
+
+class CountMinSketch(object):
+    """Estimate how many times keys were added with `depth` rows of `width`
+    counters.
+
+    Each key is counted in one counter of each row, chosen by a hash of the
+    key, and its estimate is the smallest of those counters, which other
+    keys might have increased too. Estimates are too high by at most
+    `e / width` of all counts with a probability of `1 - exp(-depth)`.
+    """
+
+    def __init__(self, width, depth):
+        self.width = width
+        self.depth = depth
+        self.rows = [array.array('l', [0]) * width for _ in range(depth)]
+
+    @staticmethod
+    def _get_hashes(key):
+        # Rows use combinations of two halves of one hash, instead of one
+        # hash each (Kirsch and Mitzenmacher, "Less Hashing, Same
+        # Performance").
+        value = hash(key)
+        return value & 0xffffffff, (value >> 32) | 1
+
+    def add(self, key, count=1):
+        """Count `key` `count` more times, and return its estimate. """
+        index, step = self._get_hashes(key)
+        width = self.width
+        estimate = None
+        for row in self.rows:
+            position = index % width
+            value = row[position] + count
+            row[position] = value
+            if estimate is None or value < estimate:
+                estimate = value
+            index += step
+        return estimate
+
+    def estimate(self, key):
+        index, step = self._get_hashes(key)
+        width = self.width
+        estimate = None
+        for row in self.rows:
+            value = row[index % width]
+            if estimate is None or value < estimate:
+                estimate = value
+            index += step
+        return estimate
+
+
+class TopKeys(object):
+    """The `capacity` keys with the highest counts, as given to `update`.
+
+    Counts of keys only increase, so the heap keeps the count of each key
+    when it was pushed, which is a lower bound of its current count, and it
+    is pushed again with its current count when found at the top.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self._heap = []
+
+    def update(self, key, count):
+        counts = self.counts
+        if key in counts:
+            counts[key] = count
+            return
+
+        if len(counts) < self.capacity:
+            counts[key] = count
+            heapq.heappush(self._heap, (count, key))
+            return
+
+        heap = self._heap
+        while heap[0][0] != counts[heap[0][1]]:
+            smallest_key = heap[0][1]
+            heapq.heapreplace(heap, (counts[smallest_key], smallest_key))
+
+        if count > heap[0][0]:
+            _, evicted = heapq.heapreplace(heap, (count, key))
+            del counts[evicted]
+            counts[key] = count
+
+
+def get_buckets(window, bucket_duration):
+    """Return the number of buckets of `bucket_duration` seconds making a
+    window of `window` seconds. """
+    return max(1, int(math.ceil(float(window) / bucket_duration)))
+
+
+class _Bucket(object):
+    """What was counted during a `bucket_duration` of time. """
+
+    def __init__(self, index, width, depth, capacity):
+        self.index = index
+        self.sketch = CountMinSketch(width, depth)
+        self.top = TopKeys(capacity)
+        self.total = 0
+
+    def add(self, key):
+        self.top.update(key, self.sketch.add(key))
+        self.total += 1
+
+
+class SlidingTopKeys(object):
+    """Count keys in the last `buckets` buckets of `bucket_duration`
+    seconds, see `top`. """
+
+    def __init__(self, bucket_duration, buckets, width, depth, capacity):
+        self.bucket_duration = bucket_duration
+        self.width = width
+        self.depth = depth
+        self.capacity = capacity
+        self._buckets = [None] * buckets
+
+    def _get_index(self, timestamp):
+        return int(timestamp // self.bucket_duration)
+
+    def add(self, key, timestamp):
+        index = self._get_index(timestamp)
+        position = index % len(self._buckets)
+        bucket = self._buckets[position]
+        if bucket is None or bucket.index != index:
+            if bucket is not None and bucket.index > index:
+                # Too old to be counted.
+                return
+            bucket = _Bucket(index, self.width, self.depth, self.capacity)
+            self._buckets[position] = bucket
+        bucket.add(key)
+
+    @staticmethod
+    def _estimate(bucket, key):
+        # Other keys may have increased the counters of a top key since it
+        # was last counted, but its count was an estimate then, and still
+        # is, without looking at the sketch.
+        count = bucket.top.counts.get(key)
+        if count is None:
+            count = bucket.sketch.estimate(key)
+        return count
+
+    def top(self, window, now, count=None):
+        """Return a tuple (total, top): how many keys were counted in the
+        last `window` seconds before `now`, and a list of (key, count) of
+        the `count` most frequent ones, most frequent first.
+
+        The window is made of the buckets of those seconds, the last one
+        being in progress: it covers between `window - bucket_duration`
+        and `window` seconds.
+        """
+        last = self._get_index(now)
+        buckets = min(
+            len(self._buckets),
+            get_buckets(window, self.bucket_duration)
+        )
+        window_buckets = [
+            x for x in self._buckets
+            if x is not None and last - buckets < x.index <= last
+        ]
+
+        keys = set()
+        for bucket in window_buckets:
+            keys.update(bucket.top.counts)
+        counts = [
+            (key, sum(self._estimate(x, key) for x in window_buckets))
+            for key in keys
+        ]
+        counts.sort(key=lambda x: (-x[1], x[0]))
+        return sum(x.total for x in window_buckets), counts[:count]
+
+
+class HeavyHitters(object):
+    """Count the signatures of each language over sliding `windows`, lists
+    of numbers of seconds, in a background thread.
+
+    Windows are made of buckets of `bucket_duration` seconds, each of them
+    counting signatures in a `CountMinSketch` of `width` and `depth`, and
+    keeping its `capacity` most frequent ones. At most `queue_size`
+    signatures wait to be counted, others are dropped. Memory is only
+    allocated for languages and buckets that have signatures.
+    """
+
+    def __init__(self, enabled, windows, bucket_duration, width, depth,
+                 capacity, queue_size):
+        self.enabled = enabled
+        self.windows = tuple(sorted(windows))
+        self.bucket_duration = bucket_duration
+        self.width = width
+        self.depth = depth
+        self.capacity = capacity
+        self.queue_size = queue_size
+
+        # Held while counting, and while finding the top signatures, which
+        # requests never wait for.
+        self._counts_lock = threading.Lock()
+        self._queue = BackgroundQueue(
+            self._add_queued, queue_size, 'heavy-hitters', self._counts_lock
+        )
+        self._time = time.time
+        self.reset()
+
+    def reset(self):
+        """Forget all counts. """
+        self._queue.reset()
+        with self._counts_lock:
+            self.counted = 0
+            self.languages = {}
+
+    def submit(self, lang, signature):
+        """Queue `signature` to be counted. This never waits. """
+        if not self.enabled:
+            return
+
+        # Counted when signed, however long it waits.
+        self._queue.put((lang, signature, self._time()))
+
+    def flush(self):
+        """Count all queued signatures now. """
+        self._queue.flush()
+
+    def _add_queued(self, item):
+        # Called by the queue, holding the counts lock.
+        self._add(*item)
+
+    def add(self, lang, signature, timestamp):
+        """Count `signature` of `lang`, signed at `timestamp`. """
+        with self._counts_lock:
+            self._add(lang, signature, timestamp)
+
+    def _add(self, lang, signature, timestamp):
+        counts = self.languages.get(lang)
+        if counts is None:
+            counts = SlidingTopKeys(
+                self.bucket_duration,
+                get_buckets(self.windows[-1], self.bucket_duration),
+                self.width,
+                self.depth,
+                self.capacity,
+            )
+            self.languages[lang] = counts
+        counts.add(signature, timestamp)
+        self.counted += 1
+
+    def status(self, top=None, lang=None):
+        """Return the counts, with the `top` most frequent signatures of
+        each window, for `lang` only if given. """
+        now = self._time()
+        with self._counts_lock:
+            languages = {}
+            for name, counts in self.languages.items():
+                if lang is not None and name != lang:
+                    continue
+
+                windows = {}
+                for window in self.windows:
+                    total, signatures = counts.top(window, now, top)
+                    windows[str(window)] = {
+                        'total': total,
+                        'signatures': [
+                            {'signature': x, 'count': count}
+                            for x, count in signatures
+                        ],
+                    }
+                languages[name] = windows
+            counted = self.counted
+
+        return {
+            'enabled': self.enabled,
+            'windows': list(self.windows),
+            'bucket_duration': self.bucket_duration,
+            'queued': len(self._queue),
+            'counted': counted,
+            'dropped': self._queue.dropped,
+            'languages': languages,
+        }
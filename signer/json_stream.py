@@ -0,0 +1,220 @@
+"""Incremental, size-bounded decoding of JSON request bodies.
+
+The functions in this module read a file-like `stream` chunk by chunk and
+never hold more than one chunk plus the document (or item) currently being
+decoded in memory. They raise `BodyTooLargeError` as soon as a document or
+an item goes over its size limit, and `ValueError` if the content is not
+valid JSON.
+"""
+import codecs
+import json
+
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+class BodyTooLargeError(Exception):
+    """Raised when a body, or an item of a body, is bigger than allowed."""
+
+
+def read_body(stream, max_size, chunk_size):
+    """Return the content of `stream`, reading it chunk by chunk.
+
+    Raise a `BodyTooLargeError` as soon as more than `max_size` bytes
+    have been read.
+    """
+    chunks = []
+    size = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_size:
+            raise BodyTooLargeError(
+                'Body is bigger than {} bytes'.format(max_size)
+            )
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+
+def iter_text(stream, chunk_size):
+    """Yield the content of `stream`, UTF-8 encoded text, chunk by chunk,
+    as it is consumed. Invalid characters are replaced. """
+    decoder = codecs.getincrementaldecoder('utf-8')('replace')
+    while True:
+        chunk = stream.read(chunk_size)
+        text = decoder.decode(chunk, final=not chunk)
+        if text:
+            yield text
+        if not chunk:
+            return
+
+
+def iter_ndjson(stream, max_item_size, chunk_size):
+    """Yield each decoded JSON document of a newline-delimited stream. """
+    # Chunks of a line are joined once it is complete, not one by one.
+    pending = []
+    pending_size = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        pending.append(chunk)
+        pending_size += len(chunk)
+        lines = []
+        if b'\n' in chunk:
+            lines = b''.join(pending).split(b'\n')
+            pending = [lines.pop()]
+            pending_size = len(pending[0])
+        if pending_size > max_item_size:
+            raise BodyTooLargeError(
+                'Item is bigger than {} bytes'.format(max_item_size)
+            )
+
+        for line in lines:
+            if len(line) > max_item_size:
+                raise BodyTooLargeError(
+                    'Item is bigger than {} bytes'.format(max_item_size)
+                )
+            if line.strip():
+                yield json.loads(line.decode('utf-8'))
+
+        if not chunk:
+            break
+
+    pending = b''.join(pending)
+    if pending.strip():
+        yield json.loads(pending.decode('utf-8'))
+
+
+class JSONItemsReader(object):
+    """Iterate over the items of a JSON list without decoding it at once.
+
+    The list is either the whole document, or the value of the `key` field
+    of the document's top-level object. Call `open` to find the beginning
+    of the list, then iterate over this object to get the decoded items.
+    Other fields of the top-level object are decoded and ignored.
+    """
+
+    def __init__(self, stream, key, max_item_size, chunk_size):
+        self.stream = stream
+        self.key = key
+        self.max_item_size = max_item_size
+        self.chunk_size = chunk_size
+
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = u''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self, min_length=0):
+        """Read one more chunk into the buffer, and more until at least
+        `min_length` characters are left to decode. Return False at the
+        end of the stream. """
+        if self._eof:
+            return False
+
+        parts = [self._buffer[self._pos:]]
+        length = len(parts[0])
+        while True:
+            chunk = self.stream.read(self.chunk_size)
+            if not chunk:
+                self._eof = True
+            text = self._decoder.decode(chunk, final=self._eof)
+            parts.append(text)
+            length += len(text)
+            if self._eof or length >= min_length:
+                break
+
+        self._buffer = u''.join(parts)
+        self._pos = 0
+        return True
+
+    def _next_char(self):
+        """Return the next non-whitespace character, and consume it. """
+        while True:
+            while self._pos < len(self._buffer):
+                char = self._buffer[self._pos]
+                self._pos += 1
+                if char not in _WHITESPACE:
+                    return char
+
+            if not self._fill():
+                raise ValueError('Unexpected end of JSON document')
+
+    def _expect(self, expected):
+        char = self._next_char()
+        if char not in expected:
+            raise ValueError(
+                'Expected one of `{}` but found `{}`'.format(expected, char)
+            )
+        return char
+
+    def _decode_value(self):
+        """Decode and return the next JSON value, reading as many chunks as
+        needed. """
+        # Skip whitespace, then put back the first character of the value.
+        self._next_char()
+        self._pos -= 1
+
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self._buffer, self._pos)
+            except ValueError:
+                # The value might be incomplete, read more of it: as much
+                # again as what is buffered, so that a value is decoded a
+                # few times only, however many chunks it spans.
+                self._check_size(len(self._buffer))
+                if self._fill(2 * (len(self._buffer) - self._pos)):
+                    continue
+                raise
+
+            self._check_size(end)
+
+            # A value touching the end of the buffer (a number for example)
+            # might continue in the next chunk.
+            if end == len(self._buffer) and self._fill():
+                continue
+
+            self._pos = end
+            return value
+
+    def _check_size(self, end):
+        if end - self._pos > self.max_item_size:
+            raise BodyTooLargeError(
+                'Item is bigger than {} bytes'.format(self.max_item_size)
+            )
+
+    def open(self):
+        """Move to the beginning of the list. Raise a `KeyError` if the
+        document is an object without the expected key. """
+        char = self._expect('[{')
+        if char == '[':
+            return
+
+        char = self._expect('"}')
+        while char != '}':
+            self._pos -= 1
+            name = self._decode_value()
+            self._expect(':')
+            if name == self.key:
+                self._expect('[')
+                return
+
+            self._decode_value()
+            if self._expect(',}') == '}':
+                break
+            char = self._expect('"')
+
+        raise KeyError(self.key)
+
+    def __iter__(self):
+        if self._next_char() == ']':
+            return
+        self._pos -= 1
+
+        while True:
+            yield self._decode_value()
+            if self._expect(',]') == ']':
+                return
+
@@ -1,67 +1,399 @@
+import collections
+import itertools
 import re
+import time
 
-from signer.signature_tool_base import SignatureToolBase
+import six
+
+from signer.cache import LRUCache
+from signer.metrics import metrics
+from signer.signature_tool_base import DEADLINE_NOTE, SignatureToolBase
+from signer.siglists.compiler import compile_siglist
 from signer import settings, siglists
 
 
+# How a frame is handled when walking the stack:
+#  - irrelevant: the frame is skipped;
+#  - trimmed: the frame matches the trim DLL signatures;
+#  - signature: what the frame adds to the signature (the module name only
+#    for trimmed frames);
+#  - prefix: the frame is a prefix, and the walk goes on after it.
+FrameClassification = collections.namedtuple(
+    'FrameClassification',
+    ('irrelevant', 'trimmed', 'signature', 'prefix')
+)
+
+
+def _get_functions(frames):
+    """Return the function names of `frames`, strings or dicts with a
+    `function`. """
+    return [x['function'] if isinstance(x, dict) else x for x in frames]
+
+
+# Flags of the classification of a frame in a `FrameTable`, see
+# `FrameClassification`.
+IRRELEVANT = 1
+TRIMMED = 2
+PREFIX = 4
+
+
+class FrameTable(object):
+    """The distinct frames of many `stacks`, classified at most once each by
+    `tool`, a `CSignatureTool`, so that stacks are signed as lists of
+    integer ids, see `CSignatureTool.generate_batch`.
+
+    `stacks` holds the stacks as lists of frame ids, and `frames` the frame
+    of each id. Frames given as dicts are distinct if their function or
+    line number is. For each id:
+      - `codes` has the flags of its classification (`IRRELEVANT`,
+        `TRIMMED`, `PREFIX`), or None until it is classified;
+      - `signature_ids` has the index, in `names`, of what it adds to
+        signatures, so that equal names have equal indexes.
+
+    `sentinel_ids` are the ids of the frames whose function is a sentinel.
+    """
+
+    def __init__(self, tool, stacks):
+        self.tool = tool
+
+        unique = set()
+        keys = []
+        dict_frames = {}
+        for stack in stacks:
+            try:
+                unique.update(stack)
+            except TypeError:
+                # Frames given as dicts are not hashable.
+                stack = [self._get_key(x, dict_frames) for x in stack]
+                unique.update(stack)
+            keys.append(stack)
+
+        self.frames = list(unique)
+        ids = dict(six.moves.zip(self.frames, itertools.count()))
+        self.stacks = [list(six.moves.map(ids.__getitem__, x)) for x in keys]
+        if dict_frames:
+            self.frames = [dict_frames.get(x, x) for x in self.frames]
+
+        self.codes = [None] * len(self.frames)
+        self.signature_ids = [None] * len(self.frames)
+        self.names = []
+        self._name_ids = {}
+
+        sentinels = tool.sentinels
+        self.sentinel_ids = frozenset(
+            [ids[x] for x in sentinels.intersection(ids)] +
+            [ids[x] for x in dict_frames if x[0] in sentinels]
+        )
+
+    @staticmethod
+    def _get_key(frame, dict_frames):
+        if not isinstance(frame, dict):
+            return frame
+        key = (frame['function'], frame.get('line'))
+        dict_frames.setdefault(key, frame)
+        return key
+
+    def __len__(self):
+        return len(self.frames)
+
+    def get_function(self, frame_id):
+        frame = self.frames[frame_id]
+        if isinstance(frame, dict):
+            return frame['function']
+        return frame
+
+    def classify(self, frame_id):
+        """Classify the frame `frame_id`, and return its flags. """
+        classification = self.tool.classify(self.frames[frame_id])
+
+        code = (
+            (IRRELEVANT if classification.irrelevant else 0) |
+            (TRIMMED if classification.trimmed else 0) |
+            (PREFIX if classification.prefix else 0)
+        )
+        name_id = self._name_ids.get(classification.signature)
+        if name_id is None:
+            name_id = self._name_ids[classification.signature] = len(
+                self.names
+            )
+            self.names.append(classification.signature)
+
+        self.codes[frame_id] = code
+        self.signature_ids[frame_id] = name_id
+        return code
+
+
+# Number of frames walked between two checks of the deadline.
+DEADLINE_CHECK_INTERVAL = 32
+
+
+class _DeadlineWalk(object):
+    """Iterate over `classifications` until the time is past `deadline`,
+    checked every `DEADLINE_CHECK_INTERVAL` frames, `expired` telling
+    whether the iteration stopped because of it. """
+
+    def __init__(self, classifications, deadline):
+        self.classifications = classifications
+        self.deadline = deadline
+        self.expired = False
+
+    def __iter__(self):
+        deadline = self.deadline
+        for index, classification in enumerate(self.classifications):
+            if (
+                index and
+                not index % DEADLINE_CHECK_INTERVAL and
+                time.time() > deadline
+            ):
+                self.expired = True
+                return
+            yield classification
+
+
+def _nested_brackets_re(opening, closing, depth, literals=(), not_after=()):
+    """Return a regular expression matching text between `opening` and
+    `closing`, including up to `depth` levels of nested brackets.
+
+    `literals` are matched as text, even if they have brackets, and brackets
+    following one of `not_after` are not matched.
+    """
+    start = ''.join(
+        '(?<!{})'.format(re.escape(x)) for x in not_after
+    ) + re.escape(opening) + ''.join(
+        '(?!{})'.format(re.escape(x[1:]))
+        for x in literals if x.startswith(opening)
+    )
+    text = '|'.join(
+        [re.escape(x) for x in literals] +
+        ['[^{}{}]'.format(re.escape(opening), re.escape(closing))]
+    )
+    closing = re.escape(closing)
+
+    regex = '{}(?:{})*{}'.format(start, text, closing)
+    for _ in range(depth - 1):
+        regex = '{}(?:{}|{})*{}'.format(start, text, regex, closing)
+    return re.compile(regex)
+
+
+# The `<` of `operator<` and `operator<<` is not a bracket, and `<name
+# omitted>` is not a template.
+_TEMPLATE_RE = _nested_brackets_re(
+    '<', '>', 8, ('<name omitted>',), ('operator', 'operator<')
+)
+_ARGUMENTS_RE = _nested_brackets_re(
+    '(', ')', 8, ('(anonymous namespace)',)
+)
+
+
+def normalize_function(function, collapse_templates, collapse_arguments,
+                       fix_spaces):
+    """Return the normalized name of a C/C++ function.
+
+    Template parameters become `<T>` if `collapse_templates` is True, and
+    arguments become `()` if `collapse_arguments` is True, up to 8 levels
+    of nested brackets. If `fix_spaces` is True, spaces before `*`, `&` and
+    `,` are removed, and a space is added after commas.
+    """
+    if collapse_templates and '<' in function:
+        function = _TEMPLATE_RE.sub('<T>', function)
+    if collapse_arguments and '(' in function:
+        function = _ARGUMENTS_RE.sub('()', function)
+
+    if fix_spaces:
+        if ' ' in function:
+            function = (
+                function
+                .replace(' *', '*')
+                .replace(' &', '&')
+                .replace(' ,', ',')
+            )
+        if ',' in function:
+            # Add a space after commas not followed by one.
+            function = function.replace(', ', ',').replace(',', ', ')
+    return function
+
+
 class CSignatureTool(SignatureToolBase):
     """This is the class for signature generation tools that work on
-    breakpad C/C++ stacks. """
+    breakpad C/C++ stacks.
+
+    Frame classifications are cached. As the siglists are read when the tool
+    is built, a new tool (with an empty cache) must be built when they
+    change. """
+
+    def __init__(self, siglist_set=None):
+        super(CSignatureTool, self).__init__(siglist_set)
 
-    def __init__(self):
-        super(CSignatureTool, self).__init__()
+        lists = siglist_set
+        if lists is None:
+            # The module has the same attributes as a `SiglistSet`.
+            lists = siglists
 
-        self.irrelevant_signature_re = re.compile(
-            '|'.join(siglists.IRRELEVANT_SIGNATURE_RE)
+        # Matchers prepared by a snapshot of the siglists, if any.
+        matchers = lists.MATCHERS
+
+        self.irrelevant_signature_re = compile_siglist(
+            lists.IRRELEVANT_SIGNATURE_RE,
+            matchers.get('irrelevant_signature_re'),
         )
-        self.prefix_signature_re = re.compile(
-            '|'.join(siglists.PREFIX_SIGNATURE_RE)
+        self.prefix_signature_re = compile_siglist(
+            lists.PREFIX_SIGNATURE_RE,
+            matchers.get('prefix_signature_re'),
         )
-        self.trim_dll_signature_re = re.compile(
-            '|'.join(siglists.TRIM_DLL_SIGNATURE_RE)
+        self.trim_dll_signature_re = compile_siglist(
+            lists.TRIM_DLL_SIGNATURE_RE,
+            matchers.get('trim_dll_signature_re'),
         )
-        self.signature_sentinels = siglists.SIGNATURE_SENTINELS
-
-        self.fixup_space = re.compile(r' (?=[\*&,])')
-        self.fixup_comma = re.compile(r',(?! )')
+        self.signature_sentinels = lists.SIGNATURE_SENTINELS
 
-    def _do_generate(self, frames, crashed_thread):
-        """
-        each element of frames names a frame in the crash stack; and is:
-          - a prefix of a relevant frame: Append this element to the signature
-          - a relevant frame: Append this element and stop looking
-          - irrelevant: Append this element only after seeing a prefix frame
-        The signature is a ' | ' separated string of frame names.
-        """
-        signature_notes = []
-
-        # shorten frames to the first signatureSentinel
-        sentinel_locations = []
+        # Map each sentinel to the conditions under which it applies, None
+        # meaning it always applies.
+        self.sentinel_conditions = {}
         for a_sentinel in self.signature_sentinels:
+            condition_fn = None
             if type(a_sentinel) == tuple:
                 a_sentinel, condition_fn = a_sentinel
-                if not condition_fn(frames):
-                    continue
-            try:
-                sentinel_locations.append(frames.index(a_sentinel))
-            except ValueError:
-                pass
-        if sentinel_locations:
-            frames = frames[min(sentinel_locations):]
+            self.sentinel_conditions.setdefault(a_sentinel, []).append(
+                condition_fn
+            )
+        self.sentinels = frozenset(self.sentinel_conditions)
+
+        self.signatures_with_line_numbers_re = compile_siglist(
+            lists.SIGNATURES_WITH_LINE_NUMBERS_RE,
+            matchers.get('signatures_with_line_numbers_re'),
+        )
+
+        self.classification_cache = LRUCache(
+            settings.FRAME_CLASSIFICATION_CACHE_SIZE
+        )
+
+    def _classify(self, frame):
+        # Frames are matched as sent, only what they add to the signature is
+        # normalized.
+        function = frame['function'] if isinstance(frame, dict) else frame
+        if self.irrelevant_signature_re.match(function):
+            return FrameClassification(True, False, function, False)
+
+        trimmed = False
+        if self.trim_dll_signature_re.match(function):
+            trimmed = True
+            function = frame = function.split('@')[0]
+
+        return FrameClassification(
+            False,
+            trimmed,
+            self.normalize_frame(frame),
+            bool(self.prefix_signature_re.match(function)),
+        )
+
+    def find_sentinel(self, frames, depth=None):
+        """Return the index of the first sentinel in `frames`, or None. If
+        `depth` is not None, only the first `depth` frames are searched.
+        Frames given as dicts are found by their function name.
+
+        Sentinels present in the stack are found in a single pass, whatever
+        the number of sentinels. Only those are then located, and only their
+        conditions are checked.
+        """
+        scanned = frames
+        if depth is not None and len(frames) > depth:
+            scanned = frames[:depth]
+        try:
+            found = self.sentinels.intersection(scanned)
+        except TypeError:
+            # Frames given as dicts are not hashable.
+            return self.find_sentinel(_get_functions(frames), depth)
+        if not found:
+            return None
+
+        for index, a_sentinel in sorted(
+            (frames.index(x), x) for x in found
+        ):
+            if any(
+                condition_fn is None or condition_fn(frames)
+                for condition_fn in self.sentinel_conditions[a_sentinel]
+            ):
+                return index
+
+        return None
+
+    def normalize_frame(self, frame):
+        """Return the normalized function name of a frame, followed by its
+        line number if it matches the signatures with line numbers. """
+        line = None
+        if isinstance(frame, dict):
+            line = frame.get('line')
+            frame = frame['function']
+
+        function = normalize_function(
+            frame,
+            settings.COLLAPSE_TEMPLATES,
+            settings.COLLAPSE_ARGUMENTS,
+            settings.FIX_SPACES,
+        )
+        if (
+            line is not None and
+            self.signatures_with_line_numbers_re.match(function)
+        ):
+            function = '{}:{}'.format(function, line)
+        return function
+
+    def classify(self, frame):
+        """Return the `FrameClassification` of a frame, a string or a dict
+        with a `function` and a `line`. """
+        key = frame
+        if isinstance(frame, dict):
+            # Dicts cannot be cached, the line number is only needed if any.
+            key = frame['function']
+            if frame.get('line') is not None:
+                key = (key, frame['line'])
+
+        classification = self.classification_cache.get(key)
+        if classification is None:
+            classification = self._classify(frame)
+            self.classification_cache.set(key, classification)
+        return classification
+
+    @staticmethod
+    def _build_dictionary_cache(dictionary):
+        """Return the classification of each frame of `dictionary`, by id,
+        None until it is classified. """
+        return [None] * len(dictionary)
+
+    def _iter_dictionary_classifications(self, frames, ids, classifications):
+        """Yield the classification of each frame of `frames`, using those
+        of `classifications`, by id, for the frames whose item of `ids` is
+        an id of the dictionary. """
+        for frame, frame_id in six.moves.zip(frames, ids):
+            if not isinstance(frame_id, six.integer_types):
+                yield self.classify(frame)
+                continue
+
+            classification = classifications[frame_id]
+            if classification is None:
+                classification = self.classify(frame)
+                classifications[frame_id] = classification
+            yield classification
+
+    def walk_frames(self, frames, classifications=None):
+        """Return the parts of the signature of a stack starting at
+        `frames`, see `_do_generate`. `classifications` iterates over the
+        classifications of `frames`, which are classified lazily if it is
+        None. """
+        if classifications is None:
+            classifications = six.moves.map(self.classify, frames)
 
-        # Get all the relevant frame signatures.
         new_signature_list = []
-        for a_signature in frames:
+        for classification in classifications:
             # If the signature matches the irrelevant signatures regex,
             # skip to the next frame.
-            if self.irrelevant_signature_re.match(a_signature):
+            if classification.irrelevant:
                 continue
 
             # If the signature matches the trim dll signatures regex,
-            # rewrite it to remove all but the module name.
-            if self.trim_dll_signature_re.match(a_signature):
-                a_signature = a_signature.split('@')[0]
-
+            # it was rewritten to remove all but the module name.
+            a_signature = classification.signature
+            if classification.trimmed:
                 # If this trimmed DLL signature is the same as the previous
                 # frame's, we do not want to add it.
                 if (
@@ -74,29 +406,200 @@ class CSignatureTool(SignatureToolBase):
 
             # If the signature does not match the prefix signatures regex,
             # then it is the last one we add to the list.
-            if not self.prefix_signature_re.match(a_signature):
+            if not classification.prefix:
                 break
 
+        return new_signature_list
+
+    def _do_generate_with(self, frames, crashed_thread, dictionary=None,
+                          deadline=None):
+        """Like `_do_generate`, for `frames` holding ids of the frames of
+        `dictionary` if not None, and stopping at `deadline`. What is known
+        about the frames of a dictionary is kept by it, and found by id. """
+        if dictionary is None:
+            return self._do_generate(
+                frames, crashed_thread, deadline=deadline
+            )
+        return self._do_generate(
+            dictionary.decode(frames),
+            crashed_thread,
+            frames,
+            dictionary,
+            deadline,
+        )
+
+    def _do_generate(self, frames, crashed_thread, ids=None,
+                     dictionary=None, deadline=None):
+        """
+        each element of frames names a frame in the crash stack; and is:
+          - a prefix of a relevant frame: Append this element to the signature
+          - a relevant frame: Append this element and stop looking
+          - irrelevant: Append this element only after seeing a prefix frame
+        The signature is a ' | ' separated string of frame names.
+
+        If frames were decoded with `dictionary`, `ids` are the frames as
+        sent.
+
+        Sentinels are only looked for in the first
+        `settings.SENTINEL_SCAN_DEPTH` frames. If the time is past
+        `deadline`, the walk stops, and the signature is that of the frames
+        walked until then.
+        """
+        signature_notes = []
+
+        with metrics.timer('sentinel_scan'):
+            # shorten frames to the first signatureSentinel
+            sentinel_index = self.find_sentinel(
+                frames, settings.SENTINEL_SCAN_DEPTH
+            )
+            if sentinel_index is not None:
+                frames = frames[sentinel_index:]
+                if ids is not None:
+                    ids = ids[sentinel_index:]
+
+        # Get all the relevant frame signatures.
+        with metrics.timer('frame_walk'):
+            classifications = None
+            if ids is not None:
+                # What is known about the frames of a dictionary is kept by
+                # it, by id.
+                classifications = self._iter_dictionary_classifications(
+                    frames,
+                    ids,
+                    dictionary.get_tool_cache(
+                        self, self._build_dictionary_cache
+                    ),
+                )
+            walk = None
+            if deadline is not None:
+                if classifications is None:
+                    classifications = six.moves.map(self.classify, frames)
+                walk = classifications = _DeadlineWalk(
+                    classifications, deadline
+                )
+            new_signature_list = self.walk_frames(frames, classifications)
+
+        if walk is not None and walk.expired:
+            signature_notes.append(DEADLINE_NOTE)
+            metrics.inc('deadline_exceeded_signatures')
+
         signature = settings.DELIMITER.join(new_signature_list)
 
         # Handle empty signatures to explain why we failed generating them.
         if signature == '' or signature is None:
-            if crashed_thread is None:
-                signature_notes.append(
-                    'CSignatureTool: No signature could be created because '
-                    'we do not know which thread crashed'
-                )
-                signature = 'EMPTY: no crashing thread identified'
-            else:
-                signature_notes.append(
-                    'CSignatureTool: No proper signature could be created '
-                    'because no good data for the crashing thread ({}) was '
-                    'found'.format(crashed_thread)
-                )
-                try:
-                    signature = frames[0]
-                except IndexError:
-                    signature = 'EMPTY: no frame data available'
+            signature = self._get_empty_signature(
+                frames, crashed_thread, signature_notes
+            )
+
+        return signature, signature_notes
+
+    def _get_empty_signature(self, frames, crashed_thread, signature_notes):
+        """Return the signature of a stack starting at `frames` without any
+        relevant frame, adding why to `signature_notes`. """
+        metrics.inc('empty_signatures')
+        if crashed_thread is None:
+            signature_notes.append(
+                'CSignatureTool: No signature could be created because '
+                'we do not know which thread crashed'
+            )
+            return 'EMPTY: no crashing thread identified'
+
+        signature_notes.append(
+            'CSignatureTool: No proper signature could be created '
+            'because no good data for the crashing thread ({}) was '
+            'found'.format(crashed_thread)
+        )
+        try:
+            return self.normalize_frame(frames[0])
+        except IndexError:
+            return 'EMPTY: no frame data available'
+
+    def generate_batch(self, stacks, crashed_threads=None, dictionary=None,
+                       deadline=None):
+        """Return a list of tuples (signature, signature_notes), one for
+        each stack of `stacks`, the same as `generate` returns for it, with
+        the crashed thread of the same index in `crashed_threads`, if any.
+
+        Stacks signed together mostly share their frames: each distinct
+        frame is classified once (see `FrameTable`), and stacks are walked
+        as lists of integer ids. Stacks holding ids of the frames of
+        `dictionary` are decoded first.
+        """
+        if crashed_threads is None:
+            crashed_threads = [None] * len(stacks)
+        if dictionary is not None:
+            stacks = [dictionary.decode(x) for x in stacks]
+
+        table = FrameTable(self, stacks)
+        return [
+            self.truncate(*self._generate_ids(
+                table, ids, stack, crashed_thread, deadline
+            ))
+            for ids, stack, crashed_thread in six.moves.zip(
+                table.stacks, stacks, crashed_threads
+            )
+        ]
+
+    def _generate_ids(self, table, ids, stack, crashed_thread,
+                      deadline=None):
+        """Like `_do_generate`, for `stack` given as the list of its frame
+        `ids` in `table`, a `FrameTable`. """
+        depth = settings.SENTINEL_SCAN_DEPTH
+        head = ids if len(ids) <= depth else ids[:depth]
+
+        # Sentinels are looked for as in `find_sentinel`.
+        start = 0
+        found = table.sentinel_ids.intersection(head)
+        if found:
+            functions = _get_functions(stack)
+            for index, frame_id in sorted(
+                (head.index(x), x) for x in found
+            ):
+                if any(
+                    condition_fn is None or condition_fn(functions)
+                    for condition_fn in self.sentinel_conditions[
+                        table.get_function(frame_id)
+                    ]
+                ):
+                    start = index
+                    break
+
+        codes = table.codes
+        signature_ids = table.signature_ids
+        new_signature_ids = []
+        walk = itertools.islice(ids, start, None)
+        if deadline is not None:
+            walk = _DeadlineWalk(walk, deadline)
+        for frame_id in walk:
+            code = codes[frame_id]
+            if code is None:
+                code = table.classify(frame_id)
+            if code & IRRELEVANT:
+                continue
+
+            signature_id = signature_ids[frame_id]
+            if (
+                code & TRIMMED and
+                new_signature_ids and
+                signature_id == new_signature_ids[-1]
+            ):
+                continue
+
+            new_signature_ids.append(signature_id)
+            if not code & PREFIX:
+                break
+
+        signature = settings.DELIMITER.join(
+            [table.names[x] for x in new_signature_ids]
+        )
+        signature_notes = []
+        if deadline is not None and walk.expired:
+            signature_notes.append(DEADLINE_NOTE)
+            metrics.inc('deadline_exceeded_signatures')
+        if signature == '':
+            signature = self._get_empty_signature(
+                stack[start:start + 1], crashed_thread, signature_notes
+            )
 
         return signature, signature_notes
 
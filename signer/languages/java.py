@@ -1,12 +1,62 @@
+import itertools
 import re
 
 from signer.signature_tool_base import SignatureToolBase
 from signer import settings
 
 
+_INDENTATION_RE = re.compile(r'[ \t\r]*')
+
+
+def iter_stack_trace_lines(chunks, max_line_length):
+    """Yield the non-blank lines of a raw Java stack trace, made of the text
+    `chunks`, without their surrounding whitespace.
+
+    Lines are found as they are consumed, so that the rest of the trace is
+    neither read nor split. Lines are truncated to `max_line_length`
+    characters, and only that much of a line is kept in memory.
+    """
+    line = ''
+    for chunk in chunks:
+        start = 0
+        while True:
+            end = chunk.find('\n', start)
+            if end == -1:
+                end = len(chunk)
+            if not line:
+                # Indentation does not count in the length of lines.
+                start = min(_INDENTATION_RE.match(chunk, start).end(), end)
+            if len(line) < max_line_length:
+                line += chunk[start:min(end, start + max_line_length -
+                                        len(line))]
+            if end == len(chunk):
+                break
+
+            line = line.strip()
+            if line:
+                yield line
+            line = ''
+            start = end + 1
+
+    line = line.strip()
+    if line:
+        yield line
+
+
+def get_stack_trace_frames(chunks, max_line_length):
+    """Return the frames `JavaSignatureTool` uses of a raw Java stack trace
+    made of the text `chunks`: its exception line, and its first frame line.
+    Nothing more of the trace is read. """
+    return list(itertools.islice(
+        iter_stack_trace_lines(chunks, max_line_length), 2
+    ))
+
+
 class JavaSignatureTool(SignatureToolBase):
     """This is the signature generation class for Java signatures."""
 
+    uses_siglists = False
+
     java_line_number_killer = re.compile(r'\.java\:\d+\)$')
     java_hex_addr_killer = re.compile(r'@[0-9a-f]{8}')
 
@@ -17,6 +67,9 @@ class JavaSignatureTool(SignatureToolBase):
     def _do_generate(self, frames, crashed_thread):
         signature_notes = []
 
+        # Only the first two frames are used.
+        frames = [self.normalize_frame(x) for x in frames[:2]]
+
         try:
             java_exception_class, description = frames[0].split(':', 1)
             java_exception_class = java_exception_class.strip()
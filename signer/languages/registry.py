@@ -0,0 +1,189 @@
+import collections
+import importlib
+import logging
+import threading
+import time
+
+from signer import settings, siglists
+from signer.cache import LRUCache
+from signer.siglists.profiles import UnknownProfileError
+
+
+logger = logging.getLogger(__name__)
+
+
+class UnsupportedLanguageError(Exception):
+    """Raised when asking for a signature tool of an unknown language."""
+
+
+class SignatureToolRegistry(object):
+    """Build each language's signature tool once and share it.
+
+    Building a tool is expensive (the C tool compiles all the siglists
+    regular expressions), while using one is thread-safe: tools hold no
+    per-request state. Tools are thus built lazily on first use, or eagerly
+    by calling `warm_up`, and reused for every following request.
+
+    Tools are built from `siglist_set`, a `siglists.SiglistSet`, or from the
+    siglists shipped with the package if it is None. Calling `set_siglists`
+    builds new tools and swaps them in at once, while requests being
+    processed keep using the previous tools.
+
+    Tools can also be built from the siglists of a profile of `profiles`, a
+    `siglists.profiles.SiglistProfiles`, based on `siglist_set`. Those are
+    built on first use, and at most `profile_cache_size` of them are kept,
+    the least recently used ones being evicted. How many times each profile
+    was used, and its tools built, is counted, see `profile_stats`. Tools of
+    languages whose signatures do not depend on siglists are shared by all
+    profiles.
+    """
+
+    def __init__(self, languages=None, siglist_set=None, profiles=None,
+                 profile_cache_size=None):
+        if languages is None:
+            languages = settings.SUPPORTED_LANGUAGES
+        self.languages = tuple(languages)
+        self.siglist_set = siglist_set
+        self._tools = {}
+        self._lock = threading.Lock()
+
+        if profile_cache_size is None:
+            profile_cache_size = settings.PROFILE_TOOL_CACHE_SIZE
+        self.profiles = profiles
+        self.profile_tools = LRUCache(profile_cache_size)
+        self._profile_uses = collections.Counter()
+        self._profile_builds = collections.Counter()
+        self._profiles_lock = threading.Lock()
+        # Held while building the tool of a key of `profile_tools`, so that
+        # it is built once, while tools of other keys are used or built.
+        self._profile_build_locks = {}
+
+    @property
+    def siglists_version(self):
+        return (self.siglist_set or siglists.get_package_siglists()).version
+
+    def get(self, lang, profile=None):
+        """Return the signature tool for `lang`, and for the siglists of
+        `profile` if not None, building it if needed. Raise an
+        `UnknownProfileError` if that profile does not exist. """
+        if profile is not None:
+            return self._get_profile_tool(lang, profile)
+
+        try:
+            return self._tools[lang]
+        except KeyError:
+            pass
+
+        with self._lock:
+            # Another thread might have built it while we were waiting.
+            if lang not in self._tools:
+                self._tools[lang] = self._build(lang, self.siglist_set)
+            return self._tools[lang]
+
+    def warm_up(self):
+        """Build the signature tools of all supported languages now.
+
+        This is meant to be called at import time, so that forked workers
+        (`gunicorn --preload`) share the built tools.
+        """
+        for lang in self.languages:
+            self.get(lang)
+
+    def set_siglists(self, siglist_set):
+        """Build the tools of all languages from `siglist_set`, then use
+        them instead of the current ones. """
+        tools = dict(
+            (lang, self._build(lang, siglist_set)) for lang in self.languages
+        )
+        with self._lock:
+            self.siglist_set = siglist_set
+            self._tools = tools
+        # Tools of profiles are keyed by version, those of the previous
+        # siglists are not used anymore.
+        with self._profiles_lock:
+            self.profile_tools.clear()
+            self._profile_build_locks = {}
+
+    def set_profiles(self, profiles):
+        """Build tools from the siglists of `profiles` from now on. """
+        with self._profiles_lock:
+            self.profiles = profiles
+            self.profile_tools.clear()
+            self._profile_build_locks = {}
+
+    def _get_profile_tool(self, lang, profile):
+        profiles = self.profiles
+        if profiles is None or profile not in profiles:
+            raise UnknownProfileError(
+                'The profile `{}` does not exist.'.format(profile)
+            )
+
+        if not self._get_class(lang).uses_siglists:
+            tool = self.get(lang)
+        else:
+            siglist_set = self.siglist_set
+            version = (siglist_set or siglists.get_package_siglists()).version
+            key = (profile, lang, version)
+            tool = self.profile_tools.get(key)
+            if tool is None:
+                tool = self._build_profile_tool(
+                    key, profiles, siglist_set
+                )
+
+        with self._profiles_lock:
+            self._profile_uses[profile] += 1
+        return tool
+
+    def _build_profile_tool(self, key, profiles, siglist_set):
+        profile, lang, _ = key
+        with self._profiles_lock:
+            lock = self._profile_build_locks.setdefault(
+                key, threading.Lock()
+            )
+
+        with lock:
+            # Another thread might have built it while we were waiting.
+            tool = self.profile_tools.get(key)
+            if tool is None:
+                tool = self._build(lang, profiles.build(profile, siglist_set))
+                self.profile_tools.set(key, tool)
+                with self._profiles_lock:
+                    self._profile_builds[profile] += 1
+            return tool
+
+    def profile_stats(self):
+        """Return the names of the profiles, the counters of the cache of
+        their tools, and how many times each one was used and had a tool
+        built. """
+        with self._profiles_lock:
+            profiles = self.profiles
+            return {
+                'profiles': [] if profiles is None else profiles.names,
+                'directory': getattr(profiles, 'directory', None),
+                'tools': self.profile_tools.stats(),
+                'uses': dict(self._profile_uses),
+                'builds': dict(self._profile_builds),
+            }
+
+    def _get_class(self, lang):
+        if lang not in self.languages:
+            raise UnsupportedLanguageError(
+                'The language `{}` is not supported.'.format(lang)
+            )
+
+        module = importlib.import_module('signer.languages.{}'.format(lang))
+        return module.SignatureTool
+
+    def _build(self, lang, siglist_set):
+        start = time.time()
+        tool = self._get_class(lang)(siglist_set)
+        logger.info(
+            'Built signature tool for `%s` in %.1f ms',
+            lang,
+            (time.time() - start) * 1000
+        )
+        return tool
+
+
+# The registry shared by the whole application.
+registry = SignatureToolRegistry()
@@ -0,0 +1,65 @@
+"""Media types of requests and responses: JSON, or MessagePack.
+
+Requests are decoded according to their `Content-Type`. Responses, errors
+included, are encoded as MessagePack if the client prefers it according to
+its `Accept` header, or accepts it as much as JSON and sent a MessagePack
+body.
+"""
+import json
+
+from falcon.api_helpers import default_serialize_error
+
+from signer import msgpack_stream
+
+
+JSON_CONTENT_TYPE = 'application/json'
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+MSGPACK_CONTENT_TYPE = 'application/msgpack'
+TEXT_CONTENT_TYPE = 'text/plain'
+
+# The unregistered type is still in use.
+MSGPACK_CONTENT_TYPES = (MSGPACK_CONTENT_TYPE, 'application/x-msgpack')
+
+
+def is_msgpack(content_type):
+    """Return whether `content_type` is that of MessagePack. """
+    media_type = (content_type or '').split(';', 1)[0].strip().lower()
+    return media_type in MSGPACK_CONTENT_TYPES
+
+
+def responds_with_msgpack(req):
+    """Return whether the response to `req` is encoded as MessagePack. """
+    try:
+        return req.context['msgpack']
+    except KeyError:
+        pass
+
+    json_types = (JSON_CONTENT_TYPE, NDJSON_CONTENT_TYPE)
+    # When the client accepts several types as much, the last one wins.
+    if is_msgpack(req.content_type):
+        choices = json_types + MSGPACK_CONTENT_TYPES
+    else:
+        choices = MSGPACK_CONTENT_TYPES + json_types
+
+    req.context['msgpack'] = (
+        req.client_prefers(choices) in MSGPACK_CONTENT_TYPES
+    )
+    return req.context['msgpack']
+
+
+def set_body(req, resp, obj):
+    """Encode `obj` as the body of the response to `req`. """
+    if responds_with_msgpack(req):
+        resp.content_type = MSGPACK_CONTENT_TYPE
+        resp.data = msgpack_stream.dumps(obj)
+    else:
+        resp.body = json.dumps(obj)
+
+
+def serialize_error(req, resp, exception):
+    """Encode errors as MessagePack when needed, and as JSON otherwise. """
+    if responds_with_msgpack(req):
+        resp.content_type = MSGPACK_CONTENT_TYPE
+        resp.data = msgpack_stream.dumps(exception.to_dict())
+    else:
+        default_serialize_error(req, resp, exception)
@@ -0,0 +1,286 @@
+"""Latency histograms and counters, exposed in the Prometheus text format.
+
+Stages of processing a request are timed with `metrics.timer(stage)`, and
+events counted with `metrics.inc(name, *labels)`. When metrics are
+disabled (`settings.METRICS_ENABLED`), both return at once: timers are a
+shared object doing nothing, and nothing is counted.
+
+Metrics are kept by each process, so each worker of a multi-process server
+has its own, and a scrape only gets those of the worker handling it. All
+samples are labeled with the `pid` of that worker, so that counters of
+different workers are never taken for one counter going backwards.
+"""
+import bisect
+import os
+import threading
+from timeit import default_timer
+
+from signer import settings
+
+
+# Stages of processing a request, timed in `signer_stage_duration_seconds`.
+STAGES = (
+    # Reading the request body.
+    'body_read',
+    # Decoding the JSON request body.
+    'decode',
+    # Looking for sentinels in the stack.
+    'sentinel_scan',
+    # Classifying frames until the signature is complete.
+    'frame_walk',
+    # Escaping and truncating the signature.
+    'truncation',
+    # Encoding the response.
+    'serialization',
+)
+
+# Upper bounds, in seconds, of histogram buckets.
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005,
+    0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0,
+)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    return '{{{}}}'.format(','.join(
+        '{}="{}"'.format(
+            name,
+            value.replace('\\', r'\\').replace('\n', r'\n')
+            .replace('"', r'\"')
+        )
+        for name, value in zip(names, values)
+    ))
+
+
+class Counter(object):
+    """A counter for each combination of values of `label_names`. """
+
+    type = 'counter'
+
+    def __init__(self, name, description, label_names=()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + 1
+
+    def get(self, *labels):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        """Yield `(name, label names, label values, value)`. """
+        with self._lock:
+            values = sorted(self._values.items())
+        if not values and not self.label_names:
+            values = [((), 0)]
+        for labels, value in values:
+            yield self.name, self.label_names, labels, value
+
+
+class Histogram(object):
+    """A histogram for each combination of values of `label_names`, with
+    buckets bounded by `buckets`. """
+
+    type = 'histogram'
+
+    def __init__(
+        self,
+        name,
+        description,
+        label_names=(),
+        buckets=DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # Lists of bucket counts, the count of each bucket not including
+        # smaller ones, followed by the sum of values.
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _get_values(self, labels):
+        try:
+            return self._values[labels]
+        except KeyError:
+            values = self._values[labels] = [0] * len(self.buckets)
+            values.append(0.0)
+            return values
+
+    def add_labels(self, *labels):
+        """Make sure `labels` are exposed, even if nothing was observed. """
+        with self._lock:
+            self._get_values(labels)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            values = self._get_values(labels)
+            values[index] += 1
+            values[-1] += value
+
+    def get_count(self, *labels):
+        return sum(self._values.get(labels, [0, 0.0])[:-1])
+
+    def samples(self):
+        """Yield `(name, label names, label values, value)`. """
+        with self._lock:
+            values = sorted((x, list(y)) for x, y in self._values.items())
+
+        bucket_names = self.label_names + ('le',)
+        for labels, counts in values:
+            total = 0
+            for bound, count in zip(self.buckets, counts):
+                total += count
+                yield (
+                    self.name + '_bucket',
+                    bucket_names,
+                    labels + (_format_value(bound),),
+                    total,
+                )
+            yield self.name + '_sum', self.label_names, labels, counts[-1]
+            yield self.name + '_count', self.label_names, labels, total
+
+
+class _Timer(object):
+    """Observe the time spent in a `with` block. """
+
+    __slots__ = ('histogram', 'stage', 'start')
+
+    def __init__(self, histogram, stage):
+        self.histogram = histogram
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = default_timer()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(default_timer() - self.start, self.stage)
+
+
+class _NullTimer(object):
+    """A timer doing nothing, used when metrics are disabled. """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics(object):
+    """The metrics of the application. """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+
+        self.stage_durations = Histogram(
+            'signer_stage_duration_seconds',
+            'Time spent in each stage of processing requests.',
+            ('stage',),
+        )
+        for stage in STAGES:
+            self.stage_durations.add_labels(stage)
+
+        # Counters by name, `signer_<name>_total` being their full name.
+        self.counters = {
+            'signatures': Counter(
+                'signer_signatures_total',
+                'Signatures returned, by language, including cached ones.',
+                ('language',),
+            ),
+            'truncated_signatures': Counter(
+                'signer_truncated_signatures_total',
+                'Signatures truncated because of their length.',
+            ),
+            'empty_signatures': Counter(
+                'signer_empty_signatures_total',
+                'C signatures without any relevant frame.',
+            ),
+            'deadline_exceeded_signatures': Counter(
+                'signer_deadline_exceeded_signatures_total',
+                'Signatures of stacks not fully walked before the request '
+                'deadline.',
+            ),
+            'admissions': Counter(
+                'signer_admissions_total',
+                'Requests admitted or rejected by admission control.',
+                ('outcome',),
+            ),
+        }
+
+    def timer(self, stage):
+        """Return a context manager timing the `with` block it is used in as
+        `stage`. """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self.stage_durations, stage)
+
+    def inc(self, name, *labels):
+        """Increment the counter `signer_<name>_total` for `labels`. """
+        if self.enabled:
+            self.counters[name].inc(*labels)
+
+    def render(self):
+        """Return all metrics in the Prometheus text format, labeled with
+        the pid of this process. """
+        # Read when rendering, as workers are forked after metrics are
+        # created.
+        pid = (str(os.getpid()),)
+        lines = []
+        for metric in (
+            [self.stage_durations] +
+            sorted(self.counters.values(), key=lambda x: x.name)
+        ):
+            lines.append('# HELP {} {}'.format(
+                metric.name, metric.description
+            ))
+            lines.append('# TYPE {} {}'.format(metric.name, metric.type))
+            for name, label_names, labels, value in metric.samples():
+                lines.append('{}{} {}'.format(
+                    name,
+                    _format_labels(('pid',) + label_names, pid + labels),
+                    _format_value(value),
+                ))
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsResource(object):
+    """Expose `metrics` to Prometheus. """
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def on_get(self, req, resp):
+        resp.content_type = CONTENT_TYPE
+        resp.body = self.metrics.render()
+
+
+# The metrics shared by the whole application.
+metrics = Metrics(settings.METRICS_ENABLED)
@@ -2,19 +2,109 @@ import json
 
 import falcon
 
+from signer import admission, json_stream, msgpack_stream, settings
+from signer.media import (
+    MSGPACK_CONTENT_TYPES,
+    NDJSON_CONTENT_TYPE,
+    TEXT_CONTENT_TYPE,
+    is_msgpack,
+)
+from signer.metrics import metrics
+
+
+def _body_too_large(ex):
+    return falcon.HTTPRequestEntityTooLarge(
+        'Request body too large',
+        '{}.'.format(ex)
+    )
+
+
+def _malformed_json():
+    return falcon.HTTPError(
+        falcon.HTTP_753,
+        'Malformed JSON',
+        'Could not decode the request body. The JSON was incorrect or '
+        'not encoded as UTF-8.'
+    )
+
+
+def _malformed_msgpack():
+    return falcon.HTTPError(
+        falcon.HTTP_753,
+        'Malformed MessagePack',
+        'Could not decode the request body. The MessagePack was incorrect '
+        'or its strings not encoded as UTF-8.'
+    )
+
 
 class JSONTranslator(object):
+    """Decode the JSON, or MessagePack, body of requests into
+    `req.context['content']`.
 
-    def process_request(self, req, resp):
+    Bodies are read chunk by chunk, and rejected with a 413 error as soon as
+    they get bigger than `settings.MAX_BODY_SIZE`. Resources that have a
+    truthy `batch` attribute receive `{'items': <iterator>}` instead, where
+    items are decoded one at a time while they are consumed, from either a
+    JSON list (or an object with an `items` list) or a newline-delimited
+    JSON body. MessagePack batches are an array, a map with an `items`
+    array, or maps following each other. Only `settings.MAX_BODY_SIZE`
+    applies to each item in that case, so that batches can be of any size.
+
+    Resources that have a truthy `text` attribute also accept `text/plain`
+    bodies, which are not read here: `req.context['text']` is an iterator
+    over the text of the body, decoded chunk by chunk as it is consumed.
+    """
+
+    def process_resource(self, req, resp, resource, params):
         # req.stream corresponds to the WSGI wsgi.input environ variable,
         # and allows you to read bytes from the request body.
         #
         # See also: PEP 3333
-        if req.content_length in (None, 0):
+        if req.content_length == 0 or (
+            req.content_length is None and
+            'chunked' not in (req.get_header('Transfer-Encoding') or '')
+        ):
             # Nothing to do
             return
 
-        body = req.stream.read()
+        if (req.content_type or '').startswith(TEXT_CONTENT_TYPE):
+            if not getattr(resource, 'text', False):
+                raise falcon.HTTPUnsupportedMediaType(
+                    'This resource does not support text bodies.'
+                )
+            req.context['text'] = json_stream.iter_text(
+                req.stream,
+                settings.READ_CHUNK_SIZE,
+            )
+            return
+
+        if getattr(resource, 'batch', False):
+            req.context['content'] = self._decode_items(req)
+            return
+
+        if (req.content_type or '').startswith(NDJSON_CONTENT_TYPE):
+            raise falcon.HTTPUnsupportedMediaType(
+                'This resource does not support newline-delimited JSON.'
+            )
+
+        # Chunked bodies have no length, they are checked while read.
+        if (req.content_length or 0) > settings.MAX_BODY_SIZE:
+            raise _body_too_large(json_stream.BodyTooLargeError(
+                'Body is bigger than {} bytes'.format(settings.MAX_BODY_SIZE)
+            ))
+
+        msgpack_body = is_msgpack(req.content_type)
+
+        try:
+            with metrics.timer('body_read'):
+                body = json_stream.read_body(
+                    req.stream,
+                    settings.MAX_BODY_SIZE,
+                    settings.READ_CHUNK_SIZE,
+                )
+        except json_stream.BodyTooLargeError as ex:
+            raise _body_too_large(ex)
+
         if not body:
             raise falcon.HTTPBadRequest(
                 'Empty request body',
@@ -22,15 +112,63 @@ class JSONTranslator(object):
             )
 
         try:
-            req.context['content'] = json.loads(body.decode('utf-8'))
-
+            with metrics.timer('decode'):
+                if msgpack_body:
+                    content = msgpack_stream.loads(body)
+                else:
+                    content = json.loads(body.decode('utf-8'))
         except (ValueError, UnicodeDecodeError):
-            raise falcon.HTTPError(
-                falcon.HTTP_753,
-                'Malformed JSON',
-                'Could not decode the request body. The JSON was incorrect or '
-                'not encoded as UTF-8.'
+            raise _malformed_msgpack() if msgpack_body else _malformed_json()
+
+        req.context['content'] = content
+
+    def _decode_items(self, req):
+        if is_msgpack(req.content_type):
+            return {'items': self._translate_errors(
+                msgpack_stream.iter_items(
+                    req.stream,
+                    'items',
+                    settings.MAX_BODY_SIZE,
+                    settings.READ_CHUNK_SIZE,
+                ),
+                _malformed_msgpack,
+            )}
+
+        if (req.content_type or '').startswith(NDJSON_CONTENT_TYPE):
+            items = json_stream.iter_ndjson(
+                req.stream,
+                settings.MAX_BODY_SIZE,
+                settings.READ_CHUNK_SIZE,
+            )
+        else:
+            items = json_stream.JSONItemsReader(
+                req.stream,
+                'items',
+                settings.MAX_BODY_SIZE,
+                settings.READ_CHUNK_SIZE,
             )
+            try:
+                items.open()
+            except KeyError:
+                return {}
+            except (ValueError, UnicodeDecodeError):
+                raise _malformed_json()
+            except json_stream.BodyTooLargeError as ex:
+                raise _body_too_large(ex)
+
+        return {'items': self._translate_errors(items, _malformed_json)}
+
+    @staticmethod
+    def _translate_errors(items, malformed):
+        """Yield `items`, turning decoding errors into HTTP errors,
+        `malformed` returning that of invalid content. """
+        try:
+            for item in items:
+                yield item
+        except (ValueError, UnicodeDecodeError):
+            raise malformed()
+        except json_stream.BodyTooLargeError as ex:
+            raise _body_too_large(ex)
 
     def process_response(self, req, resp, resource):
         if 'result' not in req.context:
@@ -40,18 +178,114 @@ class JSONTranslator(object):
 
 
 class RequireJSON(object):
+    """Reject requests not encoded as JSON or MessagePack (or text, see
+    `JSONTranslator`), or whose responses cannot be. """
 
     def process_request(self, req, resp):
-        if not req.client_accepts_json:
+        if not (
+            req.client_accepts_json or
+            req.client_accepts(NDJSON_CONTENT_TYPE) or
+            any(req.client_accepts(x) for x in MSGPACK_CONTENT_TYPES)
+        ):
             raise falcon.HTTPNotAcceptable(
-                'This API only supports responses encoded as JSON.',
+                'This API only supports responses encoded as JSON or '
+                'MessagePack.',
                 href='http://docs.examples.com/api/json')
 
         if req.method in ('POST', 'PUT'):
             if (
-                not req.content_type or
-                'application/json' not in req.content_type
+                not req.content_type or (
+                    'application/json' not in req.content_type and
+                    NDJSON_CONTENT_TYPE not in req.content_type and
+                    TEXT_CONTENT_TYPE not in req.content_type and
+                    not is_msgpack(req.content_type)
+                )
             ):
                 raise falcon.HTTPUnsupportedMediaType(
-                    'This API only supports requests encoded as JSON.',
+                    'This API only supports requests encoded as JSON or '
+                    'MessagePack.',
                     href='http://docs.examples.com/api/json')
+
+
+class PollSiglists(object):
+    """Let a `SiglistsReloader` check for siglist changes. """
+
+    def __init__(self, reloader):
+        self.reloader = reloader
+
+    def process_request(self, req, resp):
+        self.reloader.poll()
+
+
+class _ReleasingStream(object):
+    """Iterate over `stream`, calling `release` once it is exhausted or
+    closed, which WSGI servers do even if they stop reading it. """
+
+    def __init__(self, stream, release):
+        self._stream = iter(stream)
+        self._release = release
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._stream)
+        except BaseException:
+            self.close()
+            raise
+
+    next = __next__
+
+    def close(self):
+        release, self._release = self._release, None
+        if release is None:
+            return
+        try:
+            close = getattr(self._stream, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            release()
+
+
+class AdmissionControl(object):
+    """Process requests for resources that have a truthy `limited` attribute
+    only when `limiter`, a `admission.ConcurrencyLimiter`, admits them, and
+    reject them with a `503` error otherwise, telling clients to retry after
+    `retry_after` seconds.
+
+    Admitted requests get a deadline, `req.context['deadline']`, `deadline`
+    seconds from then (no deadline if 0). Streamed responses keep their
+    place until they are fully sent.
+    """
+
+    def __init__(self, limiter, retry_after, deadline=0):
+        self.limiter = limiter
+        self.retry_after = retry_after
+        self.deadline = deadline
+
+    def process_resource(self, req, resp, resource, params):
+        if not getattr(resource, 'limited', False):
+            return
+
+        if not self.limiter.acquire():
+            metrics.inc('admissions', 'rejected')
+            raise falcon.HTTPServiceUnavailable(
+                'Too many requests',
+                'The service is overloaded, try again later.',
+                self.retry_after,
+            )
+
+        metrics.inc('admissions', 'admitted')
+        req.context['admitted'] = True
+        req.context['deadline'] = admission.get_deadline(self.deadline)
+
+    def process_response(self, req, resp, resource):
+        if not req.context.pop('admitted', False):
+            return
+
+        if resp.stream is None:
+            self.limiter.release()
+        else:
+            resp.stream = _ReleasingStream(resp.stream, self.limiter.release)
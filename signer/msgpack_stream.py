@@ -0,0 +1,123 @@
+"""Size-bounded decoding of MessagePack request bodies.
+
+Like `signer.json_stream`, items are read chunk by chunk and decoded one
+at a time. `BodyTooLargeError` is raised as soon as an item goes over its
+size limit, and `ValueError` if the content is not valid MessagePack.
+"""
+import msgpack
+
+from signer.json_stream import BodyTooLargeError
+
+
+# First bytes of arrays and maps: fixarray, array 16 and array 32, then
+# fixmap, map 16 and map 32.
+_ARRAY_HEADERS = frozenset(list(range(0x90, 0xa0)) + [0xdc, 0xdd])
+_MAP_HEADERS = frozenset(list(range(0x80, 0x90)) + [0xde, 0xdf])
+
+
+def loads(body):
+    """Decode a whole MessagePack document. """
+    try:
+        return msgpack.unpackb(body, raw=False)
+    except (msgpack.UnpackException, TypeError) as ex:
+        # Invalid data, or maps with keys which cannot be dict keys.
+        raise ValueError('Invalid MessagePack data: {}'.format(ex))
+
+
+def dumps(obj):
+    # Strings are `str` on Python 2, they must not be encoded as binary.
+    return msgpack.packb(obj, use_bin_type=False)
+
+
+class _Reader(object):
+    """Feed the chunks of `stream` to an unpacker, as values are read. """
+
+    def __init__(self, stream, max_item_size, chunk_size):
+        self.stream = stream
+        self.max_item_size = max_item_size
+        self.chunk_size = chunk_size
+        self.unpacker = msgpack.Unpacker(
+            raw=False,
+            max_buffer_size=max_item_size + chunk_size,
+        )
+        self.first_byte = None
+        # Number of bytes read from the stream, and decoded.
+        self.size = 0
+        self.position = 0
+
+    def fill(self):
+        """Read one more chunk. Return False at the end of the stream. """
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            return False
+
+        if self.first_byte is None:
+            self.first_byte = bytearray(chunk[:1])[0]
+        self.size += len(chunk)
+        try:
+            self.unpacker.feed(chunk)
+        except msgpack.BufferFull:
+            raise BodyTooLargeError(
+                'Item is bigger than {} bytes'.format(self.max_item_size)
+            )
+        return True
+
+    def read(self, method, end=None):
+        """Return the result of `method`, a method of the unpacker, reading
+        as many chunks as needed. If the stream ends before any other value,
+        return `end` if it is not None. """
+        while True:
+            try:
+                value = method()
+            except msgpack.OutOfData:
+                if self.fill():
+                    continue
+                if end is not None and self.position == self.size:
+                    return end
+                raise ValueError('Unexpected end of MessagePack data')
+            except (msgpack.UnpackException, TypeError) as ex:
+                raise ValueError('Invalid MessagePack data: {}'.format(ex))
+
+            self.position = self.unpacker.tell()
+            return value
+
+
+def iter_items(stream, key, max_item_size, chunk_size):
+    """Yield the items of a MessagePack body, one at a time.
+
+    Items are either those of an array, of the `key` array of a map, or
+    the values following each other in the body if it starts with a map
+    without `key`.
+    """
+    reader = _Reader(stream, max_item_size, chunk_size)
+    if not reader.fill():
+        return
+    unpacker = reader.unpacker
+
+    if reader.first_byte in _ARRAY_HEADERS:
+        for _ in range(reader.read(unpacker.read_array_header)):
+            yield reader.read(unpacker.unpack)
+        return
+
+    if reader.first_byte in _MAP_HEADERS:
+        fields = {}
+        for _ in range(reader.read(unpacker.read_map_header)):
+            name = reader.read(unpacker.unpack)
+            if name == key:
+                for _ in range(reader.read(unpacker.read_array_header)):
+                    yield reader.read(unpacker.unpack)
+                return
+            try:
+                fields[name] = reader.read(unpacker.unpack)
+            except TypeError:
+                raise ValueError('Invalid map key {!r}'.format(name))
+
+        # That map was the first item of a stream of items.
+        yield fields
+
+    end = object()
+    while True:
+        item = reader.read(unpacker.unpack, end)
+        if item is end:
+            return
+        yield item
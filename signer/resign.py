@@ -0,0 +1,469 @@
+"""Sign a corpus of crashes again, for example after siglists changed.
+
+    python -m signer.resign crashes.jsonl.gz -o signatures.jsonl
+
+The input has one JSON crash record per line, optionally gzip compressed:
+`{"lang": "c", "frames": [...], "crashed_thread": 0, "signature": "..."}`.
+`lang` and `crashed_thread` are optional, like in requests to the service,
+and `signature` is the current signature of the crash, if known.
+
+Records are read as they are signed, and signed by a pool of processes,
+each one building the signature tools once. The output has one line per
+record, in input order: `{"index": ..., "signature": ..., "notes": [...]}`,
+with the `id` of the record (see `--id-field`) and its
+`previous_signature` if it had one, or `{"index": ..., "error": {...}}` if
+the record could not be signed.
+
+With `--checkpoint`, progress is saved regularly and the command can be run
+again with `--resume` to continue where it stopped.
+"""
+from __future__ import print_function
+
+import argparse
+import collections
+import gzip
+import io
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+import falcon
+
+from signer import settings
+from signer.languages.registry import SignatureToolRegistry
+from signer.siglists import load_siglists
+from signer.signer_service import BatchSignerService, SignerService
+
+
+logger = logging.getLogger(__name__)
+
+_GZIP_MAGIC = b'\x1f\x8b'
+
+# The service used by each worker process, see `_init_worker`.
+_service = None
+
+
+def open_input(path):
+    """Return a binary file object reading `path`, or the standard input if
+    it is `-`, decompressing it if it is gzip compressed. """
+    if path == '-':
+        stream = io.open(sys.stdin.fileno(), 'rb', closefd=False)
+    else:
+        stream = io.open(path, 'rb')
+
+    if stream.peek(2)[:2] == _GZIP_MAGIC:
+        return gzip.GzipFile(fileobj=stream, mode='rb')
+    return stream
+
+
+class OutputWriter(object):
+    """Write lines to `path`, gzip compressed if it ends with `.gz`.
+
+    `checkpoint` makes sure everything written so far is on disk, and
+    returns the size of the file, which can be given as `offset` to go on
+    writing after that point, dropping anything written after it. Gzip
+    compressed output is written as one gzip member per checkpoint, which
+    gzip readers read as a single file.
+    """
+
+    def __init__(self, path, offset=None):
+        self.path = path
+        self.compress = path.endswith('.gz')
+
+        if offset is None:
+            self._file = io.open(path, 'wb')
+        else:
+            self._file = io.open(path, 'r+b')
+            self._file.truncate(offset)
+            self._file.seek(offset)
+        self._stream = self._open_stream()
+
+    def _open_stream(self):
+        if self.compress:
+            return gzip.GzipFile(fileobj=self._file, mode='wb')
+        return self._file
+
+    def write(self, lines):
+        for line in lines:
+            self._stream.write(line)
+
+    def checkpoint(self):
+        if self.compress:
+            self._stream.close()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        offset = self._file.tell()
+
+        if self.compress:
+            self._stream = self._open_stream()
+        return offset
+
+    def close(self):
+        if self.compress:
+            self._stream.close()
+        self._file.close()
+
+
+class Summary(object):
+    """Count records by status, and report progress. """
+
+    # Each record is one of these.
+    STATUSES = ('changed', 'unchanged', 'new', 'error')
+
+    def __init__(self, counts=None):
+        self.counts = collections.Counter(counts or {})
+        self.start = time.time()
+        # Records counted before this run, when resuming.
+        self.initial = self.records
+
+    @property
+    def records(self):
+        return sum(self.counts.values())
+
+    def add(self, statuses):
+        self.counts.update(statuses)
+
+    def throughput(self):
+        """Return the number of records signed per second in this run. """
+        elapsed = time.time() - self.start
+        if not elapsed:
+            return 0.0
+        return (self.records - self.initial) / elapsed
+
+    def as_dict(self):
+        return dict((x, self.counts[x]) for x in self.STATUSES)
+
+    def __str__(self):
+        return '{} records ({}), {:.0f} records/s'.format(
+            self.records,
+            ', '.join(
+                '{} {}'.format(self.counts[x], x) for x in self.STATUSES
+            ),
+            self.throughput(),
+        )
+
+
+def _init_worker(siglists_dir):
+    """Build the signature tools of a worker process. """
+    global _service
+
+    siglist_set = None
+    if siglists_dir:
+        siglist_set = load_siglists(siglists_dir)
+    registry = SignatureToolRegistry(siglist_set=siglist_set)
+    registry.warm_up()
+    _service = SignerService(tools=registry)
+
+
+def load_record(line):
+    """Return the crash record of a JSON `line`, or None if it is not
+    JSON. """
+    try:
+        return json.loads(line.decode('utf-8'))
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def validate_record(service, record):
+    """Return a tuple (lang, frames) for a crash record. Raise a
+    `falcon.HTTPBadRequest` if it is not valid. """
+    if not isinstance(record, dict):
+        raise falcon.HTTPBadRequest(
+            'Invalid record',
+            'Each record must be a JSON object.'
+        )
+    lang = record.get('lang') or settings.DEFAULT_LANGUAGE
+    frames = record.get('frames')
+    service.validate(lang, frames)
+    return lang, frames
+
+
+def format_result(record, index, id_field, signature=None, notes=None,
+                  error=None):
+    """Return the output line of the record of `index`, signed as
+    `signature` with `notes`, or not signed because of `error`, and its
+    status, see `Summary.STATUSES`. """
+    if error is not None:
+        result = BatchSignerService._error_result(error)
+        status = 'error'
+    else:
+        result = {'signature': signature, 'notes': notes}
+        previous = record.get('signature')
+        if previous is None:
+            status = 'new'
+        else:
+            result['previous_signature'] = previous
+            status = 'unchanged' if previous == signature else 'changed'
+
+    result['index'] = index
+    if isinstance(record, dict) and id_field in record:
+        result[id_field] = record[id_field]
+    return (json.dumps(result) + '\n').encode('utf-8'), status
+
+
+def sign_records(service, lines, start, id_field):
+    """Sign the crash records of JSON `lines`, indexed from `start`. Return
+    a list of the output line and the status of each record, see
+    `Summary.STATUSES`. C crashes are signed together, see
+    `CSignatureTool.generate_batch`. """
+    results = []
+    batch = []
+    for index, line in enumerate(lines, start):
+        record = load_record(line)
+        try:
+            lang, frames = validate_record(service, record)
+        except falcon.HTTPError as ex:
+            results.append(format_result(record, index, id_field, error=ex))
+            continue
+
+        if lang == 'c':
+            # Signed below, with all C crashes of `lines`.
+            results.append(None)
+            batch.append((index, record))
+            continue
+
+        signature, notes = service.tools.get(lang).generate(
+            frames,
+            record.get('crashed_thread'),
+        )
+        results.append(
+            format_result(record, index, id_field, signature, notes)
+        )
+
+    if batch:
+        signed = service.tools.get('c').generate_batch(
+            [record['frames'] for _, record in batch],
+            [record.get('crashed_thread') for _, record in batch],
+        )
+        for (index, record), (signature, notes) in zip(batch, signed):
+            results[index - start] = format_result(
+                record, index, id_field, signature, notes
+            )
+    return results
+
+
+def _sign_chunk(args):
+    start, lines, id_field = args
+    return sign_records(_service, lines, start, id_field)
+
+
+def iter_chunks(lines, size, start=0):
+    """Yield `(index, lines)` for chunks of `size` lines, `index` being that
+    of the first line of the chunk, counted from `start`. """
+    lines = iter(lines)
+    while True:
+        chunk = list(itertools.islice(lines, size))
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
+
+
+def resign(
+    chunks,
+    writer,
+    summary,
+    pool,
+    max_pending,
+    id_field='id',
+    on_chunk=None,
+):
+    """Sign the records of `chunks` (see `iter_chunks`) with the processes
+    of `pool`, and write the results with `writer` in input order.
+
+    At most `max_pending` chunks are read ahead, so that the input is not
+    all read in memory. `on_chunk` is called with the index of the next
+    record after each chunk is written.
+    """
+    pending = collections.deque()
+
+    def write_next():
+        start, size, async_result = pending.popleft()
+        results = async_result.get()
+        writer.write(line for line, _ in results)
+        summary.add(status for _, status in results)
+        if on_chunk is not None:
+            on_chunk(start + size)
+
+    for start, lines in chunks:
+        pending.append((
+            start,
+            len(lines),
+            pool.apply_async(_sign_chunk, ((start, lines, id_field),)),
+        ))
+        if len(pending) >= max_pending:
+            write_next()
+
+    while pending:
+        write_next()
+
+
+def load_checkpoint(path):
+    with io.open(path, 'r', encoding='utf-8') as checkpoint_file:
+        return json.load(checkpoint_file)
+
+
+def save_checkpoint(path, checkpoint):
+    # Write to another file first, so that the checkpoint is never left
+    # half-written.
+    tmp_path = path + '.tmp'
+    with io.open(tmp_path, 'wb') as checkpoint_file:
+        checkpoint_file.write(json.dumps(checkpoint).encode('utf-8'))
+    os.rename(tmp_path, path)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m signer.resign',
+        description=__doc__.split('\n\n', 1)[0],
+    )
+    parser.add_argument(
+        'input',
+        help='JSONL file of crash records, optionally gzip compressed, or - '
+             'for the standard input'
+    )
+    parser.add_argument(
+        '-o', '--output',
+        required=True,
+        help='JSONL file to write signatures to, compressed if it ends '
+             'with .gz'
+    )
+    parser.add_argument(
+        '--siglists',
+        default=settings.SIGLISTS_DIR,
+        help='directory of the siglists to use, instead of those shipped '
+             'with the package'
+    )
+    parser.add_argument(
+        '-j', '--processes',
+        type=int,
+        default=multiprocessing.cpu_count(),
+        help='number of signing processes (default: number of CPUs)'
+    )
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=1000,
+        help='number of records sent to a process at once'
+    )
+    parser.add_argument(
+        '--id-field',
+        default='id',
+        help='field of records copied to the output to identify them'
+    )
+    parser.add_argument(
+        '--checkpoint',
+        help='file where progress is saved, to resume with --resume'
+    )
+    parser.add_argument(
+        '--checkpoint-every',
+        type=int,
+        default=100000,
+        help='number of records between two checkpoints'
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='continue from the last checkpoint'
+    )
+    parser.add_argument(
+        '--progress-every',
+        type=float,
+        default=10,
+        help='number of seconds between two progress reports'
+    )
+    return parser
+
+
+def main(argv=None):
+    parser = get_parser()
+    args = parser.parse_args(argv)
+
+    if args.resume and not args.checkpoint:
+        parser.error('--resume requires --checkpoint')
+
+    input_path = args.input
+    if input_path != '-':
+        input_path = os.path.abspath(input_path)
+
+    skip = 0
+    offset = None
+    summary = Summary()
+    if args.resume and os.path.exists(args.checkpoint):
+        checkpoint = load_checkpoint(args.checkpoint)
+        if checkpoint['input'] != input_path:
+            parser.error('the checkpoint is for {}'.format(
+                checkpoint['input']
+            ))
+        skip = checkpoint['records']
+        offset = checkpoint['offset']
+        summary = Summary(checkpoint['summary'])
+        logger.info('Resuming after %s records', skip)
+
+    lines = open_input(args.input)
+    writer = OutputWriter(args.output, offset)
+    records = (x for x in lines if x.strip())
+    chunks = iter_chunks(
+        itertools.islice(records, skip, None),
+        args.chunk_size,
+        skip,
+    )
+
+    state = {
+        'checkpoint': skip,
+        'progress': time.time(),
+    }
+
+    def on_chunk(records):
+        now = time.time()
+        if now - state['progress'] >= args.progress_every:
+            state['progress'] = now
+            logger.info('Progress: %s', summary)
+
+        if (
+            args.checkpoint and
+            records - state['checkpoint'] >= args.checkpoint_every
+        ):
+            state['checkpoint'] = records
+            save_checkpoint(args.checkpoint, {
+                'input': input_path,
+                'records': records,
+                'offset': writer.checkpoint(),
+                'summary': summary.as_dict(),
+            })
+
+    pool = multiprocessing.Pool(
+        args.processes,
+        _init_worker,
+        (args.siglists,),
+    )
+    try:
+        resign(
+            chunks,
+            writer,
+            summary,
+            pool,
+            # Keep all processes busy while results are written.
+            2 * args.processes,
+            args.id_field,
+            on_chunk,
+        )
+    finally:
+        pool.terminate()
+        writer.close()
+        lines.close()
+
+    if args.checkpoint and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    logger.info('Done: %s', summary)
+    print(json.dumps(summary.as_dict()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
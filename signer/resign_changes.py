@@ -0,0 +1,139 @@
+"""Sign again the crashes affected by a change of siglists.
+
+    python -m signer.resign_changes old_siglists/ new_siglists/ \\
+        --index frames.db -o changes.jsonl
+
+A frame is classified differently with the new siglists only if it matches
+a pattern added to or removed from a siglist, or is an added or removed
+sentinel. Such frames are looked for in the frame index of the corpus (see
+`signer.frame_index`), and only the crashes containing one are signed again,
+with the old and the new siglists. The output has a line for each crash
+whose signature changed: `{"index": ..., "id": ..., "before": ...,
+"after": ...}`.
+"""
+from __future__ import print_function
+
+import argparse
+import io
+import json
+import logging
+import sys
+
+from signer.languages.c import CSignatureTool
+from signer.frame_index import FrameIndex
+from signer.siglists import load_siglists
+from signer.siglists.compiler import compile_siglist
+from signer.siglists.diff import diff_siglists
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_changed_frame_matcher(changes):
+    """Return a function telling whether a frame name might be classified
+    differently after `changes` (see `diff_siglists`). """
+    patterns = []
+    sentinels = set()
+    for name, (added, removed) in changes.items():
+        for line in added + removed:
+            if name == 'signature_sentinels':
+                if isinstance(line, tuple):
+                    line = line[0]
+                sentinels.add(line)
+            else:
+                patterns.append(line)
+
+    matcher = compile_siglist(patterns)
+
+    def is_changed(frame):
+        return frame in sentinels or bool(matcher.match(frame))
+
+    return is_changed
+
+
+def find_affected_crashes(index, changes):
+    """Return the indexes of the crashes of `index` containing a frame that
+    might be classified differently after `changes`. """
+    is_changed = get_changed_frame_matcher(changes)
+    frame_ids = [
+        frame_id for frame_id, name in index.iter_frames()
+        if is_changed(name)
+    ]
+    logger.info('%s frames match changed siglists lines', len(frame_ids))
+    return index.get_crash_ids(frame_ids)
+
+
+def iter_changed_signatures(index, old_siglists, new_siglists, crash_ids):
+    """Sign the crashes of `crash_ids` with both `SiglistSet`, and yield
+    the crashes whose signature changed. """
+    old_tool = CSignatureTool(old_siglists)
+    new_tool = CSignatureTool(new_siglists)
+    for crash_index, record_id, frames, crashed_thread in index.get_crashes(
+        crash_ids
+    ):
+        before, _ = old_tool.generate(frames, crashed_thread)
+        after, _ = new_tool.generate(frames, crashed_thread)
+        if before != after:
+            yield {
+                'index': crash_index,
+                'id': record_id,
+                'before': before,
+                'after': after,
+            }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m signer.resign_changes',
+        description=__doc__.split('\n\n', 1)[0],
+    )
+    parser.add_argument('old', help='directory of the old siglists')
+    parser.add_argument('new', help='directory of the new siglists')
+    parser.add_argument(
+        '--index',
+        required=True,
+        help='frame index of the corpus, see signer.frame_index'
+    )
+    parser.add_argument(
+        '-o', '--output',
+        default='-',
+        help='JSONL file to write changed signatures to (default: the '
+             'standard output)'
+    )
+    args = parser.parse_args(argv)
+
+    old_siglists = load_siglists(args.old)
+    new_siglists = load_siglists(args.new)
+    changes = diff_siglists(old_siglists, new_siglists)
+    for name, (added, removed) in sorted(changes.items()):
+        logger.info(
+            '%s: %s lines added, %s removed', name, len(added), len(removed)
+        )
+
+    index = FrameIndex(args.index)
+    if args.output == '-':
+        output = io.open(sys.stdout.fileno(), 'wb', closefd=False)
+    else:
+        output = io.open(args.output, 'wb')
+
+    count = 0
+    try:
+        crash_ids = find_affected_crashes(index, changes) if changes else []
+        logger.info(
+            'Signing %s of %s crashes again', len(crash_ids), len(index)
+        )
+        for result in iter_changed_signatures(
+            index, old_siglists, new_siglists, crash_ids
+        ):
+            output.write((json.dumps(result) + '\n').encode('utf-8'))
+            count += 1
+    finally:
+        output.close()
+        index.close()
+
+    logger.info('%s signatures changed', count)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,3 +1,6 @@
+import os
+
+
 # The list of languages for which we can generate signatures.
 SUPPORTED_LANGUAGES = (
     'c',
@@ -19,5 +22,170 @@ SIGNATURE_MAX_LENGTH = 255
 # Whether or not to escape single quotes (with another single quote).
 ESCAPE_SINGLE_QUOTE = True
 
+# Whether or not to collapse template parameters during C signatures
+# normalization.
+COLLAPSE_TEMPLATES = False
+
 # Whether or not to collapse arguments during C signatures normalization.
 COLLAPSE_ARGUMENTS = False
+
+# Whether or not to fix spaces during C signatures normalization: spaces
+# before `*`, `&` and `,` are removed, and a space is added after commas.
+# This changes the signatures of most frames with arguments, for example
+# `Foo(bool,bool *)` becomes `Foo(bool, bool*)`.
+FIX_SPACES = False
+
+# Level of the application's logs.
+LOG_LEVEL = 'INFO'
+
+# Maximum size, in bytes, of a request body. For batch requests, this is the
+# maximum size of each item.
+MAX_BODY_SIZE = 4 * 1024 * 1024
+
+# Size, in bytes, of the chunks in which request bodies are read.
+READ_CHUNK_SIZE = 64 * 1024
+
+# Maximum number of frames in a stack.
+MAX_FRAMES = int(os.environ.get('MAX_FRAMES', 10000))
+
+# Maximum number of threads in a crash.
+MAX_THREADS = 1024
+
+# Maximum length of a frame.
+MAX_FRAME_LENGTH = int(os.environ.get('MAX_FRAME_LENGTH', 4096))
+
+# Number of frames, from the top of a C stack, in which sentinels are looked
+# for. Sentinels below them are ignored.
+SENTINEL_SCAN_DEPTH = int(os.environ.get('SENTINEL_SCAN_DEPTH', 10000))
+
+# Maximum number of frame classifications cached by the C signature tool.
+FRAME_CLASSIFICATION_CACHE_SIZE = 50000
+
+# Directory to load siglists from. If not set, the siglists shipped with this
+# package are used, and cannot be reloaded.
+SIGLISTS_DIR = os.environ.get('SIGLISTS_DIR')
+
+# Minimum number of seconds between two checks for changes of the siglists
+# in SIGLISTS_DIR. Set to 0 to only reload them with the admin endpoint.
+SIGLISTS_POLL_INTERVAL = int(os.environ.get('SIGLISTS_POLL_INTERVAL', 30))
+
+# Directory of siglists profiles, `<name>.json` files adding lines to the
+# siglists and removing lines from them (see `signer.siglists.profiles`),
+# selected by the `profile` query parameter. Profiles are disabled if not
+# set.
+SIGLIST_PROFILES_DIR = os.environ.get('SIGLIST_PROFILES_DIR')
+
+# Maximum number of signature tools built from profiles kept by each process,
+# for all languages. The least recently used ones are evicted, and built
+# again when used.
+PROFILE_TOOL_CACHE_SIZE = int(os.environ.get('PROFILE_TOOL_CACHE_SIZE', 16))
+
+# Directory of candidate siglists to evaluate on a sample of live C crashes
+# (see `signer.shadow`). Shadow evaluation is disabled if not set.
+SHADOW_SIGLISTS_DIR = os.environ.get('SHADOW_SIGLISTS_DIR')
+
+# Fraction of the crashes signed by /sign that are signed again with the
+# candidate siglists.
+SHADOW_SAMPLE_RATE = float(os.environ.get('SHADOW_SAMPLE_RATE', 0.01))
+
+# Maximum number of crashes waiting to be signed with the candidate
+# siglists. Other crashes are not evaluated.
+SHADOW_QUEUE_SIZE = 1000
+
+# Maximum number of different pairs of current and candidate signatures
+# counted by shadow evaluation.
+SHADOW_MAX_DIVERGENCES = 1000
+
+# Whether or not to count the signatures returned by /sign and /sign/batch
+# by language, to show the most frequent ones of recent crashes (see
+# `signer.heavy_hitters`). Disabled by default.
+HEAVY_HITTERS_ENABLED = bool(int(os.environ.get('HEAVY_HITTERS_ENABLED', 0)))
+
+# Numbers of seconds of the sliding windows over which signatures are
+# counted.
+HEAVY_HITTERS_WINDOWS = (300, 3600)
+
+# Number of seconds counted together in those windows, which are updated
+# when such a bucket of time starts.
+HEAVY_HITTERS_BUCKET_DURATION = 60
+
+# Number of counters of each row, and number of rows, of the count-min
+# sketch of each bucket of time and language. Each bucket takes
+# width * depth * 8 bytes.
+HEAVY_HITTERS_SKETCH_WIDTH = 1024
+HEAVY_HITTERS_SKETCH_DEPTH = 4
+
+# Number of most frequent signatures kept by each bucket of time and
+# language.
+HEAVY_HITTERS_CAPACITY = 100
+
+# Maximum number of signatures waiting to be counted. Other signatures are
+# not counted.
+HEAVY_HITTERS_QUEUE_SIZE = 10000
+
+# Maximum number of signing results cached by the service.
+RESULT_CACHE_SIZE = 10000
+
+# Number of seconds after which cached signing results expire.
+RESULT_CACHE_TTL = 3600
+
+# Maximum number of frame dictionaries kept by the service (see
+# `signer.frame_dictionary`). The least recently used ones are evicted.
+FRAME_DICTIONARY_CACHE_SIZE = 32
+
+# Maximum number of frames in a frame dictionary. Each dictionary is also
+# limited to MAX_BODY_SIZE bytes.
+MAX_DICTIONARY_FRAMES = 65536
+
+# Maximum number of signing requests processed at once by each process (see
+# `signer.admission`). Set to 0 for no limit. This only sheds load in
+# processes handling several requests at once (threaded gunicorn workers or
+# ASGI mode with more threads than this), not in synchronous workers.
+MAX_CONCURRENT_REQUESTS = int(os.environ.get('MAX_CONCURRENT_REQUESTS', 16))
+
+# Maximum number of signing requests waiting to be processed, when
+# MAX_CONCURRENT_REQUESTS are. Others are rejected with a 503 error.
+MAX_WAITING_REQUESTS = int(os.environ.get('MAX_WAITING_REQUESTS', 64))
+
+# Maximum number of seconds a signing request waits to be processed before
+# being rejected with a 503 error.
+ADMISSION_WAIT_TIMEOUT = float(os.environ.get('ADMISSION_WAIT_TIMEOUT', 1))
+
+# Number of seconds after which clients are told to retry rejected requests,
+# in the Retry-After header.
+ADMISSION_RETRY_AFTER = 1
+
+# Number of seconds after which signing a stack stops, giving the signature
+# of the frames walked until then, with a note. Each item of a batch has its
+# own deadline. Set to 0 for no deadline.
+REQUEST_DEADLINE = float(os.environ.get('REQUEST_DEADLINE', 1))
+
+# Whether or not to time each stage of processing requests and count
+# signatures, exposed at /metrics (see `signer.metrics`).
+METRICS_ENABLED = bool(int(os.environ.get('METRICS_ENABLED', 1)))
+
+# Number of threads processing requests in ASGI mode (see `signer.asgi`).
+ASGI_WORKERS = int(os.environ.get('ASGI_WORKERS', 4))
+
+# Maximum number of requests waiting for or being processed by those threads
+# in ASGI mode.
+ASGI_MAX_PENDING = int(os.environ.get('ASGI_MAX_PENDING', 64))
+
+# Number of threads processing requests whose body is streamed in ASGI mode
+# (see ASGI_STREAMED_PATHS), apart from the ASGI_WORKERS threads, so that
+# slow uploads do not delay other requests.
+ASGI_STREAM_WORKERS = int(os.environ.get('ASGI_STREAM_WORKERS', 4))
+
+# Paths of the requests whose body is fed to the application as it is
+# received in ASGI mode, as are newline-delimited JSON bodies. Other bodies
+# are received whole, up to MAX_BODY_SIZE bytes, before being processed.
+ASGI_STREAMED_PATHS = ('/sign/batch',)
+
+# Number of bytes of a streamed request body received in ASGI mode before the
+# request is processed. Smaller bodies are fully received before taking a
+# thread, the rest of bigger ones is fed to the thread as it is received.
+ASGI_BODY_BUFFER_SIZE = 64 * 1024
+
+# Maximum number of received chunks of a streamed request body waiting to be
+# read by the thread processing it in ASGI mode.
+ASGI_BODY_QUEUE_SIZE = 16
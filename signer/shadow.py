@@ -0,0 +1,168 @@
+"""Shadow evaluation of candidate siglists on live traffic.
+
+A sample of the C crashes signed by `/sign` is signed again, with a
+`CSignatureTool` built from candidate siglists, to see how they would change
+signatures before they are used. That work is done by a background thread:
+the request only draws a random number and, if sampled, puts its frames in
+a `BackgroundQueue`, as `signer.heavy_hitters` does. Partial results, signed
+past the deadline of their request, are not evaluated. Divergences between
+the current and the candidate signatures are counted, and shown by
+`GET /admin/shadow`.
+"""
+import logging
+import random
+import threading
+
+from signer.background_queue import BackgroundQueue
+from signer.languages.c import CSignatureTool
+
+
+logger = logging.getLogger(__name__)
+
+# Number of frames of the crashes kept as examples of divergences.
+EXAMPLE_FRAMES = 40
+
+
+class Divergence(object):
+    """How many crashes had `old` as signature, and `new` with the candidate
+    siglists, with the frames of the first one. """
+
+    def __init__(self, old, new, frames):
+        self.old = old
+        self.new = new
+        self.frames = frames
+        self.count = 0
+
+    def as_dict(self):
+        return {
+            'old': self.old,
+            'new': self.new,
+            'count': self.count,
+            'frames': self.frames,
+        }
+
+
+class ShadowEvaluator(object):
+    """Sign a `sample_rate` fraction of crashes with candidate siglists in
+    a background thread, and count divergences.
+
+    At most `queue_size` crashes wait to be signed, others are dropped, and
+    at most `max_divergences` distinct pairs of signatures are counted.
+    """
+
+    def __init__(self, sample_rate, queue_size, max_divergences):
+        self.sample_rate = sample_rate
+        self.queue_size = queue_size
+        self.max_divergences = max_divergences
+        self.tool = None
+        self.directory = None
+
+        self._queue = BackgroundQueue(
+            self._evaluate_queued, queue_size, 'shadow-evaluator'
+        )
+        self._lock = threading.Lock()
+        self._random = random.random
+        self.reset()
+
+    @property
+    def enabled(self):
+        return self.tool is not None and self.sample_rate > 0
+
+    def reset(self):
+        """Forget all counts. """
+        self._queue.reset()
+        with self._lock:
+            self.evaluated = 0
+            self.diverged = 0
+            # Divergences not counted in `divergences`, as there are too
+            # many different ones.
+            self.untracked = 0
+            self.errors = 0
+            self.divergences = {}
+
+    def set_candidate(self, siglist_set):
+        """Sign crashes with a tool built from `siglist_set` from now on,
+        or stop signing them if it is None, and forget all counts. """
+        tool = None
+        if siglist_set is not None:
+            tool = CSignatureTool(siglist_set)
+        self.tool = tool
+        self.directory = getattr(siglist_set, 'directory', None)
+        self.reset()
+
+    def submit(self, frames, crashed_thread, signature, dictionary=None):
+        """Queue a crash signed as `signature` to be signed again, if it is
+        sampled. This never waits. """
+        if not self.enabled or self._random() >= self.sample_rate:
+            return
+
+        self._queue.put(
+            (self.tool, frames, crashed_thread, signature, dictionary)
+        )
+
+    def wait(self):
+        """Sign all queued crashes now, or wait until the background thread
+        has signed them. """
+        self._queue.flush()
+
+    def _evaluate_queued(self, item):
+        self.evaluate(*item)
+
+    def evaluate(self, tool, frames, crashed_thread, signature,
+                 dictionary=None):
+        """Sign a crash with `tool`, and count whether its signature is
+        different from `signature`. """
+        try:
+            new_signature, _ = tool.generate(
+                frames, crashed_thread, dictionary
+            )
+        except Exception:
+            logger.exception('Failed to sign a crash with candidate siglists')
+            with self._lock:
+                self.errors += 1
+            return
+
+        with self._lock:
+            if tool is not self.tool:
+                # The candidate changed since the crash was queued.
+                return
+
+            self.evaluated += 1
+            if new_signature == signature:
+                return
+
+            self.diverged += 1
+            key = (signature, new_signature)
+            divergence = self.divergences.get(key)
+            if divergence is None:
+                if len(self.divergences) >= self.max_divergences:
+                    self.untracked += 1
+                    return
+                example = frames[:EXAMPLE_FRAMES]
+                if dictionary is not None:
+                    example = dictionary.decode(example)
+                divergence = Divergence(signature, new_signature, example)
+                self.divergences[key] = divergence
+            divergence.count += 1
+
+    def status(self, top=None):
+        """Return the counts, with the `top` most frequent divergences. """
+        with self._lock:
+            divergences = sorted(
+                self.divergences.values(),
+                key=lambda x: x.count,
+                reverse=True
+            )[:top]
+            return {
+                'enabled': self.enabled,
+                'directory': self.directory,
+                'sample_rate': self.sample_rate,
+                'queued': len(self._queue),
+                'submitted': self._queue.submitted,
+                'dropped': self._queue.dropped,
+                'evaluated': self.evaluated,
+                'diverged': self.diverged,
+                'untracked': self.untracked,
+                'errors': self.errors,
+                'divergences': [x.as_dict() for x in divergences],
+            }
@@ -2,10 +2,13 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import hashlib
+import io
+import json
+import logging
+import os
 import re
 
-from pkg_resources import resource_stream
-
 
 # This is a hack because sentinels can be a tuple, with the second item being
 # a function to verify if the sentinel applies. It's quite hard to express
@@ -26,21 +29,57 @@ _SPECIAL_EXTENDED_VALUES = {
 }
 
 
+logger = logging.getLogger(__name__)
+
+
 class BadRegularExpressionLineError(Exception):
     """Raised when a file contains an invalid regular expression."""
 
 
-def _get_file_content(source):
+# Names of the siglists, which are also the names of their files.
+SIGLIST_NAMES = (
+    'irrelevant_signature_re',
+    'prefix_signature_re',
+    'signature_sentinels',
+    'signatures_with_line_numbers_re',
+    'trim_dll_signature_re',
+)
+
+
+# Siglists of regular expressions, which have a prepared matcher in
+# snapshots. Sentinels are plain strings.
+MATCHED_SIGLISTS = tuple(
+    x for x in SIGLIST_NAMES if x != 'signature_sentinels'
+)
+
+# The directory of the siglists shipped with this package.
+PACKAGE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+# Incremented when the format of snapshots, or what matchers are made of,
+# changes.
+SNAPSHOT_VERSION = 1
+
+SNAPSHOT_FILENAME = 'snapshot.json'
+
+
+def _open(filepath, directory=None):
+    if directory is None:
+        directory = PACKAGE_DIRECTORY
+    return io.open(os.path.join(directory, filepath), 'rb')
+
+
+def read_siglist(source, directory=None):
     """Return a tuple, each value being a line of the source file.
 
-    Remove empty lines and comments (lines starting with a '#').
+    Remove empty lines and comments (lines starting with a '#'). The file is
+    read from `directory` if given, from this package otherwise.
     """
     filepath = source + '.txt'
 
     lines = []
-    with resource_stream(__name__, filepath) as f:
+    with _open(filepath, directory) as f:
         for i, line in enumerate(f):
-            line = line.strip()
+            line = line.decode('utf-8').strip()
 
             if not line or line.startswith('#'):
                 continue
@@ -58,16 +97,167 @@ def _get_file_content(source):
 
             lines.append(line)
 
+    return tuple(lines)
+
+
+def _extend(source, lines):
+    """Add the special values of the siglist `source` to its `lines`. """
     if source in _SPECIAL_EXTENDED_VALUES:
-        lines = lines + _SPECIAL_EXTENDED_VALUES[source]
+        lines = lines + tuple(_SPECIAL_EXTENDED_VALUES[source])
+    return lines
+
+
+def get_snapshot_path(directory=None):
+    """Return the path of the snapshot of the siglists of `directory`, or of
+    this package. """
+    return os.path.join(directory or PACKAGE_DIRECTORY, SNAPSHOT_FILENAME)
+
+
+def get_sources_checksum(directory=None):
+    """Return a checksum of the siglists files of `directory`, or of this
+    package. """
+    checksum = hashlib.sha256()
+    for name in SIGLIST_NAMES:
+        with _open(name + '.txt', directory) as siglist_file:
+            content = siglist_file.read()
+        checksum.update(name.encode('utf-8'))
+        checksum.update(hashlib.sha256(content).digest())
+    return checksum.hexdigest()
+
+
+def get_content_checksum(content):
+    """Return a checksum of the `content` of a snapshot. """
+    serialized = json.dumps(content, sort_keys=True)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+def get_lists_checksum(lists):
+    """Return a checksum of `lists`, the lines of each siglist, which is
+    the same in every process for the same lines. Special values count as
+    their sentinel. """
+    return get_content_checksum(dict(
+        (name, [x[0] if isinstance(x, tuple) else x for x in lines])
+        for name, lines in lists.items()
+    ))[:16]
+
+
+def load_snapshot(directory=None):
+    """Return a tuple (lists, matchers) from the snapshot of the siglists of
+    `directory`, or of this package (see `signer.siglists.snapshot`): the
+    lines of each siglist, without special values, and the data of the
+    matcher of each siglist of regular expressions, see
+    `compiler.SiglistMatcher.from_data`.
+
+    A snapshot records a checksum of the siglists files it was built from.
+    Return None if there is no snapshot, or if it cannot be used: the files
+    changed since it was built (it is stale), it was built by another
+    version of this package, or its own checksum does not match.
+    """
+    path = get_snapshot_path(directory)
+    try:
+        with io.open(path, 'rb') as snapshot_file:
+            snapshot = json.loads(snapshot_file.read().decode('utf-8'))
+    except (IOError, OSError):
+        return None
+    except (ValueError, UnicodeDecodeError):
+        logger.warning('Siglists snapshot %s is not valid JSON', path)
+        return None
+
+    try:
+        version = snapshot.get('version')
+        if version != SNAPSHOT_VERSION:
+            logger.warning(
+                'Siglists snapshot %s has version %s instead of %s',
+                path, version, SNAPSHOT_VERSION
+            )
+            return None
+
+        content = snapshot['content']
+        if snapshot['checksum'] != get_content_checksum(content):
+            logger.warning('Siglists snapshot %s is corrupted', path)
+            return None
+
+        if snapshot['sources'] != get_sources_checksum(directory):
+            logger.warning(
+                'Siglists snapshot %s is stale, reading siglists from their '
+                'files', path
+            )
+            return None
+
+        lists = dict(
+            (name, tuple(content['siglists'][name]))
+            for name in SIGLIST_NAMES
+        )
+        matchers = dict(
+            (name, content['matchers'][name]) for name in MATCHED_SIGLISTS
+        )
+    except (AttributeError, KeyError, TypeError):
+        logger.warning('Siglists snapshot %s is not valid', path)
+        return None
+
+    return lists, matchers
+
+
+class SiglistSet(object):
+    """A set of siglists, with the same attributes as this module.
+
+    `version` is a checksum of the lines of the siglists, which tells sets
+    apart, and is the same in all processes for the same lines. `profile` is
+    the name of the profile of this set, if any, see `profiles`.
+    """
+
+    def __init__(self, lists, directory=None, matchers=None, profile=None):
+        self.IRRELEVANT_SIGNATURE_RE = lists['irrelevant_signature_re']
+        self.PREFIX_SIGNATURE_RE = lists['prefix_signature_re']
+        self.SIGNATURE_SENTINELS = lists['signature_sentinels']
+        self.SIGNATURES_WITH_LINE_NUMBERS_RE = (
+            lists['signatures_with_line_numbers_re']
+        )
+        self.TRIM_DLL_SIGNATURE_RE = lists['trim_dll_signature_re']
+        # Prepared matchers of siglists, by name, see `snapshot`.
+        self.MATCHERS = matchers or {}
+
+        self.directory = directory
+        self.version = get_lists_checksum(lists)
+        self.profile = profile
+
+
+def load_siglists(directory=None):
+    """Return a `SiglistSet` read from `directory`, or from this package.
+
+    Siglists are read from the snapshot of that directory, if it is up to
+    date (see `snapshot`), and from their files otherwise. Raise a
+    `BadRegularExpressionLineError` if a list is not valid.
+    """
+    loaded = load_snapshot(directory)
+    if loaded is None:
+        lists = dict(
+            (name, read_siglist(name, directory)) for name in SIGLIST_NAMES
+        )
+        matchers = None
+    else:
+        lists, matchers = loaded
+
+    return SiglistSet(
+        dict((name, _extend(name, lines)) for name, lines in lists.items()),
+        directory=directory,
+        matchers=matchers,
+    )
+
+
+def get_package_siglists():
+    """Return the `SiglistSet` of the siglists shipped with this package,
+    which tools use when not given any. """
+    return _PACKAGE_SIGLISTS
 
-    return tuple(lines)
 
+_PACKAGE_SIGLISTS = load_siglists()
 
-IRRELEVANT_SIGNATURE_RE = _get_file_content('irrelevant_signature_re')
-PREFIX_SIGNATURE_RE = _get_file_content('prefix_signature_re')
-SIGNATURE_SENTINELS = _get_file_content('signature_sentinels')
-SIGNATURES_WITH_LINE_NUMBERS_RE = _get_file_content(
-    'signatures_with_line_numbers_re'
+IRRELEVANT_SIGNATURE_RE = _PACKAGE_SIGLISTS.IRRELEVANT_SIGNATURE_RE
+PREFIX_SIGNATURE_RE = _PACKAGE_SIGLISTS.PREFIX_SIGNATURE_RE
+SIGNATURE_SENTINELS = _PACKAGE_SIGLISTS.SIGNATURE_SENTINELS
+SIGNATURES_WITH_LINE_NUMBERS_RE = (
+    _PACKAGE_SIGLISTS.SIGNATURES_WITH_LINE_NUMBERS_RE
 )
-TRIM_DLL_SIGNATURE_RE = _get_file_content('trim_dll_signature_re')
+TRIM_DLL_SIGNATURE_RE = _PACKAGE_SIGLISTS.TRIM_DLL_SIGNATURE_RE
+MATCHERS = _PACKAGE_SIGLISTS.MATCHERS
@@ -0,0 +1,283 @@
+"""Compile a list of regular expressions into a fast matcher.
+
+Using a siglist means checking whether `re.match('|'.join(patterns), frame)`
+matches. With hundreds of patterns, Python's `re` tries each alternative in
+turn, for every frame, and each `.*foo` alternative scans the whole frame.
+However, most patterns are in fact plain strings, or plain strings followed
+or preceded by `.*`. This module sorts patterns into tiers:
+
+- `foo$`: the frame is exactly `foo`, checked with a set;
+- `foo`, `foo.*`: the frame starts with `foo`;
+- `.*foo`: the frame contains `foo` (as `re.match` is not anchored at the
+  end, that also covers `.*foo.*`);
+- `.*foo$`: the frame ends with `foo`;
+- anything else is a residual regular expression.
+
+Prefixes are merged into a trie, itself turned into a regular expression
+(`arena_|abort|alloc` becomes `a(?:bort|lloc|rena_)`), so that `re` looks at
+each character of the frame at most once instead of trying every prefix.
+Literals found anywhere in the frame are merged the same way behind a single
+`.*`, so that the frame is scanned once instead of once per pattern. Doing
+that matching in C with `re` is much faster than walking a trie or looping
+over literals in Python.
+
+`SiglistMatcher.match` matches if, and only if, the joined regular
+expression would match, for any string. Like `re.match`, it returns a truthy
+value when matching.
+"""
+import re
+
+
+# Characters that have a special meaning in a regular expression.
+_SPECIAL_CHARACTERS = frozenset('.^$*+?{}[]\\|()')
+
+
+def _parse_literal(pattern):
+    """Return the string matched by `pattern` if it has no special
+    characters (other than escaped ones), None otherwise. """
+    literal = []
+    escaped = False
+    for char in pattern:
+        if escaped:
+            # Escaped letters and digits are character classes (`\d`),
+            # anchors (`\b`) or references (`\1`), not literals.
+            if char.isalnum() or char == '_':
+                return None
+            literal.append(char)
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char in _SPECIAL_CHARACTERS:
+            return None
+        else:
+            literal.append(char)
+
+    if escaped:
+        return None
+    return ''.join(literal)
+
+
+def _is_escaped(pattern, index):
+    """Return whether the character at `index` in `pattern` is escaped. """
+    backslashes = 0
+    while index > backslashes and pattern[index - backslashes - 1] == '\\':
+        backslashes += 1
+    return backslashes % 2 == 1
+
+
+def _strip(pattern, affix, from_start):
+    """Remove all occurrences of `affix` at one end of `pattern`. """
+    if from_start:
+        while pattern.startswith(affix):
+            pattern = pattern[len(affix):]
+    else:
+        while (
+            pattern.endswith(affix) and
+            # Do not break an escaped character, like `\.*`.
+            not _is_escaped(pattern, len(pattern) - len(affix))
+        ):
+            pattern = pattern[:-len(affix)]
+    return pattern
+
+
+def parse_pattern(pattern):
+    """Return `(tier, literal)`, the tier `pattern` belongs to and the
+    literal it looks for, or None if it is a residual regular expression.
+
+    Tiers are `always` (the pattern matches everything), `exact`, `prefix`,
+    `contains` and `suffix`. Exact and suffix literals end with their anchor,
+    `$` or `\\Z`.
+    """
+    pattern = _strip(pattern, '^', from_start=True)
+
+    anchor = None
+    if (
+        pattern.endswith('\\Z') and
+        not _is_escaped(pattern, len(pattern) - 2)
+    ):
+        anchor = '\\Z'
+    elif (
+        pattern.endswith('$') and
+        not _is_escaped(pattern, len(pattern) - 1)
+    ):
+        anchor = '$'
+
+    if anchor:
+        pattern = pattern[:-len(anchor)]
+    else:
+        pattern = _strip(pattern, '.*', from_start=False)
+
+    anywhere = pattern.startswith('.*')
+    pattern = _strip(pattern, '.*', from_start=True)
+
+    literal = _parse_literal(pattern)
+    if literal is None or '\n' in literal:
+        return None
+
+    if anchor and anywhere:
+        return 'suffix', (literal, anchor)
+    if anchor:
+        return 'exact', (literal, anchor)
+    if not literal:
+        # `.*` matches everything (there is nothing to match after it, so
+        # newlines do not matter).
+        return 'always', literal
+    if anywhere:
+        return 'contains', literal
+    return 'prefix', literal
+
+
+# Marks the end of a literal in a trie node.
+_END = ''
+
+
+def _trie_regex(literals):
+    """Return a regular expression matching strings that start with one of
+    `literals`, built from a trie of these literals. """
+    trie = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            if _END in node:
+                break
+            node = node.setdefault(char, {})
+        else:
+            # Anything starting with this literal matches, longer literals
+            # sharing that prefix are useless.
+            node.clear()
+            node[_END] = True
+
+    def to_regex(node):
+        if _END in node:
+            return ''
+        alternatives = [
+            re.escape(char) + to_regex(child)
+            for char, child in sorted(node.items())
+        ]
+        if len(alternatives) == 1:
+            return alternatives[0]
+        if not alternatives:
+            return ''
+        return '(?:{})'.format('|'.join(alternatives))
+
+    return to_regex(trie)
+
+
+class SiglistMatcher(object):
+    """Tell whether a string matches a list of regular expressions. """
+
+    def __init__(self, patterns):
+        self.patterns = tuple(patterns)
+
+        # Whether an empty pattern makes everything match.
+        self.always = False
+        self.exact = set()
+        self.prefixes = set()
+        self.contains = set()
+        # Literals of `.*foo$` and `.*foo\Z` patterns, by anchor.
+        self.suffixes = {}
+        residual = []
+
+        for pattern in self.patterns:
+            if not self._add(pattern):
+                residual.append(pattern)
+        self.residual_patterns = tuple(residual)
+
+        parts = []
+        if self.prefixes:
+            parts.append(_trie_regex(self.prefixes))
+        if self.contains:
+            parts.append('.*' + _trie_regex(self.contains))
+        for anchor, literals in sorted(self.suffixes.items()):
+            parts.append('.*(?:{}){}'.format(
+                '|'.join(re.escape(x) for x in sorted(literals)),
+                anchor
+            ))
+        parts.extend(residual)
+
+        self._set_regex('|'.join(parts) if parts else None)
+
+    def _set_regex(self, pattern):
+        self.regex = None
+        if pattern is not None:
+            self.regex = re.compile(pattern)
+            if not self.always and not self.exact:
+                # Avoid the cost of a Python call in the common case.
+                self.match = self.regex.match
+
+    def as_data(self):
+        """Return what this matcher is made of, as data that can be
+        serialized as JSON, see `from_data`. """
+        return {
+            'patterns': list(self.patterns),
+            'always': self.always,
+            'exact': sorted(self.exact),
+            'prefixes': sorted(self.prefixes),
+            'contains': sorted(self.contains),
+            'suffixes': dict(
+                (anchor, sorted(literals))
+                for anchor, literals in self.suffixes.items()
+            ),
+            'residual_patterns': list(self.residual_patterns),
+            'regex': None if self.regex is None else self.regex.pattern,
+        }
+
+    @classmethod
+    def from_data(cls, data):
+        """Return the matcher whose `as_data` is `data`, without sorting its
+        patterns into tiers again. Only the regular expression is
+        compiled. """
+        matcher = cls.__new__(cls)
+        matcher.patterns = tuple(data['patterns'])
+        matcher.always = data['always']
+        matcher.exact = set(data['exact'])
+        matcher.prefixes = set(data['prefixes'])
+        matcher.contains = set(data['contains'])
+        matcher.suffixes = dict(
+            (anchor, set(literals))
+            for anchor, literals in data['suffixes'].items()
+        )
+        matcher.residual_patterns = tuple(data['residual_patterns'])
+        matcher._set_regex(data['regex'])
+        return matcher
+
+    def _add(self, pattern):
+        """Add `pattern` to the tier it belongs to. Return False if it has
+        to be matched as a regular expression. """
+        parsed = parse_pattern(pattern)
+        if parsed is None:
+            return False
+
+        tier, literal = parsed
+        if tier == 'suffix':
+            literal, anchor = literal
+            self.suffixes.setdefault(anchor, set()).add(literal)
+        elif tier == 'exact':
+            literal, anchor = literal
+            self.exact.add(literal)
+            if anchor == '$':
+                # `$` also matches before a newline ending the string.
+                self.exact.add(literal + '\n')
+        elif tier == 'contains':
+            self.contains.add(literal)
+        elif tier == 'prefix':
+            self.prefixes.add(literal)
+        else:
+            self.always = True
+
+        return True
+
+    def match(self, string):
+        """Return a truthy value if `string` matches one of the patterns. """
+        if self.always or string in self.exact:
+            return True
+        return self.regex is not None and self.regex.match(string)
+
+
+def compile_siglist(patterns, data=None):
+    """Return a `SiglistMatcher` for a list of regular expressions, built
+    from `data` (see `SiglistMatcher.as_data`) if it is that of the same
+    patterns. """
+    if data is not None and tuple(data['patterns']) == tuple(patterns):
+        return SiglistMatcher.from_data(data)
+    return SiglistMatcher(patterns)
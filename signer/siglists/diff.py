@@ -0,0 +1,18 @@
+"""Compare two sets of siglists. """
+from signer.siglists import SIGLIST_NAMES
+
+
+def diff_siglists(old, new):
+    """Return the lines added to and removed from each siglist between two
+    `SiglistSet`, as `{name: (added, removed)}`. Siglists that did not
+    change are not included. """
+    changes = {}
+    for name in SIGLIST_NAMES:
+        old_lines = set(getattr(old, name.upper()))
+        new_lines = set(getattr(new, name.upper()))
+        if old_lines != new_lines:
+            changes[name] = (
+                sorted(new_lines - old_lines, key=str),
+                sorted(old_lines - new_lines, key=str),
+            )
+    return changes
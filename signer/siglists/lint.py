@@ -0,0 +1,396 @@
+"""Profile and lint the regular expressions of siglists.
+
+    python -m signer.siglists.lint --siglists path/to/siglists \\
+        --corpus crashes.jsonl.gz
+
+Each pattern is timed on its own against a corpus of frames, the normalized
+frames of crash records like those `signer.resign` reads, or synthetic
+frames (see `signer.benchmarks.stacks`) if no corpus is given. Patterns are
+ranked by cost, with their hit rate, and reported if they are redundant
+(everything they match is matched by another line of the same siglist),
+if they match no frame of the corpus, or if they backtrack pathologically,
+taking more than linear time on some input.
+
+Lines added compared to `--base` (the siglists shipped with the package by
+default) are new: the command fails if one of them costs more than
+`--budget` microseconds per frame, or backtracks pathologically.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import re
+import sys
+import timeit
+
+from signer import settings
+from signer.benchmarks.stacks import StackGenerator
+from signer.frame_index import get_frame_names
+from signer.resign import open_input
+from signer.siglists import SIGLIST_NAMES, load_siglists
+from signer.siglists.compiler import parse_pattern
+from signer.siglists.diff import diff_siglists
+
+
+# Siglists of regular expressions. Sentinels are plain strings.
+PROFILED_SIGLISTS = tuple(
+    x for x in SIGLIST_NAMES if x != 'signature_sentinels'
+)
+
+# Lengths of the strings a pattern is matched with to find pathological
+# backtracking: small steps first, as exponential backtracking gets out of
+# hand quickly, then doubling lengths.
+_BACKTRACKING_LENGTHS = (4, 8, 12, 16, 20, 24, 32, 64, 128, 256, 512, 1024,
+                         2048, 4096)
+
+# Matching time, in seconds, from which a pattern is not matched with longer
+# strings.
+_BACKTRACKING_MAX_TIME = 0.005
+
+# Matching time, in seconds, under which time growth is ignored as noise.
+_BACKTRACKING_MIN_TIME = 0.0002
+
+# How much more than the length of strings the matching time has to grow,
+# between two lengths, to be considered more than linear.
+_BACKTRACKING_GROWTH = 1.5
+
+
+class PatternReport(object):
+    """What is known about a line of a siglist. """
+
+    def __init__(self, siglist, pattern, new=False):
+        self.siglist = siglist
+        self.pattern = pattern
+        self.new = new
+        # Microseconds per frame.
+        self.cost = None
+        self.hits = 0
+        self.hit_rate = 0.0
+        # The pattern of the same siglist matching everything this one
+        # matches, if any.
+        self.redundant_with = None
+        # The length of the string on which backtracking was found, if any.
+        self.backtracking = None
+
+    def as_dict(self):
+        return {
+            'siglist': self.siglist,
+            'pattern': self.pattern,
+            'new': self.new,
+            'cost': self.cost,
+            'hits': self.hits,
+            'hit_rate': self.hit_rate,
+            'redundant_with': self.redundant_with,
+            'backtracking': self.backtracking,
+        }
+
+
+def iter_corpus_frames(lines):
+    """Yield the normalized frames of the C crash records of JSON
+    `lines`. """
+    for line in lines:
+        try:
+            record = json.loads(line.decode('utf-8'))
+        except (ValueError, UnicodeDecodeError):
+            continue
+        if not isinstance(record, dict):
+            continue
+        if (record.get('lang') or settings.DEFAULT_LANGUAGE) != 'c':
+            continue
+        frames = record.get('frames')
+        if not isinstance(frames, list):
+            continue
+
+        for frame in frames:
+            try:
+                yield get_frame_names(frame)[0]
+            except (KeyError, TypeError, AttributeError):
+                continue
+
+
+def get_synthetic_frames(seed=0, count=100):
+    """Return the normalized frames of `count` synthetic stacks of each
+    kind. """
+    generator = StackGenerator(seed)
+    frames = []
+    for kind in generator.KINDS:
+        for stack in generator.stacks(kind, count):
+            frames.extend(get_frame_names(x)[0] for x in stack)
+    return frames
+
+
+def time_pattern(regex, frames, repeat=3):
+    """Return the time, in microseconds, `regex` takes to match a frame of
+    `frames`. """
+    match = regex.match
+
+    def match_all():
+        for frame in frames:
+            match(frame)
+
+    seconds = min(timeit.repeat(match_all, number=1, repeat=repeat))
+    return seconds / len(frames) * 1e6
+
+
+def find_backtracking(regex, pattern):
+    """Return the length of a string on which matching `regex` takes more
+    than linear time, or None. Strings are repetitions of a character of
+    `pattern`, followed by another character so that they are less likely
+    to match, backtracking being the worst when matching fails. """
+    characters = sorted(set(
+        x for x in pattern if x.isalnum() or x in '_:<>@. '
+    ))[:8] or ['a']
+
+    for character in characters:
+        previous = None
+        for length in _BACKTRACKING_LENGTHS:
+            string = character * length + '!'
+            seconds = min(timeit.repeat(
+                lambda: regex.match(string), number=1, repeat=3
+            ))
+            if previous is not None and seconds > _BACKTRACKING_MIN_TIME:
+                previous_length, previous_seconds = previous
+                growth = float(length) / previous_length
+                if seconds > previous_seconds * growth * _BACKTRACKING_GROWTH:
+                    return length
+            if seconds > _BACKTRACKING_MAX_TIME:
+                break
+            previous = (length, seconds)
+
+    return None
+
+
+def subsumes(pattern, other):
+    """Return whether `pattern` matches everything `other` matches. Only
+    patterns of the compiler's tiers are compared, residual patterns are
+    only compared with exact ones, or found identical. """
+    if pattern == other:
+        return True
+
+    parsed, parsed_other = parse_pattern(pattern), parse_pattern(other)
+    if parsed is not None and parsed[0] == 'always':
+        return True
+    if parsed_other is None:
+        return False
+
+    tier, literal = parsed_other
+    if parsed is None:
+        if tier != 'exact':
+            return False
+        # Exact patterns match a single string, and the same string
+        # followed by a newline for `$`.
+        literal, anchor = literal
+        strings = [literal] + ([literal + '\n'] if anchor == '$' else [])
+        return all(re.match(pattern, x) for x in strings)
+
+    pattern_tier, pattern_literal = parsed
+    if tier == 'always':
+        return False
+
+    # Strings matched by `other` all contain, start or end with `literal`.
+    anchor = None
+    if tier in ('exact', 'suffix'):
+        literal, anchor = literal
+
+    if pattern_tier == 'prefix':
+        return (
+            tier in ('prefix', 'exact') and
+            literal.startswith(pattern_literal)
+        )
+    if pattern_tier == 'contains':
+        return pattern_literal in literal
+
+    pattern_literal, pattern_anchor = pattern_literal
+    # `$` matches at the end of a string, or before a newline ending it.
+    anchors_match = pattern_anchor == anchor or pattern_anchor == '$'
+    if pattern_tier == 'suffix':
+        return (
+            tier in ('suffix', 'exact') and
+            anchors_match and
+            literal.endswith(pattern_literal)
+        )
+    return tier == 'exact' and anchors_match and literal == pattern_literal
+
+
+def find_redundant(reports):
+    """Set `redundant_with` on those of `reports` of a siglist that are
+    subsumed by another line of that siglist. Of two equivalent lines, the
+    last one is redundant. """
+    for index, report in enumerate(reports):
+        for other_index, other in enumerate(reports):
+            if other_index == index or other.redundant_with is not None:
+                continue
+            if other.siglist != report.siglist:
+                continue
+            if not subsumes(other.pattern, report.pattern):
+                continue
+            if other_index > index and subsumes(report.pattern, other.pattern):
+                # Equivalent lines, the other one is redundant.
+                continue
+            report.redundant_with = other.pattern
+            break
+
+
+def profile(siglist_set, frames, new_lines=None, backtracking=True):
+    """Return a `PatternReport` for each line of the siglists of
+    `siglist_set`, matched against `frames`. `new_lines` are the new lines of
+    each siglist, by name. """
+    new_lines = new_lines or {}
+    frames = sorted(set(frames))
+
+    reports = []
+    for name in PROFILED_SIGLISTS:
+        for pattern in getattr(siglist_set, name.upper()):
+            report = PatternReport(
+                name,
+                pattern,
+                pattern in new_lines.get(name, ()),
+            )
+            regex = re.compile(pattern)
+            if frames:
+                report.cost = time_pattern(regex, frames)
+                report.hits = sum(1 for x in frames if regex.match(x))
+                report.hit_rate = float(report.hits) / len(frames)
+            if backtracking:
+                report.backtracking = find_backtracking(regex, pattern)
+            reports.append(report)
+
+    find_redundant(reports)
+    return reports
+
+
+def get_failures(reports, budget):
+    """Return the new lines of `reports` more costly than `budget`
+    microseconds per frame, or backtracking pathologically. """
+    return [
+        x for x in reports
+        if x.new and (
+            x.backtracking is not None or
+            x.cost is not None and x.cost > budget
+        )
+    ]
+
+
+def print_report(reports, failures, budget, top, frame_count):
+    def describe(report):
+        return '{}: {}'.format(report.siglist, report.pattern)
+
+    print('Most costly patterns, on {} frames:'.format(frame_count))
+    print('  {:>8} {:>8}'.format('us/frame', 'hit rate'))
+    by_cost = sorted(reports, key=lambda x: x.cost or 0, reverse=True)
+    for report in by_cost[:top]:
+        print('  {:8.3f} {:7.2%}  {}'.format(
+            report.cost or 0, report.hit_rate, describe(report)
+        ))
+
+    print('\nMost matching patterns:')
+    by_hits = sorted(reports, key=lambda x: x.hits, reverse=True)
+    for report in by_hits[:top]:
+        print('  {:7.2%}  {}'.format(report.hit_rate, describe(report)))
+
+    sections = (
+        ('Redundant patterns', [
+            (x, 'subsumed by {}'.format(x.redundant_with))
+            for x in reports if x.redundant_with is not None
+        ]),
+        ('Patterns matching no frame', [
+            (x, None) for x in reports if frame_count and not x.hits
+        ]),
+        ('Patterns backtracking pathologically', [
+            (x, 'on a string of {} characters'.format(x.backtracking))
+            for x in reports if x.backtracking is not None
+        ]),
+        ('New patterns over budget ({} us per frame) or backtracking'.format(
+            budget
+        ), [(x, None) for x in failures]),
+    )
+    for title, items in sections:
+        if not items:
+            continue
+        print('\n{}:'.format(title))
+        for report, detail in items:
+            print('  {}{}'.format(
+                describe(report),
+                ' ({})'.format(detail) if detail else ''
+            ))
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m signer.siglists.lint',
+        description=__doc__.split('\n\n', 1)[0],
+    )
+    parser.add_argument(
+        '--siglists',
+        default=settings.SIGLISTS_DIR,
+        help='directory of the siglists to profile, instead of those shipped '
+             'with the package'
+    )
+    parser.add_argument(
+        '--base',
+        help='directory of the siglists new lines are compared with, '
+             'instead of those shipped with the package'
+    )
+    parser.add_argument(
+        '--corpus',
+        help='JSONL file of crash records, optionally gzip compressed, to '
+             'take frames from, instead of synthetic frames'
+    )
+    parser.add_argument(
+        '--budget',
+        type=float,
+        default=1.0,
+        help='maximum cost of a new line, in microseconds per frame '
+             '(default: 1.0)'
+    )
+    parser.add_argument(
+        '--top',
+        type=int,
+        default=20,
+        help='number of patterns shown in rankings'
+    )
+    parser.add_argument(
+        '--json',
+        action='store_true',
+        help='print the report as JSON'
+    )
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+
+    siglist_set = load_siglists(args.siglists)
+    new_lines = {}
+    if args.siglists or args.base:
+        changes = diff_siglists(load_siglists(args.base), siglist_set)
+        new_lines = dict((x, y[0]) for x, y in changes.items())
+
+    if args.corpus:
+        lines = open_input(args.corpus)
+        try:
+            frames = list(iter_corpus_frames(lines))
+        finally:
+            lines.close()
+    else:
+        frames = get_synthetic_frames()
+
+    reports = profile(siglist_set, frames, new_lines)
+    failures = get_failures(reports, args.budget)
+    frame_count = len(set(frames))
+
+    if args.json:
+        print(json.dumps({
+            'frames': frame_count,
+            'budget': args.budget,
+            'patterns': [x.as_dict() for x in reports],
+            'failures': [x.as_dict() for x in failures],
+        }, indent=2, sort_keys=True))
+    else:
+        print_report(reports, failures, args.budget, args.top, frame_count)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""Named variants of siglists, for products whose crashes need different
+lists.
+
+A profile is a `<name>.json` file of a directory of profiles, adding lines
+to siglists and removing lines from them:
+
+    {
+        "base": "desktop",
+        "add": {"prefix_signature_re": ["MyEmbeddedAbort"]},
+        "remove": {"irrelevant_signature_re": ["__libc_message"]}
+    }
+
+Lines are added to, and removed from, those of the `base` profile if any,
+or the siglists used by the service otherwise. Signing requests select a
+profile with the `profile` query parameter, see
+`SignatureToolRegistry.get`.
+"""
+import io
+import json
+import os
+import re
+
+import six
+
+from signer.siglists import (
+    BadRegularExpressionLineError,
+    SIGLIST_NAMES,
+    SiglistSet,
+    get_package_siglists,
+)
+
+
+PROFILE_NAME_RE = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+class InvalidProfileError(Exception):
+    """Raised when a profile cannot be read. """
+
+
+class UnknownProfileError(Exception):
+    """Raised when asking for a profile that does not exist. """
+
+
+class SiglistProfile(object):
+    """The lines a profile adds to siglists and removes from them, by siglist
+    name, applied to those of its `base` profile, if not None. """
+
+    def __init__(self, name, base=None, additions=None, removals=None):
+        self.name = name
+        self.base = base
+        self.additions = additions or {}
+        self.removals = removals or {}
+
+    @classmethod
+    def from_dict(cls, name, content):
+        """Return the profile `name` defined by `content`, a JSON object.
+        Raise an `InvalidProfileError` if it is not valid. """
+        if not isinstance(content, dict):
+            raise InvalidProfileError(
+                'Profile `{}` must be a JSON object'.format(name)
+            )
+
+        unknown = set(content) - set(['base', 'add', 'remove'])
+        if unknown:
+            raise InvalidProfileError(
+                'Profile `{}` has unknown fields: {}'.format(
+                    name, ', '.join(sorted(unknown))
+                )
+            )
+
+        base = content.get('base')
+        if base is not None and not isinstance(base, six.string_types):
+            raise InvalidProfileError(
+                'The base of profile `{}` must be a profile name'.format(name)
+            )
+
+        return cls(
+            name,
+            base,
+            cls._get_lines(name, content, 'add'),
+            cls._get_lines(name, content, 'remove'),
+        )
+
+    @staticmethod
+    def _get_lines(name, content, field):
+        lists = content.get(field, {})
+        if not isinstance(lists, dict):
+            raise InvalidProfileError(
+                'The `{}` field of profile `{}` must map siglist names to '
+                'lists of lines'.format(field, name)
+            )
+
+        lines = {}
+        for source, values in lists.items():
+            if source not in SIGLIST_NAMES:
+                raise InvalidProfileError(
+                    'Profile `{}` changes `{}`, which is not a siglist'
+                    .format(name, source)
+                )
+            if (
+                not isinstance(values, list) or
+                not all(isinstance(x, six.string_types) for x in values)
+            ):
+                raise InvalidProfileError(
+                    'The lines of `{}` in profile `{}` must be a list of '
+                    'strings'.format(source, name)
+                )
+
+            if field == 'add' and source != 'signature_sentinels':
+                for value in values:
+                    try:
+                        re.compile(value)
+                    except Exception as ex:
+                        raise BadRegularExpressionLineError(
+                            'Regex error: {} in profile {} for {}'.format(
+                                str(ex), name, source
+                            )
+                        )
+            lines[source] = tuple(values)
+        return lines
+
+    def apply(self, lists):
+        """Return a copy of `lists`, a dict of the lines of each siglist,
+        with the lines of this profile removed, then added. """
+        lists = dict(lists)
+        for source, removed in self.removals.items():
+            removed = set(removed)
+            lists[source] = tuple(
+                # Special values of sentinels are tuples, never removed.
+                x for x in lists[source]
+                if isinstance(x, tuple) or x not in removed
+            )
+        for source, added in self.additions.items():
+            lists[source] = lists[source] + tuple(
+                x for x in added if x not in lists[source]
+            )
+        return lists
+
+
+class SiglistProfiles(object):
+    """All the profiles of a directory, see `load_profiles`. """
+
+    def __init__(self, profiles, directory=None):
+        self.profiles = profiles
+        self.directory = directory
+
+        for name in profiles:
+            # Raise an error if a base is unknown or if bases make a loop.
+            self.get_chain(name)
+
+    @property
+    def names(self):
+        return sorted(self.profiles)
+
+    def __contains__(self, name):
+        return name in self.profiles
+
+    def get_chain(self, name):
+        """Return the profiles applied, in order, to get the siglists of
+        profile `name`: its bases, then itself. """
+        chain = []
+        while name is not None:
+            if name not in self.profiles:
+                if not chain:
+                    raise UnknownProfileError(
+                        'The profile `{}` does not exist.'.format(name)
+                    )
+                raise InvalidProfileError(
+                    'Profile `{}` has an unknown base `{}`'.format(
+                        chain[-1].name, name
+                    )
+                )
+            profile = self.profiles[name]
+            if profile in chain:
+                raise InvalidProfileError(
+                    'The bases of profile `{}` make a loop'.format(
+                        chain[0].name
+                    )
+                )
+            chain.append(profile)
+            name = profile.base
+        return chain[::-1]
+
+    def build(self, name, siglist_set=None):
+        """Return the `SiglistSet` of profile `name`, based on
+        `siglist_set`, or on the siglists shipped with this package if None.
+        Raise an `UnknownProfileError` if it does not exist.
+
+        Prepared matchers of `siglist_set` are kept, they are only used for
+        the siglists a profile did not change.
+        """
+        if siglist_set is None:
+            siglist_set = get_package_siglists()
+
+        lists = dict(
+            (x, getattr(siglist_set, x.upper())) for x in SIGLIST_NAMES
+        )
+        for profile in self.get_chain(name):
+            lists = profile.apply(lists)
+
+        return SiglistSet(
+            lists,
+            directory=siglist_set.directory,
+            matchers=siglist_set.MATCHERS,
+            profile=name,
+        )
+
+
+def load_profiles(directory):
+    """Return the `SiglistProfiles` of the `.json` files of `directory`.
+
+    Raise an `InvalidProfileError` if a profile is not valid, or a
+    `BadRegularExpressionLineError` if a line it adds is not.
+    """
+    profiles = {}
+    for filename in sorted(os.listdir(directory)):
+        name, extension = os.path.splitext(filename)
+        if extension != '.json':
+            continue
+        if not PROFILE_NAME_RE.match(name):
+            raise InvalidProfileError(
+                'Profile `{}` must be named with letters, digits, `_` and '
+                '`-` only'.format(name)
+            )
+
+        with io.open(os.path.join(directory, filename), 'rb') as f:
+            try:
+                content = json.loads(f.read().decode('utf-8'))
+            except (ValueError, UnicodeDecodeError) as ex:
+                raise InvalidProfileError(
+                    'Profile `{}` is not valid JSON: {}'.format(name, ex)
+                )
+        profiles[name] = SiglistProfile.from_dict(name, content)
+
+    return SiglistProfiles(profiles, directory)
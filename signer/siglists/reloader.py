@@ -0,0 +1,126 @@
+import logging
+import os
+import threading
+import time
+
+from signer.siglists import (
+    BadRegularExpressionLineError,
+    SIGLIST_NAMES,
+    load_siglists,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class SiglistsReloader(object):
+    """Reload siglists from a directory into a `SignatureToolRegistry`.
+
+    Siglists are reloaded when `reload` is called, or when `poll` notices
+    that a file of the directory, or the directory itself, changed. `poll`
+    is cheap and meant to be called on each request: at most every
+    `interval` seconds, it starts a background thread that checks the
+    modification times and reloads siglists if needed. Doing that from
+    requests, instead of from a thread started at import, makes it work in
+    workers forked after the app was loaded.
+
+    Each process reloads its own siglists: `reload` touches the directory
+    when asked to `notify` others, which then reload theirs when they poll.
+
+    If new siglists are invalid, the error is logged and kept in
+    `last_error`, and the registry keeps using the previous ones.
+    """
+
+    def __init__(self, registry, directory, interval):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+
+        self.last_error = None
+        self.last_reload = None
+        self._mtimes = self._get_mtimes()
+        self._last_check = time.time()
+        self._reload_lock = threading.Lock()
+
+    def _get_mtimes(self):
+        mtimes = {}
+        for name in SIGLIST_NAMES + (None,):
+            path = self.directory
+            if name is not None:
+                path = os.path.join(self.directory, name + '.txt')
+            try:
+                mtimes[name] = os.stat(path).st_mtime
+            except OSError:
+                mtimes[name] = None
+        return mtimes
+
+    def reload(self, notify=False):
+        """Load the siglists and swap them in the registry, unless their
+        lines did not change. If `notify`, touch the directory, so that the
+        other processes polling it reload theirs too.
+
+        Return the version of the siglists, or raise a
+        `BadRegularExpressionLineError` if they are not valid, in which case
+        the current ones stay.
+        """
+        with self._reload_lock:
+            if notify:
+                self._touch()
+            mtimes = self._get_mtimes()
+            try:
+                siglist_set = load_siglists(self.directory)
+            except (BadRegularExpressionLineError, IOError) as ex:
+                # Do not try again until files change.
+                self._mtimes = mtimes
+                self.last_error = str(ex)
+                logger.error('Failed to reload siglists: %s', ex)
+                raise
+
+            self._mtimes = mtimes
+            self.last_error = None
+            if siglist_set.version == self.registry.siglists_version:
+                return siglist_set.version
+
+            self.registry.set_siglists(siglist_set)
+            self.last_reload = time.time()
+            logger.info('Reloaded siglists, version %s', siglist_set.version)
+            return siglist_set.version
+
+    def _touch(self):
+        try:
+            os.utime(self.directory, None)
+        except OSError as ex:
+            logger.warning(
+                'Could not touch %s, other processes will not reload '
+                'siglists until their files change: %s', self.directory, ex
+            )
+
+    def check(self):
+        """Reload the siglists if their files changed. """
+        if self._get_mtimes() == self._mtimes:
+            return
+        try:
+            self.reload()
+        except (BadRegularExpressionLineError, IOError):
+            pass
+
+    def poll(self):
+        """Check for changes in the background if it has not been done in
+        the last `interval` seconds. Return the thread doing it, if any. """
+        now = time.time()
+        if not self.interval or now - self._last_check < self.interval:
+            return None
+        self._last_check = now
+
+        thread = threading.Thread(target=self.check)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def status(self):
+        return {
+            'directory': self.directory,
+            'version': self.registry.siglists_version,
+            'last_reload': self.last_reload,
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,90 @@
+"""Write a snapshot of siglists, validated and prepared once, for fast
+startup.
+
+    python -m signer.siglists.snapshot [--siglists path/to/siglists]
+
+Reading siglists means validating each line as a regular expression, and
+building a `CSignatureTool` means sorting those lines into the tiers of
+`compiler.SiglistMatcher`. Both are done by this command, which writes the
+result to a `snapshot.json` file next to the siglists. `load_siglists` then
+reads that file instead, and only compiles the regular expression of each
+matcher, see `signer.siglists.load_snapshot`.
+"""
+from __future__ import print_function
+
+import argparse
+import io
+import json
+
+from signer.siglists import (
+    MATCHED_SIGLISTS,
+    SIGLIST_NAMES,
+    SNAPSHOT_VERSION,
+    get_content_checksum,
+    get_snapshot_path,
+    get_sources_checksum,
+    read_siglist,
+)
+from signer.siglists.compiler import SiglistMatcher
+
+
+def build_snapshot(directory=None):
+    """Return the snapshot of the siglists of `directory`, or of this
+    package. Raise a `BadRegularExpressionLineError` if a list is not
+    valid. """
+    sources = get_sources_checksum(directory)
+    lists = dict(
+        (name, list(read_siglist(name, directory))) for name in SIGLIST_NAMES
+    )
+    content = {
+        'siglists': lists,
+        'matchers': dict(
+            (name, SiglistMatcher(lists[name]).as_data())
+            for name in MATCHED_SIGLISTS
+        ),
+    }
+    return {
+        'version': SNAPSHOT_VERSION,
+        'sources': sources,
+        'checksum': get_content_checksum(content),
+        'content': content,
+    }
+
+
+def write_snapshot(directory=None, path=None):
+    """Build the snapshot of the siglists of `directory`, or of this
+    package, and write it to `path`, next to them by default. Return the
+    path. """
+    snapshot = build_snapshot(directory)
+    if path is None:
+        path = get_snapshot_path(directory)
+
+    serialized = json.dumps(snapshot, indent=1, sort_keys=True)
+    with io.open(path, 'wb') as snapshot_file:
+        snapshot_file.write(serialized.encode('utf-8'))
+        snapshot_file.write(b'\n')
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Write a snapshot of siglists, for faster startup.'
+    )
+    parser.add_argument(
+        '--siglists',
+        help='directory of the siglists (default: those of this package)'
+    )
+    parser.add_argument(
+        '-o', '--output',
+        help='path of the snapshot (default: snapshot.json in the directory '
+             'of the siglists)'
+    )
+    args = parser.parse_args(argv)
+
+    path = write_snapshot(args.siglists, args.output)
+    print('Wrote {}'.format(path))
+    return 0
+
+
+if __name__ == '__main__':
+    main()
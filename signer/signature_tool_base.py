@@ -1,4 +1,13 @@
-from signer import settings
+from signer import settings, siglists
+from signer.metrics import metrics
+
+
+# The note of signatures of stacks that were not fully walked before the
+# deadline of the request, see `SignatureToolBase.generate`.
+DEADLINE_NOTE = (
+    'SignatureTool: the stack was not fully walked before the request '
+    'deadline'
+)
 
 
 class SignatureToolBase(object):
@@ -6,21 +15,87 @@ class SignatureToolBase(object):
     basic interface and provides truncation and quoting service.  Any derived
     classes should implement the '_do_generate' function.  If different
     truncation or quoting techniques are desired, then derived classes may
-    override the 'generate' function."""
+    override the 'generate' function.
+
+    Tools are built from a `siglists.SiglistSet`, or from the siglists
+    shipped with this package if None."""
+
+    # Whether signatures depend on the siglists the tool is built from.
+    uses_siglists = True
+
+    def __init__(self, siglist_set=None):
+        self.siglist_set = siglist_set
+
+    @property
+    def siglists_version(self):
+        """The version of the siglists this tool was built from, see
+        `siglists.SiglistSet`. """
+        return (self.siglist_set or siglists.get_package_siglists()).version
+
+    @property
+    def siglists_profile(self):
+        """The name of the profile of the siglists this tool was built from,
+        or None. """
+        return getattr(self.siglist_set, 'profile', None)
+
+    def normalize_frame(self, frame):
+        """Return the string standing for a frame in signatures. A frame is
+        either a string, or a dict with a `function` and a `line`. """
+        if isinstance(frame, dict):
+            return frame['function']
+        return frame
 
-    def generate(self, source_list, crashed_thread=None):
-        signature, signature_notes = self._do_generate(
-            source_list,
-            crashed_thread
-        )
+    def generate(self, source_list, crashed_thread=None, dictionary=None,
+                 deadline=None):
+        """Return a tuple (signature, signature_notes) for the frames of
+        `source_list`, some of which can be ids of the frames of
+        `dictionary`, a `frame_dictionary.FrameDictionary`.
+
+        Tools walking many frames stop at `deadline`, a `time.time()` value,
+        and sign the frames walked until then, with `DEADLINE_NOTE`. """
+        if dictionary is None and deadline is None:
+            signature, signature_notes = self._do_generate(
+                source_list,
+                crashed_thread
+            )
+        else:
+            signature, signature_notes = self._do_generate_with(
+                source_list,
+                crashed_thread,
+                dictionary,
+                deadline
+            )
+        with metrics.timer('truncation'):
+            return self.truncate(signature, signature_notes)
+
+    def generate_batch(self, stacks, crashed_threads=None, dictionary=None,
+                       deadline=None):
+        """Return a list of tuples (signature, signature_notes), one for
+        each stack of `stacks`, the same as `generate` returns for it, with
+        the crashed thread of the same index in `crashed_threads`, if any.
+        Stacks are signed one at a time by default. """
+        if crashed_threads is None:
+            crashed_threads = [None] * len(stacks)
+        return [
+            self.generate(stack, crashed_thread, dictionary, deadline)
+            for stack, crashed_thread in zip(stacks, crashed_threads)
+        ]
+
+    def truncate(self, signature, signature_notes):
+        """Return a tuple (signature, signature_notes), with `signature`
+        escaped and truncated, and a note added to `signature_notes` if it
+        is. """
         if settings.ESCAPE_SINGLE_QUOTE:
             signature = signature.replace("'", "''")
 
         if len(signature) > settings.SIGNATURE_MAX_LENGTH:
-            signature = "%s..." % signature[:settings.SIGNATURE_MAX_LENGTH - 3]
+            signature = "%s..." % (
+                signature[:settings.SIGNATURE_MAX_LENGTH - 3]
+            )
             signature_notes.append(
                 'SignatureTool: signature truncated due to length'
             )
+            metrics.inc('truncated_signatures')
 
         return signature, signature_notes
 
@@ -29,3 +104,12 @@ class SignatureToolBase(object):
         the signature generated from the frames list, and `signature_notes`
         is a list of notes made by the algorithm during generation. """
         raise NotImplementedError
+
+    def _do_generate_with(self, frames, crashed_thread, dictionary=None,
+                          deadline=None):
+        """Like `_do_generate`, for `frames` holding ids of the frames of
+        `dictionary` if not None, and stopping at `deadline`. Frames are
+        decoded, and the deadline ignored, by default. """
+        if dictionary is not None:
+            frames = dictionary.decode(frames)
+        return self._do_generate(frames, crashed_thread)
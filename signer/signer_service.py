@@ -1,50 +1,671 @@
-import importlib
+import hashlib
 import json
 
 import falcon
+import six
 
-from signer import settings
+from signer import admission, media, msgpack_stream, settings
+from signer.cache import LRUCache
+from signer.frame_dictionary import FrameDictionaryStore
+from signer.languages import java
+from signer.languages.registry import registry
+from signer.metrics import metrics
+from signer.siglists.profiles import UnknownProfileError
+from signer.signature_tool_base import DEADLINE_NOTE
+
+
+def _too_many_threads():
+    return falcon.HTTPRequestEntityTooLarge(
+        'Too many threads',
+        'No more than {} threads can be submitted.'.format(
+            settings.MAX_THREADS
+        )
+    )
+
+
+def _too_many_frames():
+    return falcon.HTTPRequestEntityTooLarge(
+        'Too many frames',
+        'No more than {} frames can be submitted.'.format(settings.MAX_FRAMES)
+    )
+
+
+def _too_many_dictionary_frames():
+    return falcon.HTTPRequestEntityTooLarge(
+        'Too many frames',
+        'Dictionaries cannot have more than {} frames.'.format(
+            settings.MAX_DICTIONARY_FRAMES
+        )
+    )
 
 
 class SignerService(object):
     """The application responsible for returning generated crash signatures.
+
+    Results are cached in `results`, an `LRUCache`, by a hash of everything
+    they depend on: the language, the version of the siglists, the
+    crashed thread and the frames. That hash is also sent as the `ETag` of
+    responses, so that clients can make conditional requests with
+    `If-None-Match`, and get a `304 Not Modified` without signing anything.
+
+    Frames can be ids of the frames of a dictionary of `dictionaries`, a
+    `FrameDictionaryStore`, named by the `dictionary` query parameter.
+
+    Java crashes can also be sent as a raw stack trace, in the
+    `java_stack_trace` field or as a `text/plain` body, of which only the
+    exception line and the first frame line are read.
+
+    A whole crash can be sent as `threads`, a list of the frames of each
+    thread, with the index of the `crashed_thread`, whose signature is the
+    result. With `all_threads`, all threads are signed, see
+    `get_threads_result`.
+
+    Crashes are signed with the siglists of the profile named by the
+    `profile` query parameter, if any, see `signer.siglists.profiles`.
+
+    If `shadow` is a `shadow.ShadowEvaluator`, C crashes are submitted to it
+    once signed, unless signed with a profile. If `heavy_hitters` is a
+    `heavy_hitters.HeavyHitters`, signatures are counted by it.
+
+    Signing stops at the deadline of the request, if any, see
+    `middleware.AdmissionControl`. Such partial results are not cached,
+    counted or submitted to `shadow`.
     """
 
-    def get_signature(self, lang, frames, crashed_thread):
-        package_name = 'signer.languages.{}'.format(lang)
-        module = importlib.import_module(package_name)
-        app = module.SignatureTool()
-        return app.generate(frames, crashed_thread)
+    # Tell `middleware.JSONTranslator` to pass text bodies, which are Java
+    # stack traces.
+    text = True
+    # Tell `middleware.AdmissionControl` to limit concurrent requests.
+    limited = True
 
-    def on_post(self, req, resp):
-        lang = req.get_param('lang') or settings.DEFAULT_LANGUAGE
-        crashed_thread = req.get_param('crashed_thread')
+    def __init__(self, tools=None, results=None, dictionaries=None,
+                 shadow=None, heavy_hitters=None):
+        if tools is None:
+            tools = registry
+        self.tools = tools
+
+        if results is None:
+            results = LRUCache(
+                settings.RESULT_CACHE_SIZE,
+                settings.RESULT_CACHE_TTL
+            )
+        self.results = results
+
+        if dictionaries is None:
+            dictionaries = FrameDictionaryStore(
+                settings.FRAME_DICTIONARY_CACHE_SIZE
+            )
+        self.dictionaries = dictionaries
+        self.shadow = shadow
+        self.heavy_hitters = heavy_hitters
+
+    def get_tool(self, lang, profile=None):
+        """Return the signature tool of `lang`, built from the siglists of
+        `profile` if not None. Raise a `falcon.HTTPBadRequest` if that
+        profile does not exist. """
+        if profile is None:
+            return self.tools.get(lang)
+
+        try:
+            if not isinstance(profile, six.string_types):
+                raise UnknownProfileError(profile)
+            return self.tools.get(lang, profile)
+        except UnknownProfileError:
+            raise falcon.HTTPBadRequest(
+                'Unknown profile',
+                'The siglists profile `{}` does not exist.'.format(profile)
+            )
+
+    @staticmethod
+    def is_valid_frame(frame):
+        if isinstance(frame, six.string_types):
+            return True
+        if not isinstance(frame, dict):
+            return False
+
+        line = frame.get('line')
+        return (
+            isinstance(frame.get('function'), six.string_types) and
+            (
+                line is None or
+                isinstance(line, six.integer_types) and
+                not isinstance(line, bool)
+            )
+        )
+
+    @staticmethod
+    def get_default_lang(content):
+        """Return the language of `content`, a request body or a batch item,
+        if none is given. """
+        if isinstance(content, dict) and 'java_stack_trace' in content:
+            return 'java'
+        return settings.DEFAULT_LANGUAGE
+
+    @staticmethod
+    def get_stack_trace_frames(lang, chunks):
+        """Return the frames of the raw stack trace made of the text
+        `chunks`, reading no more of it than needed. """
+        if lang != 'java':
+            raise falcon.HTTPBadRequest(
+                'Unsupported stack trace',
+                'Raw stack traces can only be submitted for the `java` '
+                'language.'
+            )
+        return java.get_stack_trace_frames(chunks, settings.MAX_FRAME_LENGTH)
+
+    def get_frames(self, lang, content):
+        """Return the frames of `content`, a request body or a batch item:
+        its `frames`, or those of its `java_stack_trace`. """
+        stack_trace = content.get('java_stack_trace')
+        if stack_trace is None:
+            return content.get('frames')
 
+        if not isinstance(stack_trace, six.string_types):
+            raise falcon.HTTPBadRequest(
+                'Invalid stack trace',
+                'The `java_stack_trace` must be a string.'
+            )
+        return self.get_stack_trace_frames(lang, [stack_trace])
+
+    @staticmethod
+    def get_crashed_thread_frames(threads, crashed_thread):
+        """Return a tuple (frames, crashed_thread), the frames of the crashed
+        thread of `threads` and its index. Raise a `falcon.HTTPBadRequest`
+        if the input is not valid. """
+        if not isinstance(threads, list) or not threads:
+            raise falcon.HTTPBadRequest(
+                'Invalid threads',
+                'Threads must be submitted as a non-empty list of lists of '
+                'frames.'
+            )
+
+        if len(threads) > settings.MAX_THREADS:
+            raise _too_many_threads()
+
+        try:
+            if isinstance(crashed_thread, bool):
+                raise ValueError(crashed_thread)
+            crashed_thread = int(crashed_thread)
+            if not 0 <= crashed_thread < len(threads):
+                raise ValueError(crashed_thread)
+        except (TypeError, ValueError):
+            raise falcon.HTTPBadRequest(
+                'Invalid crashed thread',
+                'The index of the crashed thread must be submitted with '
+                'threads.'
+            )
+
+        return threads[crashed_thread], crashed_thread
+
+    def get_dictionary(self, dictionary_id):
+        """Return the dictionary of id `dictionary_id`, or None if it is
+        None. Raise a `falcon.HTTPBadRequest` if it is unknown. """
+        if dictionary_id is None:
+            return None
+
+        dictionary = None
+        if isinstance(dictionary_id, six.string_types):
+            dictionary = self.dictionaries.get(dictionary_id)
+        if dictionary is None:
+            raise falcon.HTTPBadRequest(
+                'Unknown dictionary',
+                'The dictionary `{}` does not exist or was evicted, it must '
+                'be uploaded again.'.format(dictionary_id)
+            )
+        return dictionary
+
+    def validate(self, lang, frames, dictionary=None):
+        """Raise a `falcon.HTTPBadRequest` if the input is not valid. Frames
+        can be ids of the frames of `dictionary`. """
         if lang not in settings.SUPPORTED_LANGUAGES:
             raise falcon.HTTPBadRequest(
                 'Unsupported lang',
                 'The language `{}` is not supported.'.format(lang)
             )
 
-        try:
-            content = req.context['content']
-        except KeyError:
+        if not frames:
             raise falcon.HTTPBadRequest(
                 'Missing frames',
                 'A list of frames must be submitted in the request body.'
             )
 
-        frames = content.get('frames')
-        if not frames:
+        def is_valid_frame_or_id(frame):
+            return (
+                dictionary is not None and dictionary.is_valid_id(frame) or
+                self.is_valid_frame(frame)
+            )
+
+        if (
+            not isinstance(frames, list) or
+            not all(is_valid_frame_or_id(x) for x in frames)
+        ):
             raise falcon.HTTPBadRequest(
-                'Missing frames',
-                'A list of frames must be submitted in the request body.'
+                'Invalid frames',
+                'Frames must be submitted as a list of strings, of objects '
+                'with a `function` string and a `line` number, or of ids of '
+                'the frames of a dictionary.'
             )
 
-        signature, notes = self.get_signature(lang, frames, crashed_thread)
+        if len(frames) > settings.MAX_FRAMES:
+            raise _too_many_frames()
+
+        # Frames of dictionaries were checked when uploaded.
+        self.validate_lengths(
+            x for x in frames if not isinstance(x, six.integer_types)
+        )
+
+    @staticmethod
+    def validate_lengths(frames):
+        """Raise a `falcon.HTTPRequestEntityTooLarge` if a frame of `frames`
+        is too long. """
+        if any(
+            len(x['function'] if isinstance(x, dict) else x) >
+            settings.MAX_FRAME_LENGTH
+            for x in frames
+        ):
+            raise falcon.HTTPRequestEntityTooLarge(
+                'Frame too long',
+                'Frames cannot be longer than {} characters.'.format(
+                    settings.MAX_FRAME_LENGTH
+                )
+            )
+
+    @staticmethod
+    def get_key(app, lang, frames, crashed_thread, dictionary=None):
+        """Return a hash of everything the result of signing depends on. """
+        if crashed_thread is not None:
+            # It is an int in batches, but a string in query parameters.
+            crashed_thread = six.text_type(crashed_thread)
+
+        values = [lang, app.siglists_version, crashed_thread, frames]
+        if dictionary is not None:
+            # Dictionaries never change, their id stands for their frames.
+            values.append(dictionary.id)
+        if app.siglists_profile is not None:
+            values.append({'profile': app.siglists_profile})
+        content = json.dumps(values, sort_keys=True)
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def is_partial(result):
+        """Return whether `result` was signed past its deadline. """
+        return DEADLINE_NOTE in result['notes']
+
+    def get_result(self, app, lang, frames, crashed_thread, key,
+                   dictionary=None, deadline=None):
+        """Return the result of signing `frames` with `app`, using the
+        cached result for `key` if any. """
+        result = self.results.get(key)
+        if result is None:
+            result = self._make_result(app, lang, *app.generate(
+                frames, crashed_thread, dictionary, deadline
+            ))
+            if not self.is_partial(result):
+                self.results.set(key, result)
+
+        metrics.inc('signatures', lang)
+        # The caller might change it.
+        return dict(result)
 
-        resp.body = json.dumps({
+    @staticmethod
+    def _make_result(app, lang, signature, notes):
+        result = {
             'signature': signature,
             'notes': notes,
             'language': lang,
-        })
+            'siglists_version': app.siglists_version,
+        }
+        if app.siglists_profile is not None:
+            result['profile'] = app.siglists_profile
+        return result
+
+    def count(self, lang, result):
+        """Count the signature of `result`, unless it is partial. """
+        if self.heavy_hitters is not None and not self.is_partial(result):
+            self.heavy_hitters.submit(lang, result['signature'])
+
+    @staticmethod
+    def _error_result(ex):
+        return {
+            'error': {
+                'title': ex.title,
+                'description': ex.description,
+            },
+        }
+
+    def get_threads_result(self, app, lang, threads, crashed_thread, key,
+                           dictionary=None, deadline=None):
+        """Return the result of signing the crashed thread of `threads` with
+        `app`, with the `signature` and `notes` of every thread in
+        `threads`, using the cached result for `key` if any.
+
+        Each thread is signed as a stack whose crashed thread is that
+        thread, so that its result is shared with those of requests sending
+        that thread only. Threads without such a result are signed together,
+        see `SignatureToolBase.generate_batch`. Threads that cannot be signed
+        have an `error`.
+        """
+        result = self.results.get(key)
+        if result is None:
+            thread_results = [None] * len(threads)
+            # Threads to sign, as tuples (index, key, frames).
+            unsigned = []
+            for index, frames in enumerate(threads):
+                try:
+                    self.validate(lang, frames, dictionary)
+                except falcon.HTTPError as ex:
+                    thread_results[index] = self._error_result(ex)
+                    continue
+
+                thread_key = self.get_key(app, lang, frames, index, dictionary)
+                thread_results[index] = self.results.get(thread_key)
+                if thread_results[index] is None:
+                    unsigned.append((index, thread_key, frames))
+
+            signed = app.generate_batch(
+                [x[2] for x in unsigned],
+                [x[0] for x in unsigned],
+                dictionary,
+                deadline,
+            )
+            for (index, thread_key, _), (signature, notes) in zip(
+                unsigned, signed
+            ):
+                thread_result = self._make_result(app, lang, signature, notes)
+                if not self.is_partial(thread_result):
+                    self.results.set(thread_key, thread_result)
+                thread_results[index] = thread_result
+
+            thread_results = [
+                x if 'error' in x else {
+                    'signature': x['signature'],
+                    'notes': x['notes'],
+                }
+                for x in thread_results
+            ]
+            result = self._make_result(
+                app,
+                lang,
+                thread_results[crashed_thread]['signature'],
+                thread_results[crashed_thread]['notes'],
+            )
+            result['threads'] = thread_results
+            if not any(
+                'notes' in x and self.is_partial(x) for x in thread_results
+            ):
+                self.results.set(key, result)
+
+        metrics.inc('signatures', lang)
+        return dict(result)
+
+    def sign(self, lang, frames, crashed_thread, dictionary=None,
+             deadline=None, profile=None):
+        """Validate the input, then return the result of signing `frames`,
+        with the siglists of `profile` if not None.
+
+        Raise a `falcon.HTTPBadRequest` if the input is not valid.
+        """
+        self.validate(lang, frames, dictionary)
+
+        # Use the same tool for signing and for the key, in case siglists
+        # are being reloaded.
+        app = self.get_tool(lang, profile)
+        key = self.get_key(app, lang, frames, crashed_thread, dictionary)
+        return self.get_result(
+            app, lang, frames, crashed_thread, key, dictionary, deadline
+        )
+
+    def on_post(self, req, resp):
+        lang = req.get_param('lang')
+        crashed_thread = req.get_param('crashed_thread')
+        threads = None
+
+        if 'text' in req.context:
+            lang = lang or 'java'
+            frames = self.get_stack_trace_frames(lang, req.context['text'])
+        else:
+            try:
+                content = req.context['content']
+            except KeyError:
+                raise falcon.HTTPBadRequest(
+                    'Missing frames',
+                    'A list of frames must be submitted in the request body.'
+                )
+            lang = lang or self.get_default_lang(content)
+            if 'threads' in content:
+                threads = content['threads']
+                frames, crashed_thread = self.get_crashed_thread_frames(
+                    threads,
+                    content.get('crashed_thread', crashed_thread),
+                )
+                if not (
+                    content.get('all_threads') or
+                    req.get_param_as_bool('all_threads')
+                ):
+                    threads = None
+            else:
+                frames = self.get_frames(lang, content)
+
+        dictionary = self.get_dictionary(req.get_param('dictionary'))
+        self.validate(lang, frames, dictionary)
+
+        app = self.get_tool(lang, req.get_param('profile'))
+        # Threads are lists of frames, their key is not that of frames.
+        key = self.get_key(
+            app,
+            lang,
+            frames if threads is None else threads,
+            crashed_thread,
+            dictionary,
+        )
+        # Responses encoded differently are different representations.
+        if media.responds_with_msgpack(req):
+            etag = '"{}-msgpack"'.format(key)
+        else:
+            etag = '"{}"'.format(key)
+        resp.vary = ('Accept', 'Content-Type')
+
+        if req.if_none_match:
+            etags = [
+                x.strip().replace('W/', '', 1)
+                for x in req.if_none_match.split(',')
+            ]
+            if etag in etags or '*' in etags:
+                resp.etag = etag
+                resp.status = falcon.HTTP_304
+                return
+
+        deadline = req.context.get('deadline')
+        if threads is None:
+            result = self.get_result(
+                app, lang, frames, crashed_thread, key, dictionary, deadline
+            )
+        else:
+            result = self.get_threads_result(
+                app, lang, threads, crashed_thread, key, dictionary, deadline
+            )
+
+        # Partial results are not those of the key.
+        if not self.is_partial(result):
+            resp.etag = etag
+
+        with metrics.timer('serialization'):
+            media.set_body(req, resp, result)
+
+        self.count(lang, result)
+        if (
+            self.shadow is not None and
+            lang == 'c' and
+            app.siglists_profile is None and
+            not self.is_partial(result)
+        ):
+            self.shadow.submit(
+                frames, crashed_thread, result['signature'], dictionary
+            )
+
+
+class BatchSignerService(SignerService):
+    """The application responsible for signing many crashes at once.
+
+    The request body contains a list of items, each one being an object
+    with the same content as a request to `SignerService`:
+    `{"lang": ..., "frames": [...], "crashed_thread": ...}`. That list can be
+    sent as a JSON list, as the `items` field of a JSON object, or as
+    newline-delimited JSON (one item per line). Items are decoded one at a
+    time, while signing. The response is streamed as newline-delimited
+    JSON, with one line per item, written as soon as that item is signed.
+    Items that cannot be signed produce an error line and do not prevent
+    other items from being signed. The `dictionary` and `profile` of an
+    item, if any, are those of the query parameters of the same names by
+    default.
+
+    Batches can also be encoded as MessagePack, see
+    `middleware.JSONTranslator`, and results are then streamed as
+    MessagePack maps following each other if the client accepts it.
+    """
+
+    # Tell `middleware.JSONTranslator` to decode items one at a time.
+    batch = True
+    text = False
+
+    content_type = 'application/x-ndjson'
+
+    @staticmethod
+    def encode_json(result):
+        return (json.dumps(result) + '\n').encode('utf-8')
+
+    def iter_results(self, items, default_lang, encode=None,
+                     default_dictionary=None, default_profile=None):
+        """Yield the encoded result of signing each item, `encode` being
+        `encode_json` by default. Items without a `lang` are of
+        `default_lang`, if not None. """
+        if encode is None:
+            encode = self.encode_json
+
+        items = iter(items)
+        index = 0
+        while True:
+            try:
+                item = next(items)
+            except StopIteration:
+                return
+            except falcon.HTTPError as ex:
+                # The rest of the body cannot be read, stop here.
+                result = self._error_result(ex)
+                result['index'] = index
+                yield encode(result)
+                return
+
+            try:
+                if not isinstance(item, dict):
+                    raise falcon.HTTPBadRequest(
+                        'Invalid item',
+                        'Each item must be an object.'
+                    )
+                lang = (
+                    item.get('lang') or
+                    default_lang or
+                    self.get_default_lang(item)
+                )
+                result = self.sign(
+                    lang,
+                    self.get_frames(lang, item),
+                    item.get('crashed_thread'),
+                    self.get_dictionary(
+                        item.get('dictionary') or default_dictionary
+                    ),
+                    admission.get_deadline(settings.REQUEST_DEADLINE),
+                    item.get('profile') or default_profile,
+                )
+                self.count(lang, result)
+            except falcon.HTTPError as ex:
+                result = self._error_result(ex)
+
+            result['index'] = index
+            with metrics.timer('serialization'):
+                line = encode(result)
+            yield line
+            index += 1
+
+    def on_post(self, req, resp):
+        lang = req.get_param('lang')
+
+        try:
+            items = req.context['content']['items']
+        except (KeyError, TypeError):
+            raise falcon.HTTPBadRequest(
+                'Missing items',
+                'A list of items must be submitted in the request body.'
+            )
+
+        if media.responds_with_msgpack(req):
+            resp.content_type = media.MSGPACK_CONTENT_TYPE
+            encode = msgpack_stream.dumps
+        else:
+            resp.content_type = self.content_type
+            encode = self.encode_json
+        resp.stream = self.iter_results(
+            items,
+            lang,
+            encode,
+            req.get_param('dictionary'),
+            req.get_param('profile'),
+        )
+
+
+class FrameDictionaryService(SignerService):
+    """The application receiving dictionaries of frames, see
+    `signer.frame_dictionary`.
+
+    POST requests upload a dictionary, `{"frames": [...]}`, and GET requests
+    for its id tell whether it is known. Both return the `id` and `size` of
+    the dictionary.
+    """
+
+    text = False
+    limited = False
+
+    def on_get(self, req, resp, dictionary_id=None):
+        if dictionary_id is None:
+            raise falcon.HTTPMethodNotAllowed(['POST'])
+
+        dictionary = self.dictionaries.get(dictionary_id)
+        if dictionary is None:
+            raise falcon.HTTPNotFound(
+                title='Unknown dictionary',
+                description='The dictionary `{}` does not exist or was '
+                            'evicted.'.format(dictionary_id)
+            )
+
+        media.set_body(req, resp, self.describe(dictionary))
+
+    def on_post(self, req, resp, dictionary_id=None):
+        if dictionary_id is not None:
+            raise falcon.HTTPMethodNotAllowed(['GET'])
+
+        content = req.context.get('content')
+        frames = content.get('frames') if isinstance(content, dict) else None
+        if (
+            not frames or
+            not isinstance(frames, list) or
+            not all(self.is_valid_frame(x) for x in frames)
+        ):
+            raise falcon.HTTPBadRequest(
+                'Invalid frames',
+                'A dictionary is a non-empty list of frames: strings, or '
+                'objects with a `function` string and a `line` number.'
+            )
+
+        if len(frames) > settings.MAX_DICTIONARY_FRAMES:
+            raise _too_many_dictionary_frames()
+        self.validate_lengths(frames)
+
+        dictionary, created = self.dictionaries.add(frames)
+        if created:
+            resp.status = falcon.HTTP_201
+        resp.location = '{}/{}'.format(req.path.rstrip('/'), dictionary.id)
+        media.set_body(req, resp, self.describe(dictionary))
+
+    @staticmethod
+    def describe(dictionary):
+        return {'id': dictionary.id, 'size': len(dictionary)}
@@ -0,0 +1,45 @@
+import pytest
+
+from signer.benchmarks.stacks import StackGenerator
+from signer.languages.c import CSignatureTool
+
+
+class TestStackGenerator(object):
+
+    def test_reproducible(self):
+        first = StackGenerator(seed=1)
+        second = StackGenerator(seed=1)
+        for kind in StackGenerator.KINDS:
+            assert first.stack(kind) == second.stack(kind)
+        assert first.java_trace() == second.java_trace()
+
+        assert StackGenerator(seed=2).stack() != StackGenerator(1).stack()
+
+    def test_kinds(self):
+        generator = StackGenerator()
+        tool = CSignatureTool()
+
+        stack = generator.stack('typical')
+        assert stack[0] in generator.irrelevant or '@0x' in stack[0]
+
+        stack = generator.stack('prefix_heavy')
+        prefixes = [x for x in stack if tool.classify(x).prefix]
+        assert len(prefixes) >= 15
+
+        stack = generator.stack('sentinel')
+        assert tool.find_sentinel(stack) is not None
+
+        stack = generator.stack('trim_dll')
+        assert any(tool.classify(x).trimmed for x in stack)
+
+        stack = generator.stack('deep_recursion')
+        assert len(stack) > 1000
+
+    def test_unknown_kind(self):
+        with pytest.raises(ValueError):
+            StackGenerator().stack('nope')
+
+    def test_java_trace(self):
+        trace = StackGenerator().java_trace()
+        assert trace[0].startswith(('java.', 'android.'))
+        assert all(x.startswith('at ') for x in trace[1:])
@@ -0,0 +1,52 @@
+import json
+
+from signer.benchmarks import suite
+
+
+class TestSuite(object):
+
+    def test_get_stats(self):
+        assert suite.get_stats([3.0, 1.0, 2.0]) == {
+            'min': 1.0,
+            'median': 2.0,
+            'mean': 2.0,
+        }
+        assert suite.get_stats([4.0, 1.0])['median'] == 2.5
+
+    def test_compare(self):
+        baseline = {
+            'a': {'min': 10.0},
+            'b': {'min': 10.0},
+            'c': {'min': 10.0},
+        }
+        results = {
+            'a': {'min': 11.0},
+            'b': {'min': 13.0},
+            'c': {'min': 5.0},
+            'new': {'min': 100.0},
+        }
+        assert suite.compare(results, baseline, 0.2) == [('b', 10.0, 13.0)]
+
+    def test_main(self, tmpdir):
+        output = str(tmpdir.join('results.json'))
+        argv = [
+            '--filter', 'typical',
+            '--stacks', '2',
+            '--number', '1',
+            '--repeat', '1',
+        ]
+        assert suite.main(argv + ['-o', output]) == 0
+
+        with open(output) as results_file:
+            results = json.load(results_file)
+        assert results['meta']['version'] == suite.RESULTS_VERSION
+        assert 'c.do_generate.typical' in results['results']
+        assert 'service.on_post.uncached.typical' in results['results']
+        assert 'c.do_generate.sentinel' not in results['results']
+
+        # Everything got a hundred times faster.
+        for stats in results['results'].values():
+            stats['min'] /= 100
+        with open(output, 'w') as results_file:
+            json.dump(results, results_file)
+        assert suite.main(argv + ['--baseline', output]) == 1
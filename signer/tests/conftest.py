@@ -0,0 +1,24 @@
+import os
+import shutil
+
+import pytest
+import six
+
+from signer import siglists
+
+
+if six.PY2:
+    # The ASGI mode uses `async` syntax, which is Python 3 only.
+    collect_ignore = ['test_asgi.py']
+
+
+@pytest.fixture
+def siglists_dir(tmpdir):
+    """A directory with a copy of the siglists shipped with the package. """
+    package_dir = os.path.dirname(siglists.__file__)
+    for name in siglists.SIGLIST_NAMES:
+        shutil.copy(
+            os.path.join(package_dir, name + '.txt'),
+            str(tmpdir.join(name + '.txt'))
+        )
+    return tmpdir
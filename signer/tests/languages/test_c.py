@@ -1,6 +1,61 @@
+import time
+
 import mock
+import pytest
+
+from signer.frame_dictionary import FrameDictionary
+from signer.languages.c import (
+    IRRELEVANT,
+    PREFIX,
+    TRIMMED,
+    CSignatureTool,
+    FrameClassification,
+    FrameTable,
+    normalize_function,
+)
+from signer.signature_tool_base import DEADLINE_NOTE
+
+
+@pytest.mark.parametrize('function, collapse_arguments, expected', (
+    ('foo', False, 'foo'),
+    ('foo32.dll@0x1121', False, 'foo32.dll@0x1121'),
+    ('nsTArray<int>::Foo', False, 'nsTArray<T>::Foo'),
+    ('Foo<Bar<int>, Baz<int> >::Foo<int>', False, 'Foo<T>::Foo<T>'),
+    ('Foo<int>::operator<(Foo<int>)', False, 'Foo<T>::operator<(Foo<T>)'),
+    ('Foo::operator<<<int>', False, 'Foo::operator<<<T>'),
+    ('Foo<<name omitted> >', False, 'Foo<T>'),
+    ('<name omitted>', False, '<name omitted>'),
+    ('Foo(int,char const *)', False, 'Foo(int, char const*)'),
+    ('Foo(int , char &,  int)', False, 'Foo(int, char&,  int)'),
+    ('Foo(int,char const *)', True, 'Foo()'),
+    ('Foo(Bar<int>(*)(int))', True, 'Foo()'),
+    ('(anonymous namespace)::Foo(int)', True, '(anonymous namespace)::Foo()'),
+    ('Foo((anonymous namespace)::Bar)', True, 'Foo()'),
+    ('Foo<int, int', False, 'Foo<int, int'),
+))
+def test_normalize_function(function, collapse_arguments, expected):
+    assert normalize_function(
+        function, True, collapse_arguments, True
+    ) == expected
+    # Normalizing twice does not change anything.
+    assert normalize_function(
+        expected, True, collapse_arguments, True
+    ) == expected
+
+
+def test_normalize_function_no_templates():
+    assert normalize_function('Foo<int,int *>', False, False, True) == (
+        'Foo<int, int*>'
+    )
 
-from signer.languages.c import CSignatureTool
+
+def test_normalize_function_no_spaces():
+    # Spaces are kept as sent unless fixing them is enabled.
+    function = 'nsThread::ProcessNextEvent(bool,bool *)'
+    assert normalize_function(function, False, False, False) == function
+    assert normalize_function(
+        'Foo<int>::Bar(int , char &)', True, False, False
+    ) == 'Foo<T>::Bar(int , char &)'
 
 
 class TestSignatureToolBase(object):
@@ -9,13 +64,16 @@ class TestSignatureToolBase(object):
         irrelevant=('ignored1',),
         prefix=('pre1', 'pre2', 'sentinel1', 'sentinel2', 'foo32\.dll',),
         trim_dll=('foo32\.dll.*',),
-        sentinels=('sentinel1', ('sentinel2', lambda x: 'bar' in x))
+        sentinels=('sentinel1', ('sentinel2', lambda x: 'bar' in x)),
+        line_numbers=('js_Interpret',),
     ):
         with mock.patch('signer.languages.c.siglists') as m_siglists:
             m_siglists.IRRELEVANT_SIGNATURE_RE = irrelevant
             m_siglists.PREFIX_SIGNATURE_RE = prefix
             m_siglists.TRIM_DLL_SIGNATURE_RE = trim_dll
             m_siglists.SIGNATURE_SENTINELS = sentinels
+            m_siglists.SIGNATURES_WITH_LINE_NUMBERS_RE = line_numbers
+            m_siglists.MATCHERS = {}
 
             return CSignatureTool()
 
@@ -79,6 +137,101 @@ class TestSignatureToolBase(object):
         signature, _ = inst.generate(frames)
         assert signature == 'sentinel1 | foo'
 
+    def test_find_sentinel(self):
+        condition_fn = mock.Mock(return_value=False)
+        inst = self.get_instance(sentinels=(
+            'sentinel1',
+            ('sentinel2', condition_fn),
+            'sentinel3',
+            ('sentinel3', condition_fn),
+        ))
+
+        assert inst.find_sentinel([]) is None
+        assert inst.find_sentinel(['foo', 'bar']) is None
+        assert inst.find_sentinel(['foo', 'sentinel1', 'bar']) == 1
+        assert inst.find_sentinel(['sentinel3', 'sentinel1']) == 0
+        # Conditions are only checked for sentinels found in the stack.
+        assert condition_fn.call_count == 0
+
+        # Conditions are checked once, even if the sentinel appears more.
+        frames = ['sentinel2', 'foo', 'sentinel2', 'sentinel1']
+        assert inst.find_sentinel(frames) == 3
+        condition_fn.assert_called_once_with(frames)
+
+        condition_fn.return_value = True
+        assert inst.find_sentinel(frames) == 0
+
+    @mock.patch('signer.languages.c.settings.FIX_SPACES', True)
+    def test_find_sentinel_not_normalized(self):
+        inst = self.get_instance(sentinels=(
+            'sentinel1',
+            ('Foo<char>::Bar(int *,int)', lambda x: 'baz' in x),
+        ))
+
+        # Frames are matched as sent, then normalized.
+        frames = ['pre1', 'Foo<char>::Bar(int *,int)', 'baz', 'bar']
+        assert inst.find_sentinel(frames) == 1
+        assert inst.generate(frames)[0] == 'Foo<char>::Bar(int*, int)'
+        assert inst.find_sentinel(['Foo<char>::Bar(int*, int)', 'baz']) is (
+            None
+        )
+
+        frames = ['pre1', {'function': 'sentinel1', 'line': 3}, 'bar']
+        assert inst.find_sentinel(frames) == 1
+        assert inst.generate(frames)[0] == 'sentinel1 | bar'
+
+    def test_generate_normalized(self):
+        inst = self.get_instance()
+
+        frames = [
+            'pre1',
+            'nsTArray<int>::Foo(int,int)',
+            'bar',
+        ]
+        signature, _ = inst.generate(frames)
+        assert signature == 'pre1 | nsTArray<int>::Foo(int,int)'
+
+        with mock.patch(
+            'signer.languages.c.settings.COLLAPSE_TEMPLATES', True
+        ):
+            inst = self.get_instance()
+            signature, _ = inst.generate(frames)
+        assert signature == 'pre1 | nsTArray<T>::Foo(int,int)'
+
+        with mock.patch('signer.languages.c.settings.FIX_SPACES', True):
+            inst = self.get_instance()
+            signature, _ = inst.generate(frames)
+        assert signature == 'pre1 | nsTArray<int>::Foo(int, int)'
+
+        frames = [
+            {'function': 'pre1', 'line': 12},
+            {'function': 'js_Interpret', 'line': 42},
+            {'function': 'bar'},
+        ]
+        signature, _ = inst.generate(frames)
+        assert signature == 'pre1 | js_Interpret:42'
+
+        frames = [{'function': 'ignored1', 'line': 12}]
+        signature, _ = inst.generate(frames, 0)
+        assert signature == 'ignored1'
+
+    @mock.patch('signer.languages.c.settings.COLLAPSE_TEMPLATES', True)
+    def test_generate_matches_before_normalizing(self):
+        inst = self.get_instance(prefix=('pre1', 'Foo<int>::Bar$'))
+
+        frames = ['Foo<int>::Bar', 'baz', 'qux']
+        assert inst.generate(frames)[0] == 'Foo<T>::Bar | baz'
+        frames = ['Foo<char>::Bar', 'baz', 'qux']
+        assert inst.generate(frames)[0] == 'Foo<T>::Bar'
+
+    @mock.patch('signer.languages.c.settings.COLLAPSE_ARGUMENTS', True)
+    def test_generate_collapse_arguments(self):
+        inst = self.get_instance()
+
+        frames = ['pre1', 'Foo(int,int)']
+        signature, _ = inst.generate(frames)
+        assert signature == 'pre1 | Foo()'
+
     def test_generate_with_irrelevant(self):
         inst = self.get_instance()
 
@@ -156,3 +309,261 @@ class TestSignatureToolBase(object):
         assert signature == 'ignored1'
         assert len(notes) == 1
         assert 'no good data for the crashing thread (12)' in notes[0]
+
+    def test_classify(self):
+        inst = self.get_instance()
+
+        assert inst.classify('ignored1') == FrameClassification(
+            True, False, 'ignored1', False
+        )
+        assert inst.classify('foo32.dll@0x1121') == FrameClassification(
+            False, True, 'foo32.dll', True
+        )
+        assert inst.classify('pre1') == FrameClassification(
+            False, False, 'pre1', True
+        )
+        assert inst.classify('foo') == FrameClassification(
+            False, False, 'foo', False
+        )
+
+    def test_classify_cached(self):
+        inst = self.get_instance()
+
+        frames = ['pre1', 'foo32.dll@0x1121', 'ignored1', 'foo']
+        signature, _ = inst.generate(frames)
+        assert signature == 'pre1 | foo32.dll | foo'
+        stats = inst.classification_cache.stats()
+        assert stats['misses'] == 4
+        assert stats['hits'] == 0
+
+        signature, _ = inst.generate(frames)
+        assert signature == 'pre1 | foo32.dll | foo'
+        stats = inst.classification_cache.stats()
+        assert stats['misses'] == 4
+        assert stats['hits'] == 4
+
+    @mock.patch(
+        'signer.languages.c.settings.FRAME_CLASSIFICATION_CACHE_SIZE',
+        2
+    )
+    def test_classify_cache_bounded(self):
+        inst = self.get_instance()
+
+        frames = ['pre1', 'pre2', 'foo', 'bar']
+        signature, _ = inst.generate(frames)
+        assert signature == 'pre1 | pre2 | foo'
+        assert inst.classification_cache.stats()['evictions'] == 1
+        assert len(inst.classification_cache) == 2
+
+    def test_generate_with_dictionary(self):
+        inst = self.get_instance()
+        dictionary = FrameDictionary(
+            ['sentinel1', 'pre1', 'foo32.dll@0x1121', 'ignored1', 'foo']
+        )
+
+        for frames in (
+            [0, 1, 2, 'foo32.dll@0x2', 3, 4],
+            ['bar', 0, 1, 'pre2', 4],
+            [3, 'bar', 4],
+            [{'function': 'js_Interpret', 'line': 3}, 4],
+            [3],
+        ):
+            assert inst.generate(frames, 1, dictionary) == (
+                inst.generate(dictionary.decode(frames), 1)
+            )
+
+    def test_generate_with_dictionary_cache(self):
+        inst = self.get_instance()
+        dictionary = FrameDictionary(['pre1', 'foo', 'bar'])
+
+        assert inst.generate([0, 1, 2], None, dictionary) == (
+            'pre1 | foo', []
+        )
+        cache = dictionary.get_tool_cache(inst, None)
+        assert cache == [
+            FrameClassification(False, False, 'pre1', True),
+            FrameClassification(False, False, 'foo', False),
+            None,
+        ]
+
+        # Frames are then classified by id, and not searched.
+        with mock.patch.object(inst, 'classify') as m_classify:
+            assert inst.generate([0, 1, 2], None, dictionary) == (
+                'pre1 | foo', []
+            )
+            assert not m_classify.called
+
+    def test_generate_with_dictionary_sentinel(self):
+        inst = self.get_instance(sentinels=('Foo<int>::Run',))
+        dictionary = FrameDictionary(['bar', 'Foo<int>::Run', 'baz'])
+
+        assert inst.generate([0, 1, 2], None, dictionary)[0] == (
+            'Foo<int>::Run'
+        )
+        frames = [0, {'function': 'Foo<int>::Run', 'line': 1}, 2]
+        assert inst.generate(frames, None, dictionary)[0] == 'Foo<int>::Run'
+        frames = [0, 'Foo<char>::Run', 2]
+        assert inst.generate(frames, None, dictionary)[0] == 'bar'
+
+    def test_generate_deadline(self):
+        inst = self.get_instance()
+        frames = ['pre1'] * 35 + ['foo']
+
+        signature, notes = inst.generate(frames, 0, deadline=time.time() + 60)
+        assert signature == ' | '.join(frames)
+        assert notes == []
+
+        # The deadline is checked every 32 frames.
+        signature, notes = inst.generate(frames, 0, deadline=0)
+        assert signature == ' | '.join(['pre1'] * 32)
+        assert notes == [DEADLINE_NOTE]
+
+        dictionary = FrameDictionary(['pre1', 'foo'])
+        signature, notes = inst.generate(
+            [0] * 35 + [1], 0, dictionary, deadline=0
+        )
+        assert signature == ' | '.join(['pre1'] * 32)
+        assert notes == [DEADLINE_NOTE]
+
+    @pytest.mark.parametrize('depth, expected', (
+        (2, 'a'),
+        (3, 'sentinel1 | foo'),
+        (10, 'sentinel1 | foo'),
+    ))
+    def test_sentinel_scan_depth(self, depth, expected):
+        inst = self.get_instance()
+        dictionary = FrameDictionary(['a', 'b', 'sentinel1', 'foo'])
+
+        with mock.patch(
+            'signer.languages.c.settings.SENTINEL_SCAN_DEPTH', depth
+        ):
+            assert inst.generate(['a', 'b', 'sentinel1', 'foo'])[0] == (
+                expected
+            )
+            assert inst.generate([0, 1, 2, 3], None, dictionary)[0] == (
+                expected
+            )
+            frames = ['a', 'b', {'function': 'sentinel1', 'line': 1}, 'foo']
+            assert inst.generate(frames)[0] == expected
+
+    def test_sentinel_scan_depth_dict_frames(self):
+        inst = self.get_instance()
+        stack = ['pre1', 'pre1', 'pre1', {'function': 'foo', 'line': 3}]
+
+        with mock.patch(
+            'signer.languages.c.settings.SENTINEL_SCAN_DEPTH', 2
+        ):
+            assert inst.generate(stack, 0)[0] == 'pre1 | pre1 | pre1 | foo'
+            assert inst.generate_batch([stack]) == [inst.generate(stack)]
+
+    def test_frame_table(self):
+        inst = self.get_instance(sentinels=('sentinel1', 'bar'))
+        table = FrameTable(inst, [
+            ['pre1', 'foo', 'sentinel1'],
+            ['foo', {'function': 'bar', 'line': 1}, 'Foo<int>::Run'],
+            [{'function': 'bar', 'line': 1}, {'function': 'bar'}, 'pre1'],
+        ])
+        assert len(table) == 6
+        assert [[table.frames[x] for x in ids] for ids in table.stacks] == [
+            ['pre1', 'foo', 'sentinel1'],
+            ['foo', {'function': 'bar', 'line': 1}, 'Foo<int>::Run'],
+            [{'function': 'bar', 'line': 1}, {'function': 'bar'}, 'pre1'],
+        ]
+        assert table.stacks[0][0] == table.stacks[2][2]
+
+        # Frames given as dicts are sentinels if their function is.
+        assert table.sentinel_ids == frozenset([
+            table.stacks[0][2], table.stacks[1][1], table.stacks[2][1]
+        ])
+        assert table.get_function(table.stacks[2][1]) == 'bar'
+
+        pre1, foo = table.stacks[0][:2]
+        assert table.codes[pre1] is None
+        assert table.classify(pre1) == PREFIX
+        assert table.classify(foo) == 0
+        assert table.names == ['pre1', 'foo']
+        assert table.signature_ids[foo] == 1
+
+        table = FrameTable(inst, [['ignored1', 'foo32.dll@0x12']])
+        assert [table.classify(x) for x in table.stacks[0]] == [
+            IRRELEVANT, TRIMMED | PREFIX
+        ]
+        assert table.names == ['ignored1', 'foo32.dll']
+
+    def test_generate_batch(self):
+        inst = self.get_instance(sentinels=(
+            'sentinel1',
+            ('sentinel2', lambda x: 'bar' in x),
+            ('Foo<int>::Run', lambda x: 'baz' in x),
+        ))
+        stacks = [
+            ['foo', 'bar'],
+            ['pre1', 'pre2', 'foo', 'bar'],
+            ['pre1', 'sentinel1', 'pre2', 'foo', 'bar'],
+            ['pre1', 'sentinel2', 'foo', 'sentinel1', 'foo', 'bar'],
+            ['pre1', 'sentinel2', 'foo', 'sentinel1', 'foo'],
+            ['pre1', 'Foo<int>::Run', 'foo', 'baz'],
+            ['pre1', 'Foo<int>::Run', 'Foo<char>::Run', 'foo'],
+            ['pre1', 'Foo<char>::Run', 'baz'],
+            ['pre1', {'function': 'sentinel1', 'line': 2}, 'foo'],
+            ['pre1', {'function': 'sentinel2', 'line': 2}, 'bar'],
+            ['pre1', 'nsTArray<int>::Foo(int,int)', 'bar'],
+            [
+                {'function': 'pre1', 'line': 12},
+                {'function': 'js_Interpret', 'line': 42},
+                {'function': 'bar'},
+            ],
+            ['foo32.dll@0x12', 'foo32.dll@0x34', 'pre1', 'foo'],
+            ['ignored1', 'ignored1'],
+            ['ignored1', {'function': 'ignored1', 'line': 3}],
+            ['ignored1', 'Foo<int>::Run'],
+            [''],
+            ['pre1'] * 100,
+            [],
+        ]
+        for crashed_thread in (None, 0):
+            crashed_threads = [crashed_thread] * len(stacks)
+            assert inst.generate_batch(stacks, crashed_threads) == [
+                inst.generate(x, crashed_thread) for x in stacks
+            ]
+        assert inst.generate_batch(stacks) == [
+            inst.generate(x) for x in stacks
+        ]
+
+        with mock.patch(
+            'signer.languages.c.settings.SENTINEL_SCAN_DEPTH', 2
+        ):
+            assert inst.generate_batch(stacks) == [
+                inst.generate(x) for x in stacks
+            ]
+
+    def test_generate_batch_with_dictionary_and_deadline(self):
+        inst = self.get_instance()
+        dictionary = FrameDictionary(['pre1', 'foo'])
+        stacks = [[0] * 35 + [1], [0, 1], ['pre1', 'bar']]
+
+        assert inst.generate_batch(stacks, [0, 1, 2], dictionary) == [
+            inst.generate(x, index, dictionary)
+            for index, x in enumerate(stacks)
+        ]
+        for deadline in (0, time.time() + 60):
+            assert inst.generate_batch(
+                stacks, [0, 1, 2], dictionary, deadline
+            ) == [
+                inst.generate(x, index, dictionary, deadline)
+                for index, x in enumerate(stacks)
+            ]
+
+    def test_generate_batch_classifies_once(self):
+        inst = self.get_instance()
+        stacks = [['pre1', 'pre2', 'foo', 'bar']] * 3 + [['pre2', 'baz']]
+
+        with mock.patch.object(
+            inst, 'classify', wraps=inst.classify
+        ) as m_classify:
+            assert [x[0] for x in inst.generate_batch(stacks)] == [
+                'pre1 | pre2 | foo'
+            ] * 3 + ['pre2 | baz']
+        assert sorted(x[0][0] for x in m_classify.call_args_list) == [
+            'baz', 'foo', 'pre1', 'pre2'
+        ]
@@ -1,4 +1,8 @@
-from signer.languages.java import JavaSignatureTool
+from signer.languages.java import (
+    JavaSignatureTool,
+    get_stack_trace_frames,
+    iter_stack_trace_lines,
+)
 
 
 class TestSignatureToolBase(object):
@@ -47,3 +51,48 @@ class TestSignatureToolBase(object):
             'Given view not a child of android.widget.AbsoluteLayout@<addr>: '
             'at android.view.ViewGroup.updateViewLayout(ViewGroup.java)'
         )
+
+
+class TestStackTraceLines(object):
+    def test_iter_stack_trace_lines(self):
+        chunks = [
+            '\r\njava.lang.NullPointerException: ',
+            'oops\r\n\tat Foo.bar(Foo.java:42)\n\n',
+            '   \n  at Foo.',
+            'baz(Foo.java:3)',
+        ]
+        assert list(iter_stack_trace_lines(chunks, 100)) == [
+            'java.lang.NullPointerException: oops',
+            'at Foo.bar(Foo.java:42)',
+            'at Foo.baz(Foo.java:3)',
+        ]
+
+    def test_iter_stack_trace_lines_truncated(self):
+        chunks = ['  ' + 'a' * 6, 'a' * 6 + '\n\tbbb', '\nc']
+        assert list(iter_stack_trace_lines(chunks, 5)) == [
+            'aaaaa', 'bbb', 'c'
+        ]
+
+    def test_get_stack_trace_frames_lazy(self):
+        def iter_chunks():
+            yield 'java.lang.Exception: foo\n'
+            yield '\tat Foo.bar(Foo.java:42)\n\tat Foo.baz'
+            raise AssertionError('read too far')
+
+        assert get_stack_trace_frames(iter_chunks(), 100) == [
+            'java.lang.Exception: foo',
+            'at Foo.bar(Foo.java:42)',
+        ]
+
+    def test_same_signature(self):
+        trace = (
+            'java.lang.IllegalArgumentException: Given view not a child of '
+            'android.widget.AbsoluteLayout@4054b560\n'
+            '\tat android.view.ViewGroup.updateViewLayout(ViewGroup.java:1968)'
+            '\n\tat org.mozilla.gecko.GeckoApp.repositionPluginViews'
+            '(GeckoApp.java:1492)\n'
+        )
+        inst = JavaSignatureTool()
+        assert inst.generate(get_stack_trace_frames([trace], 1000)) == (
+            inst.generate([x.strip() for x in trace.splitlines()])
+        )
@@ -0,0 +1,177 @@
+import threading
+
+import mock
+import pytest
+
+from signer.languages.c import CSignatureTool
+from signer.languages.java import JavaSignatureTool
+from signer.languages.registry import (
+    SignatureToolRegistry,
+    UnsupportedLanguageError,
+)
+from signer.siglists import load_siglists
+from signer.siglists.profiles import (
+    SiglistProfile,
+    SiglistProfiles,
+    UnknownProfileError,
+)
+
+
+def get_profiles():
+    return SiglistProfiles({
+        'a': SiglistProfile('a', additions={'prefix_signature_re': ('foo',)}),
+        'b': SiglistProfile('b'),
+    })
+
+
+class TestSignatureToolRegistry(object):
+    def test_get(self):
+        registry = SignatureToolRegistry()
+
+        assert isinstance(registry.get('c'), CSignatureTool)
+        assert isinstance(registry.get('java'), JavaSignatureTool)
+
+    def test_get_builds_once(self):
+        registry = SignatureToolRegistry()
+
+        tool = registry.get('c')
+        assert registry.get('c') is tool
+
+    def test_get_unsupported(self):
+        registry = SignatureToolRegistry(languages=('c',))
+
+        with pytest.raises(UnsupportedLanguageError):
+            registry.get('java')
+
+    def test_warm_up(self):
+        registry = SignatureToolRegistry()
+
+        with mock.patch.object(registry, '_build') as m_build:
+            registry.warm_up()
+            registry.get('c')
+            registry.get('java')
+
+        assert m_build.call_count == 2
+
+    def test_get_threaded(self):
+        registry = SignatureToolRegistry()
+        tools = []
+
+        def get_tool():
+            tools.append(registry.get('c'))
+
+        threads = [threading.Thread(target=get_tool) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(tools) == 10
+        assert all(tool is tools[0] for tool in tools)
+
+
+class TestProfiles(object):
+    def test_get(self):
+        registry = SignatureToolRegistry(profiles=get_profiles())
+
+        tool = registry.get('c', 'a')
+        assert tool is not registry.get('c')
+        assert tool.siglists_profile == 'a'
+        assert tool.generate(['foo', 'bar'])[0] == 'foo | bar'
+        assert registry.get('c', 'a') is tool
+
+        stats = registry.profile_stats()
+        assert stats['profiles'] == ['a', 'b']
+        assert stats['uses'] == {'a': 2}
+        assert stats['builds'] == {'a': 1}
+        assert stats['tools']['size'] == 1
+
+    def test_get_java(self):
+        registry = SignatureToolRegistry(profiles=get_profiles())
+
+        # Java signatures do not depend on siglists.
+        assert registry.get('java', 'a') is registry.get('java')
+        assert registry.get('java', 'b') is registry.get('java')
+
+        stats = registry.profile_stats()
+        assert stats['uses'] == {'a': 1, 'b': 1}
+        assert stats['builds'] == {}
+        assert stats['tools']['size'] == 0
+
+    def test_build_concurrently(self):
+        registry = SignatureToolRegistry(profiles=get_profiles())
+        build = registry._build
+        building = threading.Event()
+        done = threading.Event()
+
+        def build_slowly(lang, siglist_set):
+            if siglist_set.profile == 'a':
+                building.set()
+                assert done.wait(10)
+            return build(lang, siglist_set)
+
+        tools = []
+        with mock.patch.object(registry, '_build', side_effect=build_slowly):
+            threads = [
+                threading.Thread(
+                    target=lambda: tools.append(registry.get('c', 'a'))
+                )
+                for _ in range(2)
+            ]
+            for thread in threads:
+                thread.start()
+            assert building.wait(10)
+
+            # Tools of other profiles are built while `a` is.
+            assert registry.get('c', 'b').siglists_profile == 'b'
+            assert not tools
+
+            done.set()
+            for thread in threads:
+                thread.join()
+
+        assert len(tools) == 2
+        assert tools[0] is tools[1]
+        assert registry.profile_stats()['builds'] == {'a': 1, 'b': 1}
+
+    def test_get_unknown(self):
+        with pytest.raises(UnknownProfileError):
+            SignatureToolRegistry().get('c', 'a')
+
+        registry = SignatureToolRegistry(profiles=get_profiles())
+        with pytest.raises(UnknownProfileError):
+            registry.get('c', 'unknown')
+        with pytest.raises(UnsupportedLanguageError):
+            registry.get('cobol', 'a')
+        assert registry.profile_stats()['uses'] == {}
+
+    def test_eviction(self):
+        registry = SignatureToolRegistry(
+            profiles=get_profiles(),
+            profile_cache_size=1,
+        )
+        tool = registry.get('c', 'a')
+        registry.get('c', 'b')
+        assert registry.get('c', 'a') is not tool
+
+        stats = registry.profile_stats()
+        assert stats['tools']['evictions'] == 2
+        assert stats['builds'] == {'a': 2, 'b': 1}
+
+    def test_set_siglists(self, siglists_dir):
+        registry = SignatureToolRegistry(profiles=get_profiles())
+        tool = registry.get('c', 'a')
+
+        registry.set_siglists(load_siglists(str(siglists_dir)))
+        new_tool = registry.get('c', 'a')
+        assert new_tool is not tool
+        assert registry.profile_stats()['tools']['size'] == 1
+
+    def test_set_profiles(self):
+        registry = SignatureToolRegistry()
+        registry.set_profiles(get_profiles())
+        assert registry.get('c', 'b').siglists_profile == 'b'
+
+        registry.set_profiles(None)
+        with pytest.raises(UnknownProfileError):
+            registry.get('c', 'b')
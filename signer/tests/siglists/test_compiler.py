@@ -0,0 +1,185 @@
+import json
+import random
+import re
+
+import pytest
+
+from signer import siglists
+from signer.siglists.compiler import compile_siglist
+
+
+# Patterns covering all tiers of the compiler, and some tricky cases.
+SYNTHETIC_PATTERNS = (
+    'exact$',
+    'exact_nl\\Z',
+    '^anchored',
+    'prefix',
+    'prefix_star.*',
+    'prefix_stars.*.*',
+    '.*contains',
+    '.*contains_star.*',
+    '.*suffix$',
+    '.*suffix_z\\Z',
+    'escaped\\.dot',
+    'escaped_star\\.*',
+    'escaped_dollar\\$',
+    'escaped_backslash\\\\.*',
+    'escaped_backslash_dollar\\\\$',
+    'char_class\\d',
+    'wild.card',
+    '(group|alternation)',
+    'ab+c?',
+    'x{2,3}',
+    '[set]',
+    '<angle>::operator()',
+)
+
+ALPHABET = (
+    'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+    '_:@.$\\()<>[]{}*+?|^ -\n'
+)
+
+
+def get_siglists():
+    return {
+        'irrelevant': siglists.IRRELEVANT_SIGNATURE_RE,
+        'prefix': siglists.PREFIX_SIGNATURE_RE,
+        'trim_dll': siglists.TRIM_DLL_SIGNATURE_RE,
+        'line_numbers': siglists.SIGNATURES_WITH_LINE_NUMBERS_RE,
+        'synthetic': SYNTHETIC_PATTERNS,
+    }
+
+
+def random_string(rand, max_length=12):
+    return ''.join(
+        rand.choice(ALPHABET) for _ in range(rand.randint(0, max_length))
+    )
+
+
+def generate_corpus(patterns, seed=42):
+    """Return strings that match, or almost match, the given patterns. """
+    key = (tuple(patterns), seed)
+    if key not in _CORPORA:
+        _CORPORA[key] = _generate_corpus(patterns, seed)
+    return _CORPORA[key]
+
+
+_CORPORA = {}
+
+
+def _generate_corpus(patterns, seed):
+    rand = random.Random(seed)
+    corpus = ['', '\n', '.', '$']
+
+    for pattern in patterns:
+        # Turn the pattern into something close to what it matches.
+        literal = pattern.lstrip('^').replace('.*', '').replace('\\Z', '')
+        literal = literal.replace('\\', '').rstrip('$')
+        variants = [
+            literal,
+            pattern,
+            literal[:-1],
+            literal[1:],
+            literal.upper(),
+            literal.lower(),
+        ]
+
+        for variant in variants:
+            corpus.append(variant)
+            for _ in range(10):
+                corpus.append(variant + random_string(rand))
+                corpus.append(random_string(rand) + variant)
+                corpus.append(
+                    random_string(rand) + variant + random_string(rand)
+                )
+            corpus.append(variant + '\n')
+            corpus.append(variant + '\nfoo')
+            corpus.append('foo\n' + variant)
+            corpus.append(variant + '@0x1234')
+            corpus.append(variant + '(int, char const*)')
+
+    for _ in range(5000):
+        corpus.append(random_string(rand, 40))
+
+    return corpus
+
+
+@pytest.mark.parametrize('name', sorted(get_siglists()))
+def test_same_as_joined_regex(name):
+    patterns = get_siglists()[name]
+    joined = re.compile('|'.join(patterns))
+    matcher = compile_siglist(patterns)
+
+    corpus = generate_corpus(
+        # Also use other lists, to test strings that do not match.
+        [x for lst in get_siglists().values() for x in lst
+         if not isinstance(x, tuple)]
+    )
+    assert len(corpus) > 50000
+
+    mismatches = [
+        x for x in corpus
+        if bool(matcher.match(x)) != bool(joined.match(x))
+    ]
+    assert mismatches == []
+
+    # Make sure the corpus is relevant.
+    matches = sum(1 for x in corpus if matcher.match(x))
+    assert 0 < matches < len(corpus)
+
+
+def test_tiers():
+    matcher = compile_siglist(SYNTHETIC_PATTERNS)
+
+    assert matcher.exact == set([
+        'exact', 'exact\n', 'exact_nl', 'escaped_backslash_dollar\\',
+        'escaped_backslash_dollar\\\n',
+    ])
+    assert matcher.prefixes == set([
+        'anchored', 'prefix', 'prefix_star', 'prefix_stars', 'escaped.dot',
+        'escaped_dollar$', 'escaped_backslash\\',
+    ])
+    assert matcher.contains == set(['contains', 'contains_star'])
+    assert matcher.suffixes == {
+        '$': set(['suffix']),
+        '\\Z': set(['suffix_z']),
+    }
+    assert matcher.residual_patterns == (
+        'escaped_star\\.*',
+        'char_class\\d',
+        'wild.card',
+        '(group|alternation)',
+        'ab+c?',
+        'x{2,3}',
+        '[set]',
+        '<angle>::operator()',
+    )
+
+
+def test_trie_regex():
+    matcher = compile_siglist(['arena', 'abort', 'alloc', 'abortion', 'b'])
+    assert matcher.regex.pattern == '(?:a(?:bort|lloc|rena)|b)'
+
+
+def test_empty_patterns():
+    assert not compile_siglist([]).match('foo')
+    assert compile_siglist(['']).match('foo')
+    assert compile_siglist(['.*']).match('foo')
+    assert not compile_siglist(['.*$']).match('foo\nbar')
+
+
+@pytest.mark.parametrize('name', sorted(get_siglists()))
+def test_from_data(name):
+    patterns = get_siglists()[name]
+    matcher = compile_siglist(patterns)
+    data = json.loads(json.dumps(matcher.as_data()))
+    loaded = compile_siglist(patterns, data)
+
+    assert loaded.as_data() == matcher.as_data()
+    corpus = generate_corpus(patterns)
+    assert [bool(loaded.match(x)) for x in corpus] == (
+        [bool(matcher.match(x)) for x in corpus]
+    )
+
+    # Data of other patterns is not used.
+    assert compile_siglist(patterns[:-1], data).patterns == patterns[:-1]
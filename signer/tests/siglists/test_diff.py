@@ -0,0 +1,22 @@
+from signer.siglists import load_siglists
+from signer.siglists.diff import diff_siglists
+from signer.tests.siglists.test_reloader import add_line
+
+
+class TestDiffSiglists(object):
+    def test_diff_siglists(self, siglists_dir):
+        old = load_siglists(str(siglists_dir))
+        assert diff_siglists(old, old) == {}
+        assert diff_siglists(old, load_siglists()) == {}
+
+        add_line(siglists_dir, 'prefix_signature_re', 'my_prefix.*')
+        add_line(siglists_dir, 'signature_sentinels', 'my_sentinel')
+        path = siglists_dir.join('irrelevant_signature_re.txt')
+        path.write(path.read().replace('\nashmem\n', '\n'))
+        new = load_siglists(str(siglists_dir))
+
+        assert diff_siglists(old, new) == {
+            'prefix_signature_re': (['my_prefix.*'], []),
+            'signature_sentinels': (['my_sentinel'], []),
+            'irrelevant_signature_re': ([], ['ashmem']),
+        }
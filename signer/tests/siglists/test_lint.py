@@ -0,0 +1,137 @@
+import json
+import re
+
+import pytest
+
+from signer.siglists import SIGLIST_NAMES, SiglistSet
+from signer.siglists.lint import (
+    find_backtracking,
+    find_redundant,
+    main,
+    PatternReport,
+    profile,
+    subsumes,
+)
+from signer.tests.test_frame_index import get_lines
+
+
+@pytest.mark.parametrize('pattern, other, expected', (
+    ('foo', 'foo', True),
+    ('foo', 'foobar', True),
+    ('foo', 'foo.*', True),
+    ('foo.*', 'foo', True),
+    ('foo', 'foobar$', True),
+    ('foobar', 'foo', False),
+    ('foo', '.*foo', False),
+    ('.*oba', 'foobar', True),
+    ('.*oba', '.*foobar$', True),
+    ('.*oba', 'f.o', False),
+    ('.*bar$', '.*foobar$', True),
+    ('.*bar$', '.*foobar\\Z', True),
+    ('.*bar\\Z', '.*foobar$', False),
+    ('.*bar$', 'foobar$', True),
+    ('.*bar$', 'foobar', False),
+    ('foo$', 'foo$', True),
+    ('foo$', 'foo\\Z', True),
+    ('foo\\Z', 'foo$', False),
+    ('.*', 'f[o]+', True),
+    ('f[o]+', 'foo$', True),
+    ('f[o]+', 'foo', False),
+))
+def test_subsumes(pattern, other, expected):
+    assert subsumes(pattern, other) is expected
+
+
+def test_find_redundant():
+    reports = [
+        PatternReport('prefix_signature_re', 'foo.*'),
+        PatternReport('prefix_signature_re', 'foobar'),
+        PatternReport('prefix_signature_re', 'foo'),
+        PatternReport('irrelevant_signature_re', 'foobaz'),
+    ]
+    find_redundant(reports)
+
+    assert [x.redundant_with for x in reports] == [
+        None, 'foo.*', 'foo.*', None
+    ]
+
+
+def test_find_backtracking():
+    assert find_backtracking(re.compile('(a+)+b'), '(a+)+b') is not None
+    assert find_backtracking(re.compile('.*abort'), '.*abort') is None
+
+
+def get_siglist_set(**lists):
+    return SiglistSet(dict(
+        (name, tuple(lists.get(name, ()))) for name in SIGLIST_NAMES
+    ))
+
+
+def test_profile():
+    siglist_set = get_siglist_set(
+        prefix_signature_re=['foo', '.*bar', 'never'],
+        irrelevant_signature_re=['baz$'],
+    )
+    reports = profile(
+        siglist_set,
+        ['foo', 'foobar', 'barfoo', 'baz', 'baz'],
+        {'prefix_signature_re': ['never']},
+    )
+
+    by_pattern = dict((x.pattern, x) for x in reports)
+    assert by_pattern['foo'].hits == 2
+    assert by_pattern['foo'].hit_rate == 0.5
+    assert by_pattern['.*bar'].hits == 2
+    assert by_pattern['never'].hits == 0
+    assert by_pattern['never'].new
+    assert by_pattern['baz$'].hits == 1
+    assert all(x.cost is not None for x in reports)
+    assert not any(x.new for x in reports if x.pattern != 'never')
+
+
+def write_siglists(directory, **lists):
+    for name in SIGLIST_NAMES:
+        directory.join(name + '.txt').write(
+            '\n'.join(lists.get(name, ())) + '\n'
+        )
+    return str(directory)
+
+
+class TestMain(object):
+
+    def get_args(self, tmpdir, new_line):
+        base = write_siglists(
+            tmpdir.mkdir('base'),
+            prefix_signature_re=['foo', '.*bar'],
+        )
+        new = write_siglists(
+            tmpdir.mkdir('new'),
+            prefix_signature_re=['foo', '.*bar', new_line],
+        )
+        corpus = tmpdir.join('crashes.jsonl')
+        corpus.write_binary(b''.join(get_lines([
+            {'frames': ['foo', 'aaaa', 'foobar']},
+        ])))
+        return ['--siglists', new, '--base', base, '--corpus', str(corpus)]
+
+    def test_new_line(self, tmpdir, capsys):
+        args = self.get_args(tmpdir, 'foobar')
+        assert main(args + ['--budget', '1000']) == 0
+
+        out, err = capsys.readouterr()
+        assert 'prefix_signature_re: foobar (subsumed by foo)' in out
+
+    def test_over_budget(self, tmpdir, capsys):
+        args = self.get_args(tmpdir, 'foobar')
+        assert main(args + ['--budget', '0', '--json']) == 1
+
+        out, err = capsys.readouterr()
+        report = json.loads(out)
+        assert [x['pattern'] for x in report['failures']] == ['foobar']
+
+    def test_backtracking(self, tmpdir, capsys):
+        args = self.get_args(tmpdir, '(a+)+b')
+        assert main(args + ['--budget', '1000']) == 1
+
+        out, err = capsys.readouterr()
+        assert 'Patterns backtracking pathologically:' in out
@@ -0,0 +1,157 @@
+import json
+
+import pytest
+
+from signer import siglists
+from signer.languages.c import CSignatureTool
+from signer.siglists import BadRegularExpressionLineError, load_siglists
+from signer.siglists.profiles import (
+    InvalidProfileError,
+    SiglistProfile,
+    SiglistProfiles,
+    UnknownProfileError,
+    load_profiles,
+)
+
+
+def write_profile(profiles_dir, name, content):
+    profiles_dir.join(name + '.json').write(json.dumps(content))
+
+
+@pytest.fixture
+def profiles_dir(tmpdir):
+    profiles_dir = tmpdir.mkdir('profiles')
+    write_profile(profiles_dir, 'desktop', {
+        'add': {'prefix_signature_re': ['foo']},
+        'remove': {'irrelevant_signature_re': ['@0x[0-9a-fA-F]{2,}']},
+    })
+    write_profile(profiles_dir, 'embedded', {
+        'base': 'desktop',
+        'add': {
+            'prefix_signature_re': ['bar'],
+            'signature_sentinels': ['my_sentinel'],
+        },
+        'remove': {'prefix_signature_re': ['foo']},
+    })
+    profiles_dir.join('README.txt').write('Not a profile.')
+    return profiles_dir
+
+
+class TestSiglistProfile(object):
+    def test_from_dict(self):
+        profile = SiglistProfile.from_dict('a', {
+            'base': 'b',
+            'add': {'prefix_signature_re': ['foo']},
+        })
+        assert profile.base == 'b'
+        assert profile.additions == {'prefix_signature_re': ('foo',)}
+        assert profile.removals == {}
+
+    @pytest.mark.parametrize('content', [
+        [],
+        {'unknown': {}},
+        {'base': 1},
+        {'add': []},
+        {'add': {'not_a_siglist': ['foo']}},
+        {'remove': {'prefix_signature_re': 'foo'}},
+        {'remove': {'prefix_signature_re': [1]}},
+    ])
+    def test_from_dict_invalid(self, content):
+        with pytest.raises(InvalidProfileError):
+            SiglistProfile.from_dict('a', content)
+
+    def test_from_dict_bad_regex(self):
+        with pytest.raises(BadRegularExpressionLineError):
+            SiglistProfile.from_dict('a', {
+                'add': {'prefix_signature_re': ['bad(regex']},
+            })
+
+        # Sentinels are not regular expressions.
+        SiglistProfile.from_dict('a', {
+            'add': {'signature_sentinels': ['bad(sentinel']},
+        })
+
+    def test_apply(self):
+        profile = SiglistProfile(
+            'a',
+            additions={'prefix_signature_re': ('c', 'a')},
+            removals={'prefix_signature_re': ('b',)},
+        )
+        lists = {'prefix_signature_re': ('a', 'b')}
+        assert profile.apply(lists) == {'prefix_signature_re': ('a', 'c')}
+        assert lists == {'prefix_signature_re': ('a', 'b')}
+
+
+class TestSiglistProfiles(object):
+    def test_load_profiles(self, profiles_dir):
+        profiles = load_profiles(str(profiles_dir))
+
+        assert profiles.names == ['desktop', 'embedded']
+        assert profiles.directory == str(profiles_dir)
+        assert 'desktop' in profiles
+        assert [x.name for x in profiles.get_chain('embedded')] == [
+            'desktop', 'embedded'
+        ]
+
+    def test_load_profiles_invalid(self, profiles_dir):
+        profiles_dir.join('bad name.json').write('{}')
+        with pytest.raises(InvalidProfileError):
+            load_profiles(str(profiles_dir))
+
+        profiles_dir.join('bad name.json').remove()
+        profiles_dir.join('bad.json').write('{')
+        with pytest.raises(InvalidProfileError):
+            load_profiles(str(profiles_dir))
+
+    def test_bases(self):
+        with pytest.raises(InvalidProfileError):
+            SiglistProfiles({'a': SiglistProfile('a', 'b')})
+
+        with pytest.raises(InvalidProfileError):
+            SiglistProfiles({
+                'a': SiglistProfile('a', 'b'),
+                'b': SiglistProfile('b', 'a'),
+            })
+
+        profiles = SiglistProfiles({})
+        with pytest.raises(UnknownProfileError):
+            profiles.get_chain('a')
+
+    def test_build(self, profiles_dir):
+        profiles = load_profiles(str(profiles_dir))
+        desktop = profiles.build('desktop')
+        embedded = profiles.build('embedded')
+
+        assert desktop.profile == 'desktop'
+        assert desktop.PREFIX_SIGNATURE_RE == (
+            siglists.PREFIX_SIGNATURE_RE + ('foo',)
+        )
+        assert desktop.IRRELEVANT_SIGNATURE_RE == tuple(
+            x for x in siglists.IRRELEVANT_SIGNATURE_RE
+            if x != '@0x[0-9a-fA-F]{2,}'
+        )
+        assert embedded.PREFIX_SIGNATURE_RE == (
+            siglists.PREFIX_SIGNATURE_RE + ('bar',)
+        )
+        assert embedded.IRRELEVANT_SIGNATURE_RE == (
+            desktop.IRRELEVANT_SIGNATURE_RE
+        )
+        assert embedded.SIGNATURE_SENTINELS == (
+            siglists.SIGNATURE_SENTINELS + ('my_sentinel',)
+        )
+        assert embedded.MATCHERS is siglists.MATCHERS
+
+        tool = CSignatureTool(embedded)
+        assert tool.generate(['my_sentinel', 'bar', 'baz'])[0] == (
+            'my_sentinel'
+        )
+        assert tool.generate(['bar', 'baz'])[0] == 'bar | baz'
+
+    def test_build_on_siglist_set(self, profiles_dir, siglists_dir):
+        siglist_set = load_siglists(str(siglists_dir))
+        profile_set = load_profiles(str(profiles_dir)).build(
+            'desktop', siglist_set
+        )
+
+        assert profile_set.version != siglist_set.version
+        assert profile_set.directory == str(siglists_dir)
@@ -0,0 +1,139 @@
+import os
+
+import pytest
+
+from signer import siglists
+from signer.languages.registry import SignatureToolRegistry
+from signer.siglists import BadRegularExpressionLineError, load_siglists
+from signer.siglists.reloader import SiglistsReloader
+
+
+def add_line(siglists_dir, name, line):
+    path = siglists_dir.join(name + '.txt')
+    path.write(path.read() + '\n' + line + '\n')
+    # Make sure the modification time changes.
+    mtime = os.stat(str(path)).st_mtime + 10
+    os.utime(str(path), (mtime, mtime))
+
+
+def get_reloader(siglists_dir, interval=0):
+    registry = SignatureToolRegistry(languages=('c',))
+    registry.set_siglists(load_siglists(str(siglists_dir)))
+    return SiglistsReloader(registry, str(siglists_dir), interval)
+
+
+class TestLoadSiglists(object):
+    def test_load_siglists(self, siglists_dir):
+        add_line(siglists_dir, 'prefix_signature_re', 'my_prefix')
+        siglist_set = load_siglists(str(siglists_dir))
+
+        assert siglist_set.version != siglists.get_package_siglists().version
+        assert siglist_set.PREFIX_SIGNATURE_RE == (
+            siglists.PREFIX_SIGNATURE_RE + ('my_prefix',)
+        )
+        assert siglist_set.SIGNATURE_SENTINELS == siglists.SIGNATURE_SENTINELS
+
+    def test_load_siglists_bad_regex(self, siglists_dir):
+        add_line(siglists_dir, 'prefix_signature_re', 'bad(regex')
+
+        with pytest.raises(BadRegularExpressionLineError):
+            load_siglists(str(siglists_dir))
+
+
+class TestSiglistsReloader(object):
+    def test_reload(self, siglists_dir):
+        reloader = get_reloader(siglists_dir)
+        registry = reloader.registry
+        old_tool = registry.get('c')
+
+        assert old_tool.generate(['my_prefix', 'foo'])[0] == 'my_prefix'
+
+        add_line(siglists_dir, 'prefix_signature_re', 'my_prefix')
+        version = reloader.reload()
+        assert version != old_tool.siglists_version
+        # The version only depends on the content of the siglists.
+        assert version == load_siglists(str(siglists_dir)).version
+
+        tool = registry.get('c')
+        assert tool is not old_tool
+        assert tool.siglists_version == version
+        assert tool.generate(['my_prefix', 'foo'])[0] == 'my_prefix | foo'
+        # The previous tool still works for requests using it.
+        assert old_tool.generate(['my_prefix', 'foo'])[0] == 'my_prefix'
+
+    def test_reload_bad_regex(self, siglists_dir):
+        reloader = get_reloader(siglists_dir)
+        registry = reloader.registry
+        old_tool = registry.get('c')
+
+        add_line(siglists_dir, 'prefix_signature_re', 'bad(regex')
+        with pytest.raises(BadRegularExpressionLineError):
+            reloader.reload()
+
+        assert registry.get('c') is old_tool
+        assert registry.siglists_version == old_tool.siglists_version
+        assert 'prefix_signature_re' in reloader.status()['last_error']
+
+    def test_check(self, siglists_dir):
+        reloader = get_reloader(siglists_dir)
+        registry = reloader.registry
+        tool = registry.get('c')
+
+        reloader.check()
+        assert registry.get('c') is tool
+
+        add_line(siglists_dir, 'irrelevant_signature_re', 'ignored')
+        reloader.check()
+        version = registry.siglists_version
+        assert version != tool.siglists_version
+        assert registry.get('c').generate(['ignored', 'foo'])[0] == 'foo'
+
+        # A bad change is not applied, and not tried again.
+        add_line(siglists_dir, 'irrelevant_signature_re', 'bad(regex')
+        reloader.check()
+        assert registry.siglists_version == version
+        assert reloader.last_error is not None
+
+        reloader.last_error = None
+        reloader.check()
+        assert reloader.last_error is None
+
+    def test_poll(self, siglists_dir):
+        reloader = get_reloader(siglists_dir, interval=3600)
+        version = reloader.registry.siglists_version
+        add_line(siglists_dir, 'irrelevant_signature_re', 'ignored')
+
+        # Not checked, as the interval has not elapsed.
+        assert reloader.poll() is None
+        assert reloader.registry.siglists_version == version
+
+        reloader._last_check -= 3600
+        thread = reloader.poll()
+        thread.join()
+        assert reloader.registry.siglists_version != version
+
+    def test_reload_unchanged(self, siglists_dir):
+        reloader = get_reloader(siglists_dir)
+        tool = reloader.registry.get('c')
+
+        assert reloader.reload() == tool.siglists_version
+        assert reloader.registry.get('c') is tool
+        assert reloader.last_reload is None
+
+    def test_reload_notify(self, siglists_dir):
+        path = str(siglists_dir.join('irrelevant_signature_re.txt'))
+        mtime = int(os.stat(path).st_mtime) - 100
+        for changed in (str(siglists_dir), path):
+            os.utime(changed, (mtime, mtime))
+        # Another process, which does not see that the file changes.
+        other = get_reloader(siglists_dir)
+        reloader = get_reloader(siglists_dir)
+        add_line(siglists_dir, 'irrelevant_signature_re', 'ignored')
+        os.utime(path, (mtime, mtime))
+
+        other.check()
+        version = other.registry.siglists_version
+
+        assert reloader.reload(notify=True) != version
+        other.check()
+        assert other.registry.siglists_version == reloader.reload()
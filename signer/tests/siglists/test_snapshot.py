@@ -0,0 +1,90 @@
+import json
+
+from signer import siglists
+from signer.languages.c import CSignatureTool
+from signer.siglists import load_siglists, load_snapshot
+from signer.siglists.snapshot import build_snapshot, write_snapshot
+from signer.tests.siglists.test_reloader import add_line
+
+
+def edit_snapshot(siglists_dir, edit):
+    path = siglists_dir.join(siglists.SNAPSHOT_FILENAME)
+    snapshot = json.loads(path.read())
+    edit(snapshot)
+    path.write(json.dumps(snapshot))
+
+
+class TestSnapshot(object):
+    def test_load_snapshot(self, siglists_dir):
+        assert load_snapshot(str(siglists_dir)) is None
+
+        write_snapshot(str(siglists_dir))
+        lists, matchers = load_snapshot(str(siglists_dir))
+
+        assert lists['prefix_signature_re'] == siglists.read_siglist(
+            'prefix_signature_re'
+        )
+        assert sorted(matchers) == sorted(siglists.MATCHED_SIGLISTS)
+
+    def test_load_siglists(self, siglists_dir):
+        from_files = load_siglists(str(siglists_dir))
+        write_snapshot(str(siglists_dir))
+        from_snapshot = load_siglists(str(siglists_dir))
+
+        assert from_files.MATCHERS == {}
+        assert from_snapshot.MATCHERS
+        for name in siglists.SIGLIST_NAMES:
+            attr = name.upper()
+            assert getattr(from_snapshot, attr) == getattr(from_files, attr)
+
+        frames = ['Abort', 'malloc', 'foo', 'bar@0x1234']
+        assert CSignatureTool(from_snapshot).generate(frames) == (
+            CSignatureTool(from_files).generate(frames)
+        )
+
+    def test_stale(self, siglists_dir):
+        write_snapshot(str(siglists_dir))
+        add_line(siglists_dir, 'prefix_signature_re', 'my_prefix')
+
+        assert load_snapshot(str(siglists_dir)) is None
+        siglist_set = load_siglists(str(siglists_dir))
+        assert 'my_prefix' in siglist_set.PREFIX_SIGNATURE_RE
+        assert siglist_set.MATCHERS == {}
+
+    def test_corrupted(self, siglists_dir):
+        write_snapshot(str(siglists_dir))
+
+        def edit(snapshot):
+            snapshot['content']['siglists']['prefix_signature_re'] = []
+
+        edit_snapshot(siglists_dir, edit)
+        assert load_snapshot(str(siglists_dir)) is None
+
+    def test_version(self, siglists_dir):
+        write_snapshot(str(siglists_dir))
+        edit_snapshot(
+            siglists_dir,
+            lambda snapshot: snapshot.update(version=0)
+        )
+        assert load_snapshot(str(siglists_dir)) is None
+
+    def test_not_valid(self, siglists_dir):
+        path = siglists_dir.join(siglists.SNAPSHOT_FILENAME)
+        path.write('{')
+        assert load_snapshot(str(siglists_dir)) is None
+        path.write('[]')
+        assert load_snapshot(str(siglists_dir)) is None
+
+    def test_package_snapshot(self):
+        # Run `make snapshot` after changing the siglists.
+        assert load_snapshot() is not None
+
+        built = build_snapshot()['content']
+        with open(siglists.get_snapshot_path()) as snapshot_file:
+            shipped = json.load(snapshot_file)['content']
+        assert built['siglists'] == shipped['siglists']
+        for content in (built, shipped):
+            for data in content['matchers'].values():
+                # `re.escape` escapes more characters on Python 2.
+                del data['regex']
+        assert built['matchers'] == shipped['matchers']
@@ -0,0 +1,203 @@
+import json
+
+import falcon
+from falcon import testing
+
+from signer import middleware, siglists
+from signer.admin import (
+    AdmissionAdmin,
+    CachesAdmin,
+    ProfilesAdmin,
+    ShadowAdmin,
+    SiglistsAdmin,
+    TopSignaturesAdmin,
+)
+from signer.admission import ConcurrencyLimiter
+from signer.cache import LRUCache
+from signer.frame_dictionary import FrameDictionaryStore
+from signer.heavy_hitters import HeavyHitters
+from signer.languages.registry import SignatureToolRegistry
+from signer.shadow import ShadowEvaluator
+from signer.siglists import load_siglists
+from signer.siglists.reloader import SiglistsReloader
+from signer.tests.languages.test_registry import get_profiles
+from signer.tests.siglists.test_reloader import add_line
+
+
+def simulate_request(resource, method, path='/admin/siglists',
+                     query_string=''):
+    app = falcon.API(middleware=[
+        middleware.RequireJSON(),
+        middleware.JSONTranslator(),
+    ])
+    app.add_route(path, resource)
+
+    environ = testing.create_environ(
+        path=path,
+        query_string=query_string,
+        method=method,
+        headers={'Content-Type': 'application/json'},
+    )
+    srmock = testing.StartResponseMock()
+    content = b''.join(app(environ, srmock))
+    return srmock, json.loads(content.decode('utf-8'))
+
+
+class TestSiglistsAdmin(object):
+    def test_without_reloader(self):
+        resource = SiglistsAdmin(SignatureToolRegistry())
+
+        srmock, content = simulate_request(resource, 'GET')
+        assert srmock.status == '200 OK'
+        assert content == {
+            'directory': None,
+            'version': siglists.get_package_siglists().version,
+        }
+
+        srmock, content = simulate_request(resource, 'POST')
+        assert srmock.status == '400 Bad Request'
+        assert content['title'] == 'Reloading disabled'
+
+    def test_reload(self, siglists_dir):
+        registry = SignatureToolRegistry(languages=('c',))
+        registry.set_siglists(load_siglists(str(siglists_dir)))
+        reloader = SiglistsReloader(registry, str(siglists_dir), 0)
+        resource = SiglistsAdmin(registry, reloader)
+
+        add_line(siglists_dir, 'prefix_signature_re', 'my_prefix')
+        srmock, content = simulate_request(resource, 'POST')
+        assert srmock.status == '200 OK'
+        version = content['version']
+        assert version == load_siglists(str(siglists_dir)).version
+        assert content['last_error'] is None
+
+        add_line(siglists_dir, 'prefix_signature_re', 'bad(regex')
+        srmock, content = simulate_request(resource, 'POST')
+        assert srmock.status == '400 Bad Request'
+        assert content['title'] == 'Invalid siglists'
+
+        srmock, content = simulate_request(resource, 'GET')
+        assert content['version'] == version
+        assert 'prefix_signature_re' in content['last_error']
+
+
+class TestAdmissionAdmin(object):
+    def test_admission(self):
+        limiter = ConcurrencyLimiter(1, 0, 0)
+        limiter.acquire()
+        limiter.acquire()
+        resource = AdmissionAdmin(limiter)
+
+        srmock, content = simulate_request(
+            resource, 'GET', '/admin/admission'
+        )
+        assert srmock.status == '200 OK'
+        assert content['active'] == 1
+        assert content['admitted'] == 1
+        assert content['rejected'] == 1
+
+
+class TestCachesAdmin(object):
+    def test_caches(self):
+        registry = SignatureToolRegistry()
+        results = LRUCache(10)
+        results.get('foo')
+        registry.get('c').classify('foo')
+        resource = CachesAdmin(registry, results)
+
+        srmock, content = simulate_request(resource, 'GET', '/admin/caches')
+        assert srmock.status == '200 OK'
+        assert content['results']['misses'] == 1
+        assert list(content['frame_classifications']) == ['c']
+        assert content['frame_classifications']['c']['size'] == 1
+        assert 'frame_dictionaries' not in content
+
+    def test_caches_with_dictionaries(self):
+        dictionaries = FrameDictionaryStore(10)
+        dictionaries.add(['foo'])
+        resource = CachesAdmin(SignatureToolRegistry(), LRUCache(10),
+                               dictionaries)
+
+        srmock, content = simulate_request(resource, 'GET', '/admin/caches')
+        assert content['frame_dictionaries']['size'] == 1
+
+
+class TestShadowAdmin(object):
+    def test_disabled(self):
+        resource = ShadowAdmin(ShadowEvaluator(1, 10, 10))
+
+        srmock, content = simulate_request(resource, 'GET', '/admin/shadow')
+        assert srmock.status == '200 OK'
+        assert content['enabled'] is False
+
+        srmock, content = simulate_request(resource, 'POST', '/admin/shadow')
+        assert srmock.status == '400 Bad Request'
+        assert content['title'] == 'Shadow evaluation disabled'
+
+    def test_load(self, siglists_dir):
+        shadow = ShadowEvaluator(1, 10, 10)
+        resource = ShadowAdmin(shadow, str(siglists_dir))
+
+        srmock, content = simulate_request(resource, 'POST', '/admin/shadow')
+        assert srmock.status == '200 OK'
+        assert content['enabled'] is True
+        assert content['directory'] == str(siglists_dir)
+
+        shadow.submit(['foo'], None, 'bar')
+        shadow.wait()
+        srmock, content = simulate_request(resource, 'GET', '/admin/shadow')
+        assert content['diverged'] == 1
+
+        add_line(siglists_dir, 'prefix_signature_re', 'bad(regex')
+        srmock, content = simulate_request(resource, 'POST', '/admin/shadow')
+        assert srmock.status == '400 Bad Request'
+        assert content['title'] == 'Invalid siglists'
+
+
+class TestTopSignaturesAdmin(object):
+    def test_top_signatures(self):
+        heavy_hitters = HeavyHitters(True, (60,), 60, 64, 4, 20, 100)
+        for index in range(15):
+            heavy_hitters.add('c', 'sig{}'.format(index), 0)
+        heavy_hitters.add('java', 'foo', 0)
+        heavy_hitters._time = lambda: 0
+        resource = TopSignaturesAdmin(heavy_hitters)
+
+        srmock, content = simulate_request(
+            resource, 'GET', '/admin/top_signatures'
+        )
+        assert srmock.status == '200 OK'
+        assert content['counted'] == 16
+        assert len(content['languages']['c']['60']['signatures']) == 10
+
+        srmock, content = simulate_request(
+            resource, 'GET', '/admin/top_signatures', 'top=2&lang=java'
+        )
+        assert content['languages'] == {
+            'java': {
+                '60': {
+                    'total': 1,
+                    'signatures': [{'signature': 'foo', 'count': 1}],
+                },
+            },
+        }
+
+
+class TestProfilesAdmin(object):
+    def test_profiles(self):
+        registry = SignatureToolRegistry(profiles=get_profiles())
+        registry.get('c', 'a')
+        resource = ProfilesAdmin(registry)
+
+        srmock, content = simulate_request(resource, 'GET', '/admin/profiles')
+        assert srmock.status == '200 OK'
+        assert content['profiles'] == ['a', 'b']
+        assert content['uses'] == {'a': 1}
+        assert content['tools']['size'] == 1
+
+    def test_no_profiles(self):
+        resource = ProfilesAdmin(SignatureToolRegistry())
+
+        srmock, content = simulate_request(resource, 'GET', '/admin/profiles')
+        assert content['profiles'] == []
+        assert content['directory'] is None
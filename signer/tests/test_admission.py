@@ -0,0 +1,151 @@
+import json
+import threading
+import time
+
+import falcon
+import mock
+from falcon import testing
+
+from signer import middleware
+from signer.admission import ConcurrencyLimiter, get_deadline
+
+
+def test_get_deadline():
+    assert get_deadline(0) is None
+    assert get_deadline(None) is None
+    assert time.time() < get_deadline(10) <= time.time() + 10
+
+
+class TestConcurrencyLimiter(object):
+    def test_acquire(self):
+        limiter = ConcurrencyLimiter(2, 0, 0)
+        assert limiter.acquire()
+        assert limiter.acquire()
+        assert not limiter.acquire()
+
+        limiter.release()
+        assert limiter.acquire()
+        assert limiter.stats() == {
+            'max_concurrent': 2,
+            'max_waiting': 0,
+            'active': 2,
+            'waiting': 0,
+            'admitted': 3,
+            'rejected': 1,
+            'timed_out': 0,
+        }
+
+    def test_no_limit(self):
+        limiter = ConcurrencyLimiter(0, 0, 0)
+        assert all(limiter.acquire() for _ in range(100))
+        assert limiter.stats()['active'] == 100
+
+    def test_wait_timeout(self):
+        limiter = ConcurrencyLimiter(1, 1, 0.01)
+        assert limiter.acquire()
+        assert not limiter.acquire()
+        assert limiter.stats()['timed_out'] == 1
+        assert limiter.stats()['waiting'] == 0
+
+    def test_wait(self):
+        limiter = ConcurrencyLimiter(1, 1, 10)
+        assert limiter.acquire()
+
+        results = []
+        thread = threading.Thread(
+            target=lambda: results.append(limiter.acquire())
+        )
+        thread.start()
+        while not limiter.stats()['waiting']:
+            time.sleep(0.001)
+
+        # The queue is full.
+        assert not limiter.acquire()
+
+        limiter.release()
+        thread.join()
+        assert results == [True]
+        assert limiter.stats()['active'] == 1
+        assert limiter.stats()['rejected'] == 1
+
+
+class LimitedResource(object):
+    limited = True
+
+    def __init__(self):
+        self.deadlines = []
+
+    def on_get(self, req, resp):
+        self.deadlines.append(req.context['deadline'])
+        resp.body = json.dumps({})
+
+    def on_post(self, req, resp):
+        resp.stream = iter([b'a', b'b'])
+
+
+class UnlimitedResource(object):
+    def on_get(self, req, resp):
+        resp.body = json.dumps({})
+
+
+class TestAdmissionControl(object):
+    @staticmethod
+    def get_app(limiter, resource=None):
+        app = falcon.API(middleware=[
+            middleware.AdmissionControl(limiter, 5, 10),
+        ])
+        app.add_route('/limited', resource or LimitedResource())
+        app.add_route('/unlimited', UnlimitedResource())
+        return app
+
+    @staticmethod
+    def simulate_request(app, path, method='GET'):
+        srmock = testing.StartResponseMock()
+        result = app(
+            testing.create_environ(path=path, method=method),
+            srmock,
+        )
+        return srmock, result
+
+    def test_reject(self):
+        limiter = ConcurrencyLimiter(1, 0, 0)
+        app = self.get_app(limiter)
+        limiter.acquire()
+
+        srmock, content = self.simulate_request(app, '/limited')
+        assert srmock.status == '503 Service Unavailable'
+        assert ('retry-after', '5') in srmock.headers
+        assert json.loads(b''.join(content).decode('utf-8'))['title'] == (
+            'Too many requests'
+        )
+
+        srmock, _ = self.simulate_request(app, '/unlimited')
+        assert srmock.status == '200 OK'
+
+    def test_release(self):
+        limiter = ConcurrencyLimiter(1, 0, 0)
+        resource = LimitedResource()
+        app = self.get_app(limiter, resource)
+
+        with mock.patch('signer.admission.time.time', return_value=100):
+            for _ in range(3):
+                srmock, _ = self.simulate_request(app, '/limited')
+                assert srmock.status == '200 OK'
+        assert resource.deadlines == [110] * 3
+        assert limiter.stats()['admitted'] == 3
+        assert limiter.stats()['active'] == 0
+
+    def test_release_stream(self):
+        limiter = ConcurrencyLimiter(1, 0, 0)
+        app = self.get_app(limiter)
+
+        srmock, stream = self.simulate_request(app, '/limited', 'POST')
+        assert srmock.status == '200 OK'
+        # Streamed responses keep their place until sent.
+        assert limiter.stats()['active'] == 1
+        assert b''.join(stream) == b'ab'
+        assert limiter.stats()['active'] == 0
+
+        # Or until closed by the server.
+        self.simulate_request(app, '/limited', 'POST')[1].close()
+        assert limiter.stats()['active'] == 0
@@ -0,0 +1,325 @@
+import asyncio
+import json
+import threading
+
+import mock
+import pytest
+
+from signer import siglists
+from signer.asgi import ASGIAdapter
+from signer.wsgi import app as wsgi_app
+
+
+def get_adapter(max_workers=2, max_pending=10, buffer_size=1024,
+                queue_size=4, stream_workers=2, app=wsgi_app):
+    return ASGIAdapter(
+        app, max_workers, max_pending, buffer_size, queue_size, stream_workers
+    )
+
+
+async def call(
+    adapter,
+    path='/sign',
+    body=None,
+    query_string='',
+    method='POST',
+    headers=None,
+    chunk_size=None,
+    delay=0,
+    send=None,
+):
+    """Send a request to `adapter`, its body in chunks of `chunk_size`
+    bytes sent every `delay` seconds. Return the response status, headers
+    and body. `send` is called with each message sent, if given. """
+    if body is None:
+        body = b''
+    elif not isinstance(body, bytes):
+        body = json.dumps(body).encode('utf-8')
+
+    if headers is None:
+        headers = {'Content-Type': 'application/json'}
+
+    chunk_size = chunk_size or len(body) or 1
+    chunks = [
+        body[i:i + chunk_size] for i in range(0, len(body), chunk_size)
+    ] or [b'']
+
+    async def receive():
+        if delay:
+            await asyncio.sleep(delay)
+        chunk = chunks.pop(0)
+        return {
+            'type': 'http.request',
+            'body': chunk,
+            'more_body': bool(chunks),
+        }
+
+    response = {'body': b''}
+
+    async def send_message(message):
+        if send is not None:
+            send(message)
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+            response['headers'] = dict(
+                (name.decode('latin-1'), value.decode('latin-1'))
+                for name, value in message['headers']
+            )
+        else:
+            response['body'] += message.get('body', b'')
+
+    scope = {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': query_string.encode('latin-1'),
+        'headers': [
+            (name.lower().encode('latin-1'), value.encode('latin-1'))
+            for name, value in headers.items()
+        ],
+    }
+    await adapter(scope, receive, send_message)
+    return response['status'], response['headers'], response['body']
+
+
+def run(coroutine):
+    """Run `coroutine` in a new event loop. """
+    loop = asyncio.new_event_loop()
+    try:
+        asyncio.set_event_loop(loop)
+        return loop.run_until_complete(coroutine)
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def wsgi_result(chunks, close):
+    """Return a WSGI application responding with `chunks`, whose response
+    calls `close` when closed. """
+    class Result(object):
+        def __iter__(self):
+            return iter(chunks)
+
+    result = Result()
+    result.close = close
+
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return result
+    return app
+
+
+class TestASGIAdapter(object):
+    def test_sign(self):
+        status, headers, body = run(call(
+            get_adapter(),
+            body={'frames': ['NtWaitForMultipleObjects', 'foo', 'bar']},
+            query_string='lang=c',
+        ))
+
+        assert status == 200
+        assert headers['content-type'].startswith('application/json')
+        assert 'etag' in headers
+        assert json.loads(body.decode('utf-8')) == {
+            'signature': 'foo',
+            'notes': [],
+            'language': 'c',
+            'siglists_version': siglists.get_package_siglists().version,
+        }
+
+    def test_same_errors(self):
+        adapter = get_adapter()
+
+        async def requests():
+            return [
+                await call(adapter, body={'frames': ['foo']}, headers={
+                    'Content-Type': 'application/yaml',
+                }),
+                await call(adapter, body=b'{"frames": ['),
+                await call(adapter, body={'frames': []}),
+            ]
+
+        responses = run(requests())
+        assert [x[0] for x in responses] == [415, 753, 400]
+        assert json.loads(responses[1][2].decode('utf-8'))['title'] == (
+            'Malformed JSON'
+        )
+
+    @mock.patch('signer.middleware.settings.MAX_BODY_SIZE', 100)
+    def test_body_too_large(self):
+        adapter = get_adapter(buffer_size=20)
+        body = {'frames': ['a' * 100]}
+
+        status, _, _ = run(call(adapter, body=body, headers={
+            'Content-Type': 'application/json',
+            'Content-Length': '200',
+        }))
+        assert status == 413
+
+        # Found by the application while the body is fed to it.
+        status, _, body = run(call(adapter, body=body, chunk_size=10))
+        assert status == 413
+        assert json.loads(body.decode('utf-8'))['title'] == (
+            'Request body too large'
+        )
+
+    def test_streamed_body(self):
+        called = threading.Event()
+
+        def app(environ, start_response):
+            called.set()
+            return wsgi_app(environ, start_response)
+
+        adapter = get_adapter(buffer_size=20, queue_size=2, app=app)
+        items = [{'frames': ['foo{}'.format(x)]} for x in range(20)]
+        body = '\n'.join(json.dumps(x) for x in items).encode('utf-8')
+        chunks = [body[i:i + 10] for i in range(0, len(body), 10)]
+
+        async def receive():
+            chunk = chunks.pop(0)
+            if not chunks:
+                # The application is called before the body is received.
+                loop = asyncio.get_event_loop()
+                assert await loop.run_in_executor(None, called.wait, 10)
+            return {
+                'type': 'http.request',
+                'body': chunk,
+                'more_body': bool(chunks),
+            }
+
+        response = []
+
+        async def send(message):
+            response.append(message)
+
+        scope = {
+            'type': 'http',
+            'method': 'POST',
+            'path': '/sign/batch',
+            'headers': [(b'content-type', b'application/x-ndjson')],
+        }
+        run(adapter(scope, receive, send))
+
+        assert response[0]['status'] == 200
+        lines = b''.join(x.get('body', b'') for x in response[1:])
+        assert [
+            json.loads(x)['signature']
+            for x in lines.decode('utf-8').splitlines()
+        ] == ['foo{}'.format(x) for x in range(20)]
+
+    def test_close(self):
+        close = mock.Mock()
+        adapter = get_adapter(app=wsgi_result([b'foo', b'bar'], close))
+
+        status, _, body = run(call(adapter, body={'frames': ['foo']}))
+        assert (status, body) == (200, b'foobar')
+        close.assert_called_once_with()
+
+        # Also when the response cannot be sent.
+        close.reset_mock()
+
+        def send(message):
+            if message.get('more_body'):
+                raise IOError('Client disconnected')
+
+        with pytest.raises(IOError):
+            run(call(adapter, body={'frames': ['foo']}, send=send))
+        close.assert_called_once_with()
+
+    def test_close_releases_admission(self):
+        adapter = get_adapter()
+        items = [{'frames': ['foo']}, {'frames': ['bar']}]
+
+        def send(message):
+            if message.get('more_body'):
+                raise IOError('Client disconnected')
+
+        with pytest.raises(IOError):
+            run(call(adapter, '/sign/batch', {'items': items}, send=send))
+
+        status, _, body = run(call(adapter, '/admin/admission', method='GET'))
+        assert json.loads(body.decode('utf-8'))['active'] == 0
+
+    def test_sign_batch(self):
+        status, headers, body = run(call(
+            get_adapter(),
+            '/sign/batch',
+            body={'items': [{'frames': ['foo']}, {'frames': ['bar']}]},
+            chunk_size=7,
+        ))
+
+        assert status == 200
+        assert headers['content-type'] == 'application/x-ndjson'
+        lines = [json.loads(x) for x in body.decode('utf-8').splitlines()]
+        assert [x['signature'] for x in lines] == ['foo', 'bar']
+
+    def test_disconnected(self):
+        adapter = get_adapter()
+        send = mock.Mock()
+
+        async def receive():
+            return {'type': 'http.disconnect'}
+
+        scope = {'type': 'http', 'method': 'POST', 'path': '/sign'}
+        run(adapter(scope, receive, send))
+        assert not send.called
+
+    def test_slow_uploads_do_not_starve_requests(self):
+        # With synchronous workers, each of these uploads would hold one of
+        # the 2 workers for more than a second.
+        adapter = get_adapter(
+            max_workers=2, buffer_size=512, stream_workers=2
+        )
+        frames = ['foo{}'.format(x) for x in range(300)]
+        body = json.dumps({'frames': frames}).encode('utf-8')
+        batch = json.dumps({'items': [{'frames': frames}]}).encode('utf-8')
+        # Bigger than the buffer of streamed bodies.
+        assert min(len(body), len(batch)) > 4 * 512
+
+        async def requests():
+            slow = [
+                asyncio.ensure_future(call(
+                    adapter, path, content, chunk_size=100, delay=0.05
+                ))
+                for path, content in [('/sign', body)] * 4 +
+                [('/sign/batch', batch)] * 4
+            ]
+            await asyncio.sleep(0.5)
+
+            loop = asyncio.get_event_loop()
+            start = loop.time()
+            fast = await asyncio.gather(*[
+                call(adapter, body={'frames': ['foo']}) for _ in range(10)
+            ])
+            elapsed = loop.time() - start
+            slow_done = any(x.done() for x in slow)
+            return fast, await asyncio.gather(*slow), elapsed, slow_done
+
+        fast, slow, elapsed, slow_done = run(requests())
+        # Fast requests were served while slow uploads went on.
+        assert elapsed < 0.5
+        assert not slow_done
+        assert [x[0] for x in fast] == [200] * 10
+        assert [x[0] for x in slow] == [200] * 8
+
+    @mock.patch('signer.asgi.settings.MAX_BODY_SIZE', 100)
+    def test_body_buffered_up_to_max_size(self):
+        received = []
+
+        def app(environ, start_response):
+            received.append(environ['wsgi.input'].getvalue())
+            return wsgi_app(environ, start_response)
+
+        adapter = get_adapter(buffer_size=20, app=app)
+        body = json.dumps({'frames': ['foo', 'bar']}).encode('utf-8')
+        status, _, _ = run(call(adapter, body=body, chunk_size=5))
+        assert status == 200
+        # The whole body was received before calling the application.
+        assert received == [body]
+
+        received[:] = []
+        status, _, _ = run(call(
+            adapter, body={'frames': ['a' * 200]}, chunk_size=10,
+        ))
+        assert status == 413
+        assert len(received[0]) <= 110
@@ -0,0 +1,68 @@
+import threading
+
+import mock
+
+from signer.background_queue import BackgroundQueue
+
+
+def get_queue(size=10, flush_lock=None):
+    processed = []
+    queue = BackgroundQueue(processed.append, size, 'test', flush_lock)
+    return queue, processed
+
+
+class TestBackgroundQueue(object):
+    def test_flush(self):
+        queue, processed = get_queue()
+        with mock.patch('signer.background_queue.threading.Thread'):
+            assert queue.put('foo')
+            assert queue.put('bar')
+        assert len(queue) == 2
+
+        queue.flush()
+        assert processed == ['foo', 'bar']
+        assert len(queue) == 0
+        assert (queue.submitted, queue.dropped) == (2, 0)
+
+    def test_dropped(self):
+        queue, _ = get_queue(size=2)
+        with mock.patch('signer.background_queue.threading.Thread'):
+            assert [queue.put(x) for x in range(3)] == [True, True, False]
+        assert len(queue) == 2
+        assert (queue.submitted, queue.dropped) == (3, 1)
+
+        queue.reset()
+        assert (queue.submitted, queue.dropped) == (0, 0)
+
+    def test_dropped_concurrently(self):
+        queue, _ = get_queue(size=50)
+
+        def put():
+            for x in range(100):
+                queue.put(x)
+
+        # The background thread is not started.
+        queue._thread = True
+        threads = [threading.Thread(target=put) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # The queue never gets bigger than its size, and each item that is
+        # not queued is counted as dropped.
+        assert len(queue) == 50
+        assert (queue.submitted, queue.dropped) == (800, 750)
+
+    def test_background_thread(self):
+        lock = threading.Lock()
+        queue, processed = get_queue(flush_lock=lock)
+        with lock:
+            queue.put('foo')
+            queue._thread.join(0.01)
+            assert queue._thread.is_alive()
+            # The thread waits for the lock to process items.
+            assert processed == []
+
+        queue.flush()
+        assert processed == ['foo']
@@ -0,0 +1,107 @@
+import threading
+
+import mock
+
+from signer.cache import LRUCache
+
+
+class TestLRUCache(object):
+    def test_get_set(self):
+        cache = LRUCache(10)
+
+        assert cache.get('foo') is None
+        assert cache.get('foo', 'default') == 'default'
+
+        cache.set('foo', 1)
+        assert cache.get('foo') == 1
+        assert len(cache) == 1
+
+        cache.set('foo', 2)
+        assert cache.get('foo') == 2
+        assert len(cache) == 1
+
+    def test_eviction(self):
+        cache = LRUCache(2)
+
+        cache.set('a', 1)
+        cache.set('b', 2)
+        # Use 'a', so that 'b' is the least recently used key.
+        assert cache.get('a') == 1
+        cache.set('c', 3)
+
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+        assert len(cache) == 2
+
+    def test_stats(self):
+        cache = LRUCache(1)
+
+        cache.get('a')
+        cache.set('a', 1)
+        cache.get('a')
+        cache.set('b', 2)
+
+        assert cache.stats() == {
+            'size': 1,
+            'maxsize': 1,
+            'hits': 1,
+            'misses': 1,
+            'evictions': 1,
+            'expirations': 0,
+        }
+
+    @mock.patch('signer.cache.time')
+    def test_ttl(self, m_time):
+        m_time.time.return_value = 1000
+        cache = LRUCache(10, ttl=60)
+        cache.set('a', 1)
+
+        m_time.time.return_value = 1059
+        assert cache.get('a') == 1
+        cache.set('b', 2)
+
+        m_time.time.return_value = 1060
+        assert cache.get('a') is None
+        assert cache.get('b') == 2
+        assert len(cache) == 1
+
+        stats = cache.stats()
+        assert stats['expirations'] == 1
+        assert stats['hits'] == 2
+        assert stats['misses'] == 1
+
+    def test_clear(self):
+        cache = LRUCache(10)
+        cache.set('a', 1)
+        cache.clear()
+
+        assert len(cache) == 0
+        assert cache.get('a') is None
+
+    def test_disabled(self):
+        cache = LRUCache(0)
+        cache.set('a', 1)
+
+        assert cache.get('a') is None
+
+    def test_threaded(self):
+        cache = LRUCache(50)
+
+        def use_cache(offset):
+            for i in range(1000):
+                key = (i + offset) % 100
+                if cache.get(key) is None:
+                    cache.set(key, key)
+
+        threads = [
+            threading.Thread(target=use_cache, args=(x,)) for x in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = cache.stats()
+        assert stats['size'] == 50
+        assert stats['hits'] + stats['misses'] == 8000
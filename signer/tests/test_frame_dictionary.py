@@ -0,0 +1,84 @@
+import gc
+
+import mock
+
+from signer.frame_dictionary import (
+    FrameDictionary,
+    FrameDictionaryStore,
+    get_dictionary_id,
+)
+
+
+class Tool(object):
+    pass
+
+
+class TestFrameDictionary(object):
+    def test_id(self):
+        dictionary = FrameDictionary(['foo', {'function': 'bar', 'line': 1}])
+        assert dictionary.id == get_dictionary_id(
+            ['foo', {'line': 1, 'function': 'bar'}]
+        )
+        assert dictionary.id != FrameDictionary(['foo']).id
+        assert len(dictionary) == 2
+
+    def test_decode(self):
+        dictionary = FrameDictionary(['foo', 'bar'])
+        assert dictionary.decode([1, 'baz', 0, 1]) == [
+            'bar', 'baz', 'foo', 'bar'
+        ]
+
+    def test_is_valid_id(self):
+        dictionary = FrameDictionary(['foo', 'bar'])
+        assert dictionary.is_valid_id(0)
+        assert dictionary.is_valid_id(1)
+        for frame_id in (2, -1, True, '0', 0.0, None):
+            assert not dictionary.is_valid_id(frame_id)
+
+    def test_decode_frame_objects(self):
+        frame = {'function': 'bar', 'line': 1}
+        dictionary = FrameDictionary(['foo'])
+        assert dictionary.decode([0, frame]) == ['foo', frame]
+
+    def test_get_tool_cache(self):
+        dictionary = FrameDictionary(['foo', 'bar'])
+        tool, other_tool = Tool(), Tool()
+        build = mock.Mock(side_effect=lambda x: [None] * len(x))
+
+        cache = dictionary.get_tool_cache(tool, build)
+        assert cache == [None, None]
+        assert dictionary.get_tool_cache(tool, build) is cache
+        build.assert_called_once_with(dictionary)
+        assert dictionary.get_tool_cache(other_tool, build) is not cache
+
+        # Caches go away with their tool.
+        del tool
+        gc.collect()
+        assert len(dictionary._tool_caches) == 1
+
+
+class TestFrameDictionaryStore(object):
+    def test_add(self):
+        store = FrameDictionaryStore(10)
+
+        dictionary, created = store.add(['foo', 'bar'])
+        assert created
+        assert store.get(dictionary.id) is dictionary
+        assert store.get('unknown') is None
+
+        # Uploading a dictionary again keeps the existing one.
+        assert store.add(['foo', 'bar']) == (dictionary, False)
+        assert len(store) == 1
+
+    def test_eviction(self):
+        store = FrameDictionaryStore(2)
+
+        first, _ = store.add(['a'])
+        second, _ = store.add(['b'])
+        store.get(first.id)
+        third, _ = store.add(['c'])
+
+        assert store.get(second.id) is None
+        assert store.get(first.id) is first
+        assert store.get(third.id) is third
+        assert store.stats()['evictions'] == 1
@@ -0,0 +1,88 @@
+import json
+
+import mock
+import pytest
+
+from signer import settings
+from signer.frame_index import (
+    FrameIndex,
+    IndexVersionError,
+    build_index,
+    get_frame_names,
+    main,
+)
+
+
+RECORDS = [
+    {'id': 'a', 'frames': ['foo', 'Foo<int>::bar(int,int)']},
+    {'id': 'b', 'frames': ['pre', 'foo'], 'crashed_thread': 0},
+    {'id': 'c', 'frames': ['foo'], 'lang': 'java'},
+    {'id': 'd', 'frames': [1]},
+    {'id': 'e', 'frames': [{'function': 'baz', 'line': 12}]},
+]
+
+
+def get_lines(records):
+    return [(json.dumps(x) + '\n').encode('utf-8') for x in records]
+
+
+def test_get_frame_names():
+    assert get_frame_names('foo') == ('foo',)
+    assert get_frame_names('Foo<int>::bar(int,int)') == (
+        'Foo<int>::bar(int,int)',
+    )
+    with mock.patch('signer.frame_index.settings.FIX_SPACES', True):
+        assert get_frame_names('Foo<int>::bar(int,int)') == (
+            'Foo<int>::bar(int,int)', 'Foo<int>::bar(int, int)'
+        )
+    assert get_frame_names({'function': 'foo', 'line': 12}) == (
+        'foo', 'foo:12'
+    )
+    assert get_frame_names('foo32.dll@0x1121') == (
+        'foo32.dll@0x1121', 'foo32.dll'
+    )
+
+
+class TestFrameIndex(object):
+    def test_build_index(self, tmpdir):
+        path = str(tmpdir.join('frames.db'))
+        index = FrameIndex(path)
+        assert build_index(index, get_lines(RECORDS) + [b'\n']) == 3
+        index.close()
+
+        # The index is persisted.
+        index = FrameIndex(path)
+        assert len(index) == 3
+        frame_ids = dict((name, x) for x, name in index.iter_frames())
+        assert sorted(frame_ids) == [
+            'Foo<int>::bar(int,int)', 'baz', 'baz:12', 'foo', 'pre'
+        ]
+
+        assert index.get_crash_ids([frame_ids['foo']]) == [0, 1]
+        assert index.get_crash_ids(
+            [frame_ids['pre'], frame_ids['baz:12']]
+        ) == [1, 4]
+        assert index.get_crash_ids([]) == []
+
+        assert list(index.get_crashes([4, 1])) == [
+            (1, 'b', ['pre', 'foo'], '0'),
+            (4, 'e', [{'function': 'baz', 'line': 12}], None),
+        ]
+
+    def test_settings_changed(self, tmpdir):
+        path = str(tmpdir.join('frames.db'))
+        FrameIndex(path).close()
+
+        for name in ('COLLAPSE_ARGUMENTS', 'FIX_SPACES'):
+            with mock.patch.object(settings, name, True):
+                with pytest.raises(IndexVersionError):
+                    FrameIndex(path)
+
+    def test_main(self, tmpdir, capsys):
+        input_path = tmpdir.join('crashes.jsonl')
+        input_path.write_binary(b''.join(get_lines(RECORDS)))
+        path = str(tmpdir.join('frames.db'))
+
+        assert main([str(input_path), '-o', path]) == 0
+        assert capsys.readouterr()[0] == 'Indexed 3 crashes\n'
+        assert len(FrameIndex(path)) == 3
@@ -0,0 +1,130 @@
+import collections
+import random
+
+from signer.heavy_hitters import (
+    CountMinSketch,
+    HeavyHitters,
+    SlidingTopKeys,
+    TopKeys,
+)
+
+
+def get_heavy_hitters(enabled=True, queue_size=10):
+    heavy_hitters = HeavyHitters(enabled, (60, 300), 60, 64, 4, 3, queue_size)
+    heavy_hitters._time = lambda: 1000
+    return heavy_hitters
+
+
+class TestCountMinSketch(object):
+    def test_estimate(self):
+        sketch = CountMinSketch(64, 4)
+        assert sketch.add('foo') == 1
+        assert sketch.add('foo', 2) == 3
+        assert sketch.estimate('foo') == 3
+        assert sketch.estimate('bar') == 0
+
+    def test_never_too_low(self):
+        rand = random.Random(0)
+        keys = [
+            'key{}'.format(int(rand.paretovariate(1))) for _ in range(5000)
+        ]
+        sketch = CountMinSketch(1024, 4)
+        for key in keys:
+            sketch.add(key)
+
+        for key, count in collections.Counter(keys).items():
+            assert count <= sketch.estimate(key) <= count + len(keys) // 10
+
+
+class TestTopKeys(object):
+    def test_update(self):
+        top = TopKeys(2)
+        top.update('a', 1)
+        top.update('b', 2)
+        top.update('c', 1)
+        assert top.counts == {'a': 1, 'b': 2}
+
+        top.update('a', 5)
+        top.update('c', 3)
+        # `b` has the lowest count.
+        assert top.counts == {'a': 5, 'c': 3}
+
+
+class TestSlidingTopKeys(object):
+    def test_windows(self):
+        counts = SlidingTopKeys(10, 3, 64, 4, 10)
+        for key, timestamp in (
+            ('old', 0), ('old', 1), ('old', 2),
+            ('a', 10), ('a', 11), ('b', 15),
+            ('b', 25), ('b', 26), ('c', 29),
+        ):
+            counts.add(key, timestamp)
+
+        assert counts.top(10, 29) == (3, [('b', 2), ('c', 1)])
+        assert counts.top(20, 29) == (6, [('b', 3), ('a', 2), ('c', 1)])
+        assert counts.top(20, 29, 1) == (6, [('b', 3)])
+        assert counts.top(30, 29)[1][0] == ('b', 3)
+        assert counts.top(30, 29)[0] == 9
+
+        # The oldest bucket is reused.
+        counts.add('d', 30)
+        assert counts.top(30, 30)[0] == 7
+        # Keys older than the buckets are not counted.
+        counts.add('old', 3)
+        assert counts.top(30, 30)[0] == 7
+
+
+class TestHeavyHitters(object):
+    def test_disabled(self):
+        heavy_hitters = get_heavy_hitters(enabled=False)
+        heavy_hitters.submit('c', 'foo')
+        heavy_hitters.flush()
+        assert heavy_hitters.status()['counted'] == 0
+        assert heavy_hitters._queue._thread is None
+
+    def test_status(self):
+        heavy_hitters = get_heavy_hitters()
+        for lang, signature in (
+            ('c', 'foo'), ('c', 'bar'), ('c', 'foo'), ('java', 'baz'),
+        ):
+            heavy_hitters.submit(lang, signature)
+        heavy_hitters.flush()
+
+        status = heavy_hitters.status()
+        assert status['counted'] == 4
+        assert status['queued'] == 0
+        assert status['windows'] == [60, 300]
+        assert status['languages']['c']['300'] == {
+            'total': 3,
+            'signatures': [
+                {'signature': 'foo', 'count': 2},
+                {'signature': 'bar', 'count': 1},
+            ],
+        }
+        assert status['languages']['java']['60']['total'] == 1
+
+        status = heavy_hitters.status(top=1, lang='c')
+        assert list(status['languages']) == ['c']
+        assert len(status['languages']['c']['60']['signatures']) == 1
+
+        heavy_hitters.reset()
+        assert heavy_hitters.status()['languages'] == {}
+
+    def test_dropped(self):
+        heavy_hitters = get_heavy_hitters(queue_size=2)
+        # The background thread is not started.
+        heavy_hitters._queue._thread = True
+        for _ in range(3):
+            heavy_hitters.submit('c', 'foo')
+
+        assert heavy_hitters.status()['queued'] == 2
+        assert heavy_hitters.status()['dropped'] == 1
+
+    def test_background_thread(self):
+        heavy_hitters = get_heavy_hitters()
+        heavy_hitters.submit('c', 'foo')
+        heavy_hitters._queue._thread.join(0.01)
+        assert heavy_hitters._queue._thread.is_alive()
+
+        heavy_hitters.flush()
+        assert heavy_hitters.status()['counted'] == 1
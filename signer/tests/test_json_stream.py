@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+
+import mock
+import pytest
+
+from signer import json_stream
+
+
+def make_stream(content):
+    if not isinstance(content, bytes):
+        content = content.encode('utf-8')
+    return io.BytesIO(content)
+
+
+class TestReadBody(object):
+    def test_read_body(self):
+        content = b'x' * 100
+        assert json_stream.read_body(make_stream(content), 100, 7) == content
+
+    def test_read_body_too_large(self):
+        with pytest.raises(json_stream.BodyTooLargeError):
+            json_stream.read_body(make_stream(b'x' * 101), 100, 7)
+
+
+class TestIterText(object):
+    def test_iter_text(self):
+        # The multibyte character is split between chunks.
+        chunks = json_stream.iter_text(make_stream(u'abcé\nf'), 4)
+        assert list(chunks) == [u'abc', u'é\nf']
+
+    def test_iter_text_invalid(self):
+        chunks = json_stream.iter_text(make_stream(b'ab\xff'), 10)
+        assert u''.join(chunks) == u'ab\ufffd'
+
+    def test_iter_text_lazy(self):
+        stream = make_stream(b'x' * 100)
+        chunks = json_stream.iter_text(stream, 10)
+        assert next(chunks) == u'x' * 10
+        assert stream.tell() == 10
+
+
+class TestIterNDJSON(object):
+    def test_iter_ndjson(self):
+        items = [{'frames': ['a', 'b']}, {'frames': [u'é']}, [1, 2], 3]
+        content = '\n'.join(json.dumps(x) for x in items) + '\n\n'
+
+        result = json_stream.iter_ndjson(make_stream(content), 100, 3)
+        assert list(result) == items
+
+    def test_iter_ndjson_no_trailing_newline(self):
+        result = json_stream.iter_ndjson(make_stream('1\n2'), 100, 3)
+        assert list(result) == [1, 2]
+
+    def test_iter_ndjson_item_too_large(self):
+        content = '1\n{}\n2\n'.format(json.dumps({'frames': ['a' * 100]}))
+
+        result = json_stream.iter_ndjson(make_stream(content), 50, 3)
+        assert next(result) == 1
+        with pytest.raises(json_stream.BodyTooLargeError):
+            next(result)
+
+    def test_iter_ndjson_malformed(self):
+        result = json_stream.iter_ndjson(make_stream('1\n{nope\n'), 50, 3)
+        assert next(result) == 1
+        with pytest.raises(ValueError):
+            next(result)
+
+
+class TestJSONItemsReader(object):
+    def get_items(self, content, max_item_size=1000, chunk_size=3):
+        reader = json_stream.JSONItemsReader(
+            make_stream(content),
+            'items',
+            max_item_size,
+            chunk_size,
+        )
+        reader.open()
+        return reader
+
+    def test_items(self):
+        items = [
+            {'frames': ['a', u'é', 'c'], 'crashed_thread': 1234},
+            12345,
+            'foo',
+            [True, None],
+            {},
+        ]
+        content = json.dumps({
+            'before': {'some': ['stuff', 123]},
+            'items': items,
+            'after': 3,
+        })
+        assert list(self.get_items(content)) == items
+
+        content = json.dumps(items, indent=4)
+        assert list(self.get_items(content)) == items
+
+    def test_items_empty(self):
+        assert list(self.get_items('{"items": []}')) == []
+        assert list(self.get_items(' [ ] ')) == []
+
+    def test_items_missing(self):
+        with pytest.raises(KeyError):
+            self.get_items('{"frames": ["foo"]}')
+
+        with pytest.raises(KeyError):
+            self.get_items('{}')
+
+    def test_items_malformed(self):
+        with pytest.raises(ValueError):
+            self.get_items('"items"')
+
+        with pytest.raises(ValueError):
+            self.get_items('{"items": 3}')
+
+        items = self.get_items('{"items": [1, {2}]}')
+        result = iter(items)
+        assert next(result) == 1
+        with pytest.raises(ValueError):
+            next(result)
+
+        items = self.get_items('[1, 2')
+        result = iter(items)
+        assert next(result) == 1
+        assert next(result) == 2
+        with pytest.raises(ValueError):
+            next(result)
+
+    def test_items_too_large(self):
+        content = json.dumps({'items': [1, {'frames': ['a' * 100]}, 2]})
+
+        result = iter(self.get_items(content, max_item_size=50))
+        assert next(result) == 1
+        with pytest.raises(json_stream.BodyTooLargeError):
+            next(result)
+
+    def test_items_memory_is_bounded(self):
+        # Only what is needed to decode the current item is buffered.
+        items = [{'frames': ['frame{}'.format(i)] * 20} for i in range(500)]
+        reader = self.get_items(json.dumps(items), chunk_size=64)
+
+        max_buffered = 0
+        for item, expected in zip(reader, items):
+            assert item == expected
+            max_buffered = max(max_buffered, len(reader._buffer))
+
+        largest = max(len(json.dumps(x)) for x in items)
+        assert max_buffered < 2 * largest + 64
+
+    def test_items_decoded_a_few_times(self):
+        # A long item is not decoded again after each chunk.
+        item = ['frame{}'.format(i) for i in range(10000)]
+        reader = self.get_items(json.dumps({'items': [item]}), 10 ** 6, 64)
+
+        with mock.patch.object(
+            json_stream, '_DECODER', wraps=json_stream._DECODER
+        ) as m_decoder:
+            assert list(reader) == [item]
+        assert m_decoder.raw_decode.call_count < 20
+
@@ -0,0 +1,122 @@
+import uuid
+
+import falcon
+import mock
+from falcon import testing
+
+from signer import middleware
+from signer.metrics import Counter, Histogram, Metrics, MetricsResource
+from signer.metrics import metrics as app_metrics
+from signer.tests.test_signer_service import simulate_request
+
+
+class TestCounter(object):
+
+    def test_samples(self):
+        counter = Counter('requests_total', 'Requests.', ('language',))
+        counter.inc('c')
+        counter.inc('c')
+        counter.inc('java')
+
+        assert counter.get('c') == 2
+        assert list(counter.samples()) == [
+            ('requests_total', ('language',), ('c',), 2),
+            ('requests_total', ('language',), ('java',), 1),
+        ]
+
+    def test_without_labels(self):
+        counter = Counter('errors_total', 'Errors.')
+        assert list(counter.samples()) == [('errors_total', (), (), 0)]
+
+
+class TestHistogram(object):
+
+    def test_samples(self):
+        histogram = Histogram('duration', 'Durations.', ('stage',), (1, 2))
+        histogram.observe(0.5, 'a')
+        histogram.observe(1.5, 'a')
+        histogram.observe(3, 'a')
+
+        assert histogram.get_count('a') == 3
+        assert list(histogram.samples()) == [
+            ('duration_bucket', ('stage', 'le'), ('a', '1'), 1),
+            ('duration_bucket', ('stage', 'le'), ('a', '2'), 2),
+            ('duration_bucket', ('stage', 'le'), ('a', '+Inf'), 3),
+            ('duration_sum', ('stage',), ('a',), 5.0),
+            ('duration_count', ('stage',), ('a',), 3),
+        ]
+
+
+class TestMetrics(object):
+
+    def test_render(self):
+        metrics = Metrics()
+        with metrics.timer('decode'):
+            pass
+        metrics.inc('signatures', 'c')
+        metrics.inc('empty_signatures')
+
+        with mock.patch('signer.metrics.os.getpid', return_value=42):
+            lines = metrics.render().splitlines()
+        assert '# TYPE signer_stage_duration_seconds histogram' in lines
+        assert (
+            'signer_stage_duration_seconds_count{pid="42",stage="decode"} 1'
+            in lines
+        )
+        assert (
+            'signer_stage_duration_seconds_count{pid="42",stage="frame_walk"}'
+            ' 0' in lines
+        )
+        assert 'signer_signatures_total{pid="42",language="c"} 1' in lines
+        assert 'signer_empty_signatures_total{pid="42"} 1' in lines
+        assert 'signer_truncated_signatures_total{pid="42"} 0' in lines
+
+    def test_disabled(self):
+        metrics = Metrics(enabled=False)
+        with metrics.timer('decode'):
+            pass
+        metrics.inc('signatures', 'c')
+
+        assert metrics.stage_durations.get_count('decode') == 0
+        assert metrics.counters['signatures'].get('c') == 0
+
+    def test_resource(self):
+        metrics = Metrics()
+        app = falcon.API(middleware=[
+            middleware.RequireJSON(),
+            middleware.JSONTranslator(),
+        ])
+        app.add_route('/metrics', MetricsResource(metrics))
+
+        environ = testing.create_environ(path='/metrics')
+        srmock = testing.StartResponseMock()
+        content = b''.join(app(environ, srmock)).decode('utf-8')
+
+        assert srmock.status == '200 OK'
+        assert srmock.headers_dict['Content-Type'].startswith('text/plain')
+        assert content == metrics.render()
+
+    def test_signing(self):
+        durations = app_metrics.stage_durations
+        counters = app_metrics.counters
+
+        def get_counts():
+            return (
+                [
+                    durations.get_count(x)
+                    for x in ('body_read', 'decode', 'sentinel_scan',
+                              'frame_walk', 'truncation', 'serialization')
+                ],
+                counters['signatures'].get('c'),
+                counters['empty_signatures'].get(),
+            )
+
+        before = get_counts()
+        # An irrelevant frame, which is not cached yet.
+        frame = '@0x{}'.format(uuid.uuid4().hex)
+        srmock, content = simulate_request('/sign', {'frames': [frame]})
+        assert srmock.status == '200 OK'
+        after = get_counts()
+
+        assert after[0] == [x + 1 for x in before[0]]
+        assert after[1:] == (before[1] + 1, before[2] + 1)
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import io
+
+import msgpack
+import pytest
+
+from signer import msgpack_stream
+from signer.json_stream import BodyTooLargeError
+
+
+def pack(*values):
+    return b''.join(msgpack_stream.dumps(x) for x in values)
+
+
+def iter_items(content, max_item_size=100, chunk_size=3):
+    return msgpack_stream.iter_items(
+        io.BytesIO(content), 'items', max_item_size, chunk_size
+    )
+
+
+ITEMS = [{'frames': ['a', u'é']}, {'lang': 'java'}, [1, 2], 3]
+
+
+class TestLoads(object):
+    def test_loads(self):
+        assert msgpack_stream.loads(pack({'frames': [u'é']})) == {
+            'frames': [u'é']
+        }
+
+    @pytest.mark.parametrize('content', (
+        b'\xc1',
+        pack({'frames': []}) + b'x',
+        pack({'frames': ['foo']})[:-1],
+        # A map with a list as key.
+        b'\x81\x90\x01',
+    ))
+    def test_loads_malformed(self, content):
+        with pytest.raises(ValueError):
+            msgpack_stream.loads(content)
+
+
+class TestIterItems(object):
+    def test_array(self):
+        assert list(iter_items(pack(ITEMS))) == ITEMS
+
+    def test_map(self):
+        content = pack({'items': ITEMS})
+        assert list(iter_items(content)) == ITEMS
+
+    def test_map_with_other_fields(self):
+        # Fields are packed in order.
+        content = b'\x82' + pack('other', [1, 2], 'items', ITEMS)
+        assert list(iter_items(content)) == ITEMS
+
+    def test_stream(self):
+        items = [{'frames': ['a']}, {'frames': ['b']}, 3]
+        assert list(iter_items(pack(*items))) == items
+
+    def test_empty(self):
+        assert list(iter_items(b'')) == []
+
+    def test_truncated(self):
+        items = iter_items(pack({'frames': ['a']}, {'frames': ['b']})[:-1])
+        assert next(items) == {'frames': ['a']}
+        with pytest.raises(ValueError):
+            next(items)
+
+    def test_malformed(self):
+        items = iter_items(pack(ITEMS[0]) + b'\xc1')
+        assert next(items) == ITEMS[0]
+        with pytest.raises(ValueError):
+            next(items)
+
+    def test_item_too_large(self):
+        items = iter_items(pack([{'frames': ['a']}, {'frames': ['a' * 200]}]))
+        assert next(items) == {'frames': ['a']}
+        with pytest.raises(BodyTooLargeError):
+            next(items)
+
+    def test_dumps_strings(self):
+        # Strings are never binary, whatever their type.
+        content = msgpack_stream.dumps({'signature': str('foo')})
+        assert msgpack.unpackb(content, raw=False) == {'signature': 'foo'}
@@ -0,0 +1,193 @@
+import gzip
+import io
+import json
+
+import mock
+import pytest
+
+from signer import resign
+from signer.languages.registry import SignatureToolRegistry
+from signer.signer_service import SignerService
+
+
+RECORDS = [
+    {'id': 'a', 'frames': ['foo', 'bar'], 'signature': 'foo'},
+    {'id': 'b', 'frames': ['pre', 'bar'], 'signature': 'foo'},
+    {'id': 'c', 'frames': ['baz']},
+    {'id': 'd', 'frames': []},
+    {'id': 'e', 'frames': ['foo'], 'lang': 'java'},
+]
+
+
+def write_records(path, records, compress=False):
+    content = b''.join(
+        (json.dumps(x) + '\n').encode('utf-8') for x in records
+    )
+    if compress:
+        with gzip.GzipFile(path, 'wb') as records_file:
+            records_file.write(content)
+    else:
+        with io.open(path, 'wb') as records_file:
+            records_file.write(content)
+
+
+def read_results(path):
+    if path.endswith('.gz'):
+        results_file = gzip.GzipFile(path, 'rb')
+    else:
+        results_file = io.open(path, 'rb')
+    with results_file:
+        return [json.loads(x.decode('utf-8')) for x in results_file]
+
+
+class TestSignRecords(object):
+    def test_sign_one_record(self):
+        service = SignerService(tools=SignatureToolRegistry())
+
+        def sign(record):
+            if not isinstance(record, bytes):
+                record = json.dumps(record).encode('utf-8')
+            [(line, status)] = resign.sign_records(
+                service, [record], 3, 'id'
+            )
+            return json.loads(line.decode('utf-8')), status
+
+        assert sign(RECORDS[0]) == ({
+            'id': 'a',
+            'index': 3,
+            'signature': 'foo',
+            'previous_signature': 'foo',
+            'notes': [],
+        }, 'unchanged')
+        assert sign({'frames': ['bar'], 'signature': 'foo'})[1] == 'changed'
+        assert sign({'frames': ['bar']})[1] == 'new'
+
+        result, status = sign(RECORDS[3])
+        assert status == 'error'
+        assert result['error']['title'] == 'Missing frames'
+        assert result['id'] == 'd'
+
+        result, status = sign(b'{"frames": [')
+        assert status == 'error'
+        assert result['error']['title'] == 'Invalid record'
+
+    def test_sign_records(self):
+        service = SignerService(tools=SignatureToolRegistry())
+        lines = [json.dumps(x).encode('utf-8') for x in RECORDS] + [
+            b'{"frames": [',
+            json.dumps({'frames': ['foo'], 'crashed_thread': 1}).encode(
+                'utf-8'
+            ),
+        ]
+
+        with mock.patch.object(
+            service.tools.get('c'),
+            'generate_batch',
+            wraps=service.tools.get('c').generate_batch,
+        ) as m_generate_batch:
+            results = resign.sign_records(service, lines, 5, 'id')
+        # C records are signed together.
+        m_generate_batch.assert_called_once_with(
+            [['foo', 'bar'], ['pre', 'bar'], ['baz'], ['foo']],
+            [None, None, None, 1],
+        )
+        # The same as when signed one by one.
+        assert results == [
+            resign.sign_records(service, [line], index, 'id')[0]
+            for index, line in enumerate(lines, 5)
+        ]
+
+
+class TestMain(object):
+    @pytest.mark.parametrize('compress', (False, True))
+    def test_main(self, tmpdir, capsys, compress):
+        input_path = str(tmpdir.join('crashes.jsonl'))
+        output_path = str(tmpdir.join('signatures.jsonl'))
+        if compress:
+            input_path += '.gz'
+            output_path += '.gz'
+        write_records(input_path, RECORDS * 3, compress)
+
+        assert resign.main([
+            input_path,
+            '-o', output_path,
+            '-j', '2',
+            '--chunk-size', '2',
+        ]) == 0
+
+        results = read_results(output_path)
+        assert [x['index'] for x in results] == list(range(15))
+        assert [x['id'] for x in results] == list('abcde') * 3
+        assert results[1]['signature'] == 'pre'
+
+        out, _ = capsys.readouterr()
+        assert json.loads(out) == {
+            'changed': 3,
+            'unchanged': 3,
+            'new': 6,
+            'error': 3,
+        }
+
+    def test_siglists(self, tmpdir, siglists_dir):
+        input_path = str(tmpdir.join('crashes.jsonl'))
+        output_path = str(tmpdir.join('signatures.jsonl'))
+        write_records(input_path, RECORDS)
+        with siglists_dir.join('prefix_signature_re.txt').open('a') as f:
+            f.write('\npre\n')
+
+        resign.main([
+            input_path,
+            '-o', output_path,
+            '-j', '1',
+            '--siglists', str(siglists_dir),
+        ])
+
+        assert read_results(output_path)[1]['signature'] == 'pre | bar'
+
+    @pytest.mark.parametrize('compress', (False, True))
+    def test_resume(self, tmpdir, capsys, compress):
+        input_path = str(tmpdir.join('crashes.jsonl'))
+        output_path = str(tmpdir.join('signatures.jsonl'))
+        checkpoint_path = str(tmpdir.join('checkpoint.json'))
+        if compress:
+            output_path += '.gz'
+        write_records(input_path, RECORDS * 4)
+        argv = [
+            input_path,
+            '-o', output_path,
+            '-j', '1',
+            '--chunk-size', '2',
+            '--checkpoint', checkpoint_path,
+            '--checkpoint-every', '4',
+        ]
+
+        write = resign.OutputWriter.write
+        calls = []
+
+        def fail_on_sixth_chunk(self, lines):
+            calls.append(1)
+            if len(calls) == 6:
+                raise KeyboardInterrupt
+            write(self, lines)
+
+        with mock.patch.object(
+            resign.OutputWriter, 'write', fail_on_sixth_chunk
+        ):
+            with pytest.raises(KeyboardInterrupt):
+                resign.main(argv)
+
+        checkpoint = resign.load_checkpoint(checkpoint_path)
+        assert checkpoint['records'] == 8
+        capsys.readouterr()
+
+        resign.main(argv + ['--resume'])
+
+        results = read_results(output_path)
+        assert [x['index'] for x in results] == list(range(20))
+        out, _ = capsys.readouterr()
+        assert sum(json.loads(out).values()) == 20
+        assert not tmpdir.join('checkpoint.json').check()
+
+    def test_resume_needs_checkpoint(self, tmpdir):
+        with pytest.raises(SystemExit):
+            resign.main(['-', '-o', str(tmpdir.join('out')), '--resume'])
@@ -0,0 +1,131 @@
+import json
+import os
+import shutil
+
+from signer import siglists
+from signer.frame_index import FrameIndex, build_index
+from signer.resign_changes import (
+    find_affected_crashes,
+    iter_changed_signatures,
+    main,
+)
+from signer.siglists import load_siglists
+from signer.siglists.diff import diff_siglists
+from signer.tests.siglists.test_reloader import add_line
+from signer.tests.test_frame_index import get_lines
+
+
+RECORDS = [
+    {'id': 'a', 'frames': ['my_prefix', 'foo']},
+    {'id': 'b', 'frames': ['foo', 'my_prefix']},
+    {'id': 'c', 'frames': ['foo', 'bar']},
+    {'id': 'd', 'frames': ['foo', 'my_sentinel', 'bar']},
+]
+
+
+def get_dirs(tmpdir):
+    old_dir = tmpdir.mkdir('old')
+    package_dir = os.path.dirname(siglists.__file__)
+    for name in siglists.SIGLIST_NAMES:
+        shutil.copy(
+            os.path.join(package_dir, name + '.txt'),
+            str(old_dir.join(name + '.txt'))
+        )
+    new_dir = tmpdir.join('new')
+    shutil.copytree(str(old_dir), str(new_dir))
+    return old_dir, new_dir
+
+
+def get_index(tmpdir, records=RECORDS):
+    path = str(tmpdir.join('frames.db'))
+    index = FrameIndex(path)
+    build_index(index, get_lines(records))
+    return index, path
+
+
+class TestResignChanges(object):
+    def test_find_affected_crashes(self, tmpdir):
+        old_dir, new_dir = get_dirs(tmpdir)
+        add_line(new_dir, 'prefix_signature_re', 'my_pre.*')
+        index, _ = get_index(tmpdir)
+
+        changes = diff_siglists(
+            load_siglists(str(old_dir)),
+            load_siglists(str(new_dir)),
+        )
+        assert find_affected_crashes(index, changes) == [0, 1]
+
+        add_line(new_dir, 'signature_sentinels', 'foo')
+        changes = diff_siglists(
+            load_siglists(str(old_dir)),
+            load_siglists(str(new_dir)),
+        )
+        assert find_affected_crashes(index, changes) == [0, 1, 2, 3]
+
+    def test_find_affected_crashes_trimmed_dll(self, tmpdir):
+        old_dir, new_dir = get_dirs(tmpdir)
+        for siglists_dir in (old_dir, new_dir):
+            add_line(siglists_dir, 'trim_dll_signature_re', r'my_dll\.dll.*')
+        # Only matches the frame once trimmed to its module.
+        add_line(new_dir, 'prefix_signature_re', r'my_dll\.dll$')
+        index, _ = get_index(tmpdir, [
+            {'id': 'a', 'frames': ['foo', 'bar']},
+            {'id': 'b', 'frames': ['my_dll.dll@0x1234', 'foo']},
+        ])
+
+        changes = diff_siglists(
+            load_siglists(str(old_dir)),
+            load_siglists(str(new_dir)),
+        )
+        assert find_affected_crashes(index, changes) == [1]
+
+        crashes = list(iter_changed_signatures(
+            index,
+            load_siglists(str(old_dir)),
+            load_siglists(str(new_dir)),
+            [1],
+        ))
+        assert [(x['before'], x['after']) for x in crashes] == [
+            ('my_dll.dll', 'my_dll.dll | foo'),
+        ]
+
+    def test_main(self, tmpdir, capfd):
+        old_dir, new_dir = get_dirs(tmpdir)
+        add_line(new_dir, 'prefix_signature_re', 'my_pre.*')
+        add_line(old_dir, 'signature_sentinels', 'my_sentinel')
+        _, index_path = get_index(tmpdir)
+        output_path = str(tmpdir.join('changes.jsonl'))
+
+        assert main([
+            str(old_dir),
+            str(new_dir),
+            '--index', index_path,
+            '-o', output_path,
+        ]) == 0
+
+        with open(output_path) as output:
+            changes = [json.loads(x) for x in output]
+        # Crash `b` contains the new prefix, but after the signature frame.
+        assert changes == [
+            {
+                'index': 0,
+                'id': 'a',
+                'before': 'my_prefix',
+                'after': 'my_prefix | foo',
+            },
+            {
+                'index': 3,
+                'id': 'd',
+                'before': 'my_sentinel',
+                'after': 'foo',
+            },
+        ]
+
+    def test_main_no_changes(self, tmpdir, capfd):
+        old_dir, new_dir = get_dirs(tmpdir)
+        _, index_path = get_index(tmpdir)
+
+        assert main([
+            str(old_dir), str(new_dir), '--index', index_path
+        ]) == 0
+        assert capfd.readouterr()[0] == ''
@@ -0,0 +1,122 @@
+import mock
+
+from signer.frame_dictionary import FrameDictionary
+from signer.shadow import ShadowEvaluator
+from signer.siglists import load_siglists
+from signer.tests.siglists.test_reloader import add_line
+
+
+def get_evaluator(siglists_dir, sample_rate=1, queue_size=10,
+                  max_divergences=10):
+    # Frames starting with `foo` are prefixes in the candidate siglists.
+    add_line(siglists_dir, 'prefix_signature_re', 'foo')
+    evaluator = ShadowEvaluator(sample_rate, queue_size, max_divergences)
+    evaluator.set_candidate(load_siglists(str(siglists_dir)))
+    return evaluator
+
+
+class TestShadowEvaluator(object):
+    def test_disabled(self):
+        evaluator = ShadowEvaluator(1, 10, 10)
+        assert not evaluator.enabled
+        evaluator.submit(['foo'], None, 'foo')
+        assert evaluator.status()['submitted'] == 0
+
+    def test_evaluate(self, siglists_dir):
+        evaluator = get_evaluator(siglists_dir)
+        assert evaluator.enabled
+
+        evaluator.submit(['foo', 'bar'], None, 'foo')
+        evaluator.submit(['foo', 'baz'], None, 'foo')
+        evaluator.submit(['foo', 'bar'], None, 'foo')
+        evaluator.submit(['bar', 'baz'], None, 'bar')
+        evaluator.wait()
+
+        status = evaluator.status()
+        assert status['directory'] == str(siglists_dir)
+        assert status['submitted'] == 4
+        assert status['evaluated'] == 4
+        assert status['diverged'] == 3
+        assert status['queued'] == 0
+        assert status['divergences'] == [
+            {
+                'old': 'foo',
+                'new': 'foo | bar',
+                'count': 2,
+                'frames': ['foo', 'bar'],
+            },
+            {
+                'old': 'foo',
+                'new': 'foo | baz',
+                'count': 1,
+                'frames': ['foo', 'baz'],
+            },
+        ]
+        assert len(evaluator.status(top=1)['divergences']) == 1
+
+        evaluator.reset()
+        assert evaluator.status()['evaluated'] == 0
+
+    def test_evaluate_dictionary(self, siglists_dir):
+        evaluator = get_evaluator(siglists_dir)
+        dictionary = FrameDictionary(['foo', 'bar'])
+
+        evaluator.submit([0, 1], None, 'foo', dictionary)
+        evaluator.wait()
+        assert evaluator.status()['divergences'][0]['frames'] == [
+            'foo', 'bar'
+        ]
+
+    def test_sample_rate(self, siglists_dir):
+        evaluator = get_evaluator(siglists_dir, sample_rate=0.5)
+        evaluator._random = mock.Mock(side_effect=[0.1, 0.7, 0.3])
+
+        for _ in range(3):
+            evaluator.submit(['foo', 'bar'], None, 'foo')
+        evaluator.wait()
+        assert evaluator.status()['evaluated'] == 2
+
+    def test_queue_full(self, siglists_dir):
+        evaluator = get_evaluator(siglists_dir, queue_size=2)
+
+        # No thread takes crashes from the queue.
+        with mock.patch('signer.background_queue.threading.Thread'):
+            for _ in range(3):
+                evaluator.submit(['foo', 'bar'], None, 'foo')
+
+        status = evaluator.status()
+        assert status['submitted'] == 3
+        assert status['dropped'] == 1
+        assert status['queued'] == 2
+
+    def test_max_divergences(self, siglists_dir):
+        evaluator = get_evaluator(siglists_dir, max_divergences=1)
+
+        evaluator.submit(['foo', 'bar'], None, 'foo')
+        evaluator.submit(['foo', 'baz'], None, 'foo')
+        evaluator.wait()
+
+        status = evaluator.status()
+        assert status['diverged'] == 2
+        assert status['untracked'] == 1
+        assert len(status['divergences']) == 1
+
+    def test_candidate_changed(self, siglists_dir):
+        evaluator = get_evaluator(siglists_dir)
+        old_tool = evaluator.tool
+        evaluator.set_candidate(load_siglists(str(siglists_dir)))
+
+        evaluator.evaluate(old_tool, ['foo', 'bar'], None, 'foo')
+        assert evaluator.status()['evaluated'] == 0
+
+    def test_errors(self, siglists_dir):
+        evaluator = get_evaluator(siglists_dir)
+
+        evaluator.submit(None, None, 'foo')
+        evaluator.wait()
+        assert evaluator.status()['errors'] == 1
+
+        # The thread goes on.
+        evaluator.submit(['foo', 'bar'], None, 'foo')
+        evaluator.wait()
+        assert evaluator.status()['evaluated'] == 1
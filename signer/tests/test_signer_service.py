@@ -0,0 +1,1006 @@
+import json
+import time
+
+import mock
+import msgpack
+import pytest
+from falcon import testing
+
+from signer import msgpack_stream, siglists
+from signer.languages.registry import SignatureToolRegistry, registry
+from signer.signature_tool_base import DEADLINE_NOTE
+from signer.signer_service import SignerService
+from signer.tests.languages.test_registry import get_profiles
+from signer.wsgi import app
+
+
+def simulate_request(path, body=None, query_string='', method='POST',
+                     headers=None):
+    all_headers = {'Content-Type': 'application/json'}
+    all_headers.update(headers or {})
+    if body is not None and not isinstance(body, bytes):
+        body = json.dumps(body)
+
+    environ = testing.create_environ(
+        path=path,
+        query_string=query_string,
+        method=method,
+        headers=all_headers,
+        body=body,
+    )
+    srmock = testing.StartResponseMock()
+    content = b''.join(app(environ, srmock))
+    return srmock, content
+
+
+class TestSignerService(object):
+    def test_sign(self):
+        srmock, content = simulate_request(
+            '/sign',
+            {'frames': ['NtWaitForMultipleObjects', 'foo', 'bar']},
+            query_string='lang=c',
+        )
+
+        assert srmock.status == '200 OK'
+        assert json.loads(content.decode('utf-8')) == {
+            'signature': 'foo',
+            'notes': [],
+            'language': 'c',
+            'siglists_version': siglists.get_package_siglists().version,
+        }
+
+    def test_sign_unsupported_lang(self):
+        srmock, _ = simulate_request(
+            '/sign',
+            {'frames': ['foo']},
+            query_string='lang=cobol',
+        )
+
+        assert srmock.status == '400 Bad Request'
+
+    def test_sign_missing_frames(self):
+        srmock, _ = simulate_request('/sign', {'frames': []})
+        assert srmock.status == '400 Bad Request'
+
+        srmock, _ = simulate_request('/sign', {'frames': [1, 2]})
+        assert srmock.status == '400 Bad Request'
+
+    def test_sign_frame_objects(self):
+        srmock, content = simulate_request(
+            '/sign',
+            {'frames': [
+                {'function': 'js_Interpret', 'line': 42},
+                'Foo<int>::Bar(int,char *)',
+            ]},
+        )
+        assert srmock.status == '200 OK'
+        assert json.loads(content.decode('utf-8'))['signature'] == (
+            'js_Interpret:42'
+        )
+
+        for frame in (
+            {'line': 42},
+            {'function': 'foo', 'line': '42'},
+            {'function': 'foo', 'line': True},
+        ):
+            srmock, _ = simulate_request('/sign', {'frames': [frame]})
+            assert srmock.status == '400 Bad Request'
+
+    def test_sign_malformed_json(self):
+        srmock, _ = simulate_request('/sign', b'{"frames": [')
+        assert srmock.status == '753 Syntax Error'
+
+    @mock.patch('signer.middleware.settings')
+    def test_sign_body_too_large(self, m_settings):
+        m_settings.MAX_BODY_SIZE = 100
+        m_settings.READ_CHUNK_SIZE = 10
+
+        srmock, _ = simulate_request('/sign', {'frames': ['a' * 100]})
+        assert srmock.status == '413 Payload Too Large'
+
+    @mock.patch('signer.signer_service.settings.MAX_FRAMES', 3)
+    def test_sign_too_many_frames(self):
+        srmock, _ = simulate_request('/sign', {'frames': ['a', 'b', 'c']})
+        assert srmock.status == '200 OK'
+
+        srmock, content = simulate_request(
+            '/sign',
+            {'frames': ['a', 'b', 'c', 'd']},
+        )
+        assert srmock.status == '413 Payload Too Large'
+        assert json.loads(content.decode('utf-8'))['title'] == (
+            'Too many frames'
+        )
+
+    def test_sign_chunked(self):
+        environ = testing.create_environ(
+            path='/sign',
+            method='POST',
+            headers={
+                'Content-Type': 'application/json',
+                'Transfer-Encoding': 'chunked',
+            },
+            body=json.dumps({'frames': ['foo', 'bar']}),
+        )
+        del environ['CONTENT_LENGTH']
+        srmock = testing.StartResponseMock()
+        content = b''.join(app(environ, srmock))
+
+        assert srmock.status == '200 OK'
+        assert json.loads(content.decode('utf-8'))['signature'] == 'foo'
+
+    @mock.patch('signer.signer_service.settings.MAX_FRAME_LENGTH', 10)
+    def test_sign_frame_too_long(self):
+        srmock, content = simulate_request('/sign', {'frames': ['a' * 11]})
+        assert srmock.status == '413 Payload Too Large'
+        assert json.loads(content.decode('utf-8'))['title'] == (
+            'Frame too long'
+        )
+
+    def test_sign_etag(self):
+        body = {'frames': ['foo', 'bar']}
+        srmock, content = simulate_request('/sign', body)
+        assert srmock.status == '200 OK'
+        etag = dict(srmock.headers)['etag']
+
+        # Same request, same ETag.
+        srmock, _ = simulate_request('/sign', body)
+        assert dict(srmock.headers)['etag'] == etag
+
+        # Different crashed thread, different ETag.
+        srmock, _ = simulate_request('/sign', body, 'crashed_thread=1')
+        assert dict(srmock.headers)['etag'] != etag
+
+        srmock, content = simulate_request(
+            '/sign',
+            body,
+            headers={'If-None-Match': etag},
+        )
+        assert srmock.status == '304 Not Modified'
+        assert content == b''
+
+        srmock, content = simulate_request(
+            '/sign',
+            body,
+            headers={'If-None-Match': '"other", W/{}'.format(etag)},
+        )
+        assert srmock.status == '304 Not Modified'
+
+        srmock, content = simulate_request(
+            '/sign',
+            body,
+            headers={'If-None-Match': '"other"'},
+        )
+        assert srmock.status == '200 OK'
+        assert json.loads(content.decode('utf-8'))['signature'] == 'foo'
+
+
+class TestSignerServiceResults(object):
+    def test_sign_cached(self):
+        service = SignerService(tools=SignatureToolRegistry())
+
+        result = service.sign('c', ['foo', 'bar'], None)
+        assert result['signature'] == 'foo'
+        assert service.results.stats()['misses'] == 1
+
+        # Changing the result does not change the cached one.
+        result['index'] = 3
+
+        with mock.patch.object(service.tools.get('c'), 'generate') as m_gen:
+            assert service.sign('c', ['foo', 'bar'], None) == {
+                'signature': 'foo',
+                'notes': [],
+                'language': 'c',
+                'siglists_version': siglists.get_package_siglists().version,
+            }
+            assert not m_gen.called
+        assert service.results.stats()['hits'] == 1
+
+        service.sign('c', ['foo', 'bar'], 1)
+        service.sign('c', ['foo', 'bar'], '1')
+        service.sign('java', ['foo', 'bar'], None)
+        assert service.results.stats()['hits'] == 2
+        assert service.results.stats()['misses'] == 3
+
+    def test_key_includes_siglists_version(self):
+        service = SignerService(tools=SignatureToolRegistry())
+        old_tool = service.tools.get('c')
+        new_tool = mock.Mock(siglists_version='abc', siglists_profile=None)
+
+        assert (
+            service.get_key(old_tool, 'c', ['foo'], None) !=
+            service.get_key(new_tool, 'c', ['foo'], None)
+        )
+
+    def test_key_includes_profile(self):
+        service = SignerService(tools=SignatureToolRegistry())
+        tool = service.tools.get('c')
+        profile_tool = mock.Mock(
+            siglists_version=tool.siglists_version, siglists_profile='a'
+        )
+
+        assert (
+            service.get_key(tool, 'c', ['foo'], None) !=
+            service.get_key(profile_tool, 'c', ['foo'], None)
+        )
+
+    def test_partial_results_not_cached(self):
+        service = SignerService(tools=SignatureToolRegistry())
+        frames = ['Abort'] * 100
+
+        result = service.sign('c', frames, 0, deadline=0)
+        assert result['notes'] == [DEADLINE_NOTE]
+        assert service.is_partial(result)
+        assert len(service.results) == 0
+
+        result = service.sign('c', frames, 0, deadline=time.time() + 60)
+        assert not service.is_partial(result)
+        assert len(service.results) == 1
+
+
+class TestAdmission(object):
+    @mock.patch('signer.admission.ConcurrencyLimiter.acquire',
+                return_value=False)
+    def test_rejected(self, m_acquire):
+        for path in ('/sign', '/sign/batch'):
+            srmock, _ = simulate_request(path, {'frames': ['foo']})
+            assert srmock.status == '503 Service Unavailable'
+            assert ('retry-after', '1') in srmock.headers
+
+        srmock, _ = simulate_request('/dictionaries', {'frames': ['foo']})
+        assert srmock.status in ('200 OK', '201 Created')
+
+    def test_deadline(self):
+        body = {'frames': ['Abort'] * 100}
+        with mock.patch('signer.admission.get_deadline', return_value=0):
+            srmock, content = simulate_request('/sign', body)
+        assert srmock.status == '200 OK'
+        assert json.loads(content.decode('utf-8'))['notes'] == [
+            DEADLINE_NOTE
+        ]
+        # Partial results are not those of the ETag.
+        assert 'etag' not in dict(srmock.headers)
+
+        srmock, content = simulate_request('/sign', body)
+        notes = json.loads(content.decode('utf-8'))['notes']
+        assert DEADLINE_NOTE not in notes
+        assert 'etag' in dict(srmock.headers)
+
+
+class TestShadow(object):
+    @mock.patch('signer.shadow.ShadowEvaluator.submit')
+    def test_submit(self, m_submit):
+        srmock, _ = simulate_request(
+            '/sign',
+            {'frames': ['foo', 'bar']},
+            query_string='crashed_thread=2',
+        )
+        assert srmock.status == '200 OK'
+        m_submit.assert_called_once_with(['foo', 'bar'], '2', 'foo', None)
+
+        m_submit.reset_mock()
+        simulate_request(
+            '/sign',
+            {'frames': ['java.lang.Exception: foo', 'at Foo.bar']},
+            query_string='lang=java',
+        )
+        assert not m_submit.called
+
+    @mock.patch('signer.shadow.ShadowEvaluator.submit')
+    @mock.patch('signer.admission.get_deadline', return_value=0)
+    def test_partial_results_not_submitted(self, m_get_deadline, m_submit):
+        srmock, content = simulate_request('/sign', {'frames': ['Abort'] * 99})
+        assert json.loads(content.decode('utf-8'))['notes'] == [
+            DEADLINE_NOTE
+        ]
+        assert not m_submit.called
+
+
+class TestHeavyHitters(object):
+    @mock.patch('signer.heavy_hitters.HeavyHitters.submit')
+    def test_submit(self, m_submit):
+        simulate_request('/sign', {'frames': ['foo', 'bar']})
+        m_submit.assert_called_once_with('c', 'foo')
+
+        m_submit.reset_mock()
+        items = [
+            {'frames': ['bar']},
+            {'lang': 'cobol', 'frames': ['foo']},
+            {'lang': 'java', 'frames': ['java.lang.Exception', 'at Foo']},
+        ]
+        simulate_request('/sign/batch', {'items': items})
+        assert m_submit.call_args_list == [
+            mock.call('c', 'bar'),
+            mock.call('java', 'java.lang.Exception: at Foo'),
+        ]
+
+    @mock.patch('signer.heavy_hitters.HeavyHitters.submit')
+    @mock.patch('signer.admission.get_deadline', return_value=0)
+    def test_partial_results_not_counted(self, m_get_deadline, m_submit):
+        items = [{'frames': ['Abort'] * 99}]
+        srmock, content = simulate_request('/sign/batch', {'items': items})
+        assert json.loads(content.decode('utf-8'))['notes'] == [
+            DEADLINE_NOTE
+        ]
+        assert not m_submit.called
+
+
+class TestProfiles(object):
+    @pytest.fixture(autouse=True)
+    def profiles(self, request):
+        registry.set_profiles(get_profiles())
+        request.addfinalizer(lambda: registry.set_profiles(None))
+
+    def test_sign(self):
+        srmock, content = simulate_request(
+            '/sign', {'frames': ['foo', 'bar']}, query_string='profile=a'
+        )
+        assert srmock.status == '200 OK'
+        result = json.loads(content.decode('utf-8'))
+        assert result['signature'] == 'foo | bar'
+        assert result['profile'] == 'a'
+
+        # Results of profiles are cached apart.
+        srmock, content = simulate_request('/sign', {'frames': ['foo', 'bar']})
+        result = json.loads(content.decode('utf-8'))
+        assert result['signature'] == 'foo'
+        assert 'profile' not in result
+
+    def test_unknown_profile(self):
+        srmock, content = simulate_request(
+            '/sign', {'frames': ['foo']}, query_string='profile=unknown'
+        )
+        assert srmock.status == '400 Bad Request'
+        assert json.loads(content.decode('utf-8'))['title'] == (
+            'Unknown profile'
+        )
+
+    def test_sign_batch(self):
+        items = [
+            {'frames': ['foo', 'bar']},
+            {'frames': ['foo', 'bar'], 'profile': 'b'},
+            {'frames': ['foo', 'bar'], 'profile': ['a']},
+        ]
+        srmock, content = simulate_request(
+            '/sign/batch', {'items': items}, query_string='profile=a'
+        )
+        results = [
+            json.loads(x) for x in content.decode('utf-8').splitlines()
+        ]
+        assert results[0]['signature'] == 'foo | bar'
+        assert results[1]['signature'] == 'foo'
+        assert results[1]['profile'] == 'b'
+        assert results[2]['error']['title'] == 'Unknown profile'
+
+    @mock.patch('signer.shadow.ShadowEvaluator.submit')
+    def test_no_shadow(self, m_submit):
+        simulate_request(
+            '/sign', {'frames': ['foo']}, query_string='profile=a'
+        )
+        assert not m_submit.called
+
+
+class TestBatchSignerService(object):
+    def test_sign_batch(self):
+        items = [
+            {'frames': ['pthread_mutex_lock', 'foo', 'bar']},
+            {'lang': 'cobol', 'frames': ['foo']},
+            {'lang': 'c', 'frames': []},
+            'not an item',
+            {
+                'lang': 'java',
+                'frames': [
+                    'java.lang.NullPointerException: oops',
+                    'at Foo.bar(Foo.java:42)',
+                ],
+            },
+        ]
+        srmock, content = simulate_request('/sign/batch', {'items': items})
+
+        assert srmock.status == '200 OK'
+        assert ('content-type', 'application/x-ndjson') in srmock.headers
+
+        lines = content.decode('utf-8').splitlines()
+        results = [json.loads(line) for line in lines]
+        assert len(results) == len(items)
+        assert [x['index'] for x in results] == list(range(len(items)))
+
+        assert results[0]['signature'] == 'pthread_mutex_lock | foo'
+        assert results[1]['error']['title'] == 'Unsupported lang'
+        assert results[2]['error']['title'] == 'Missing frames'
+        assert results[3]['error']['title'] == 'Invalid item'
+        assert results[4]['signature'] == (
+            'java.lang.NullPointerException: oops at Foo.bar(Foo.java)'
+        )
+
+    def test_sign_batch_same_as_sign(self):
+        frames = [
+            'NtWaitForMultipleObjects',
+            'WaitForMultipleObjectsEx',
+            'WaitForMultipleObjectsExImplementation',
+            'RealMsgWaitForMultipleObjectsEx',
+            'MsgWaitForMultipleObjects',
+            'F_1152915508___________________________________',
+        ]
+        _, single = simulate_request('/sign', {'frames': frames})
+        _, batch = simulate_request(
+            '/sign/batch',
+            {'items': [{'frames': frames}]},
+        )
+
+        expected = json.loads(single.decode('utf-8'))
+        expected['index'] = 0
+        assert json.loads(batch.decode('utf-8')) == expected
+
+    def test_sign_batch_ndjson(self):
+        items = [
+            {'frames': ['foo', 'bar']},
+            {'lang': 'cobol', 'frames': ['foo']},
+            {'frames': ['baz']},
+        ]
+        body = '\n'.join(json.dumps(x) for x in items)
+        srmock, content = simulate_request(
+            '/sign/batch',
+            body.encode('utf-8'),
+            headers={'Content-Type': 'application/x-ndjson'},
+        )
+
+        assert srmock.status == '200 OK'
+        results = [json.loads(x) for x in content.decode('utf-8').splitlines()]
+        assert [x.get('signature') for x in results] == ['foo', None, 'baz']
+
+    def test_sign_batch_malformed_item(self):
+        body = b'{"items": [{"frames": ["foo"]}, {"frames": [}, {}]}'
+        srmock, content = simulate_request('/sign/batch', body)
+
+        # Items before the error are still signed.
+        assert srmock.status == '200 OK'
+        results = [json.loads(x) for x in content.decode('utf-8').split('\n')
+                   if x]
+        assert len(results) == 2
+        assert results[0]['signature'] == 'foo'
+        assert results[1]['index'] == 1
+        assert results[1]['error']['title'] == 'Malformed JSON'
+
+    @mock.patch('signer.middleware.settings.MAX_BODY_SIZE', 100)
+    def test_sign_batch_item_too_large(self):
+        items = [
+            {'frames': ['foo']},
+            {'frames': ['a' * 200]},
+        ]
+        srmock, content = simulate_request('/sign/batch', {'items': items})
+
+        results = [json.loads(x) for x in content.decode('utf-8').split('\n')
+                   if x]
+        assert results[0]['signature'] == 'foo'
+        assert results[1]['error']['title'] == 'Request body too large'
+
+    @mock.patch('signer.signer_service.settings.MAX_FRAMES', 1)
+    def test_sign_batch_too_many_frames(self):
+        items = [
+            {'frames': ['foo', 'bar']},
+            {'frames': ['baz']},
+        ]
+        srmock, content = simulate_request('/sign/batch', {'items': items})
+
+        results = [json.loads(x) for x in content.decode('utf-8').split('\n')
+                   if x]
+        assert results[0]['error']['title'] == 'Too many frames'
+        assert results[1]['signature'] == 'baz'
+
+    def test_sign_ndjson_not_supported(self):
+        srmock, _ = simulate_request(
+            '/sign',
+            b'{"frames": ["foo"]}\n',
+            headers={'Content-Type': 'application/x-ndjson'},
+        )
+        assert srmock.status == '415 Unsupported Media Type'
+
+    def test_sign_batch_missing_items(self):
+        srmock, _ = simulate_request('/sign/batch', {'frames': ['foo']})
+        assert srmock.status == '400 Bad Request'
+
+
+class TestMessagePack(object):
+    headers = {
+        'Content-Type': 'application/msgpack',
+        'Accept': 'application/msgpack',
+    }
+
+    def test_sign(self):
+        frames = ['pthread_mutex_lock', 'foo', 'bar']
+        _, expected = simulate_request('/sign', {'frames': frames})
+
+        srmock, content = simulate_request(
+            '/sign',
+            msgpack_stream.dumps({'frames': frames}),
+            headers=self.headers,
+        )
+        assert srmock.status == '200 OK'
+        assert srmock.headers_dict['Content-Type'] == 'application/msgpack'
+        assert msgpack_stream.loads(content) == json.loads(
+            expected.decode('utf-8')
+        )
+
+    @pytest.mark.parametrize('headers, expected', (
+        # The response is encoded like the request, unless the client
+        # prefers another encoding.
+        ({'Content-Type': 'application/msgpack'}, 'application/msgpack'),
+        ({'Content-Type': 'application/x-msgpack'}, 'application/msgpack'),
+        (
+            {
+                'Content-Type': 'application/msgpack',
+                'Accept': 'application/json',
+            },
+            'application/json',
+        ),
+        ({'Accept': 'application/msgpack'}, 'application/msgpack'),
+        ({'Accept': '*/*'}, 'application/json'),
+    ))
+    def test_negotiation(self, headers, expected):
+        if headers.get('Content-Type', '').endswith('msgpack'):
+            body = msgpack_stream.dumps({'frames': ['foo']})
+        else:
+            body = {'frames': ['foo']}
+
+        srmock, content = simulate_request('/sign', body, headers=headers)
+        assert srmock.status == '200 OK'
+        assert srmock.headers_dict['Content-Type'].startswith(expected)
+
+    def test_etag(self):
+        body = {'frames': ['foo']}
+        json_mock, _ = simulate_request('/sign', body)
+        msgpack_mock, _ = simulate_request(
+            '/sign',
+            body,
+            headers={'Accept': 'application/msgpack'},
+        )
+        assert json_mock.headers_dict['etag'] != (
+            msgpack_mock.headers_dict['etag']
+        )
+
+    def test_errors(self):
+        srmock, content = simulate_request(
+            '/sign',
+            msgpack_stream.dumps({'frames': []}),
+            headers=self.headers,
+        )
+        assert srmock.status == '400 Bad Request'
+        assert srmock.headers_dict['Content-Type'] == 'application/msgpack'
+        assert msgpack_stream.loads(content)['title'] == 'Missing frames'
+
+        srmock, content = simulate_request(
+            '/sign',
+            b'\xc1',
+            headers=self.headers,
+        )
+        assert srmock.status == '753 Syntax Error'
+        assert msgpack_stream.loads(content)['title'] == (
+            'Malformed MessagePack'
+        )
+
+    def test_unsupported_media_type(self):
+        srmock, _ = simulate_request(
+            '/sign',
+            b'frames: foo',
+            headers={'Content-Type': 'application/yaml'},
+        )
+        assert srmock.status == '415 Unsupported Media Type'
+
+    @pytest.mark.parametrize('encode', (
+        lambda items: msgpack_stream.dumps(items),
+        lambda items: msgpack_stream.dumps({'items': items}),
+        lambda items: b''.join(msgpack_stream.dumps(x) for x in items),
+    ))
+    def test_sign_batch(self, encode):
+        items = [
+            {'frames': ['foo', 'bar']},
+            {'lang': 'cobol', 'frames': ['foo']},
+            {'frames': ['baz']},
+        ]
+        _, expected = simulate_request('/sign/batch', {'items': items})
+
+        srmock, content = simulate_request(
+            '/sign/batch',
+            encode(items),
+            headers=self.headers,
+        )
+        assert srmock.status == '200 OK'
+        assert srmock.headers_dict['Content-Type'] == 'application/msgpack'
+
+        unpacker = msgpack.Unpacker(raw=False)
+        unpacker.feed(content)
+        assert list(unpacker) == [
+            json.loads(x) for x in expected.decode('utf-8').splitlines()
+        ]
+
+    def test_sign_batch_malformed_item(self):
+        body = msgpack_stream.dumps({'frames': ['foo']}) + b'\xc1'
+        srmock, content = simulate_request(
+            '/sign/batch',
+            body,
+            headers=self.headers,
+        )
+
+        unpacker = msgpack.Unpacker(raw=False)
+        unpacker.feed(content)
+        results = list(unpacker)
+        assert results[0]['signature'] == 'foo'
+        assert results[1]['error']['title'] == 'Malformed MessagePack'
+
+
+class TestFrameDictionaries(object):
+    frames = ['NtWaitForMultipleObjects', 'mozilla::ipc::MessageChannel::Send']
+
+    def upload(self, frames=None):
+        srmock, content = simulate_request(
+            '/dictionaries',
+            {'frames': frames or self.frames},
+        )
+        return srmock, json.loads(content.decode('utf-8'))
+
+    def test_upload(self):
+        srmock, content = self.upload()
+        assert srmock.status in ('200 OK', '201 Created')
+        assert content['size'] == 2
+        dictionary_id = content['id']
+        assert dict(srmock.headers)['location'].endswith(
+            '/dictionaries/{}'.format(dictionary_id)
+        )
+
+        srmock, content = self.upload()
+        assert srmock.status == '200 OK'
+        assert content == {'id': dictionary_id, 'size': 2}
+
+        srmock, content = simulate_request(
+            '/dictionaries/{}'.format(dictionary_id),
+            method='GET',
+        )
+        assert srmock.status == '200 OK'
+        assert json.loads(content.decode('utf-8'))['id'] == dictionary_id
+
+        srmock, _ = simulate_request('/dictionaries/unknown', method='GET')
+        assert srmock.status == '404 Not Found'
+
+        srmock, _ = simulate_request('/dictionaries', method='GET')
+        assert srmock.status == '405 Method Not Allowed'
+
+    @mock.patch('signer.signer_service.settings.MAX_DICTIONARY_FRAMES', 2)
+    def test_upload_invalid(self):
+        for body in ({}, {'frames': []}, {'frames': ['foo', 1]}, ['foo']):
+            srmock, content = simulate_request('/dictionaries', body)
+            assert srmock.status == '400 Bad Request'
+
+        srmock, content = self.upload(['a', 'b', 'c'])
+        assert srmock.status == '413 Payload Too Large'
+        assert content['title'] == 'Too many frames'
+
+    def test_sign(self):
+        dictionary_id = self.upload()[1]['id']
+
+        srmock, content = simulate_request(
+            '/sign',
+            {'frames': [0, 1, 'foo']},
+            query_string='dictionary={}'.format(dictionary_id),
+        )
+        assert srmock.status == '200 OK'
+        assert json.loads(content.decode('utf-8'))['signature'] == (
+            'mozilla::ipc::MessageChannel::Send | foo'
+        )
+        etag = dict(srmock.headers)['etag']
+
+        # Decoded frames give the same signature, under another key.
+        srmock, content = simulate_request(
+            '/sign',
+            {'frames': self.frames + ['foo']},
+        )
+        assert json.loads(content.decode('utf-8'))['signature'] == (
+            'mozilla::ipc::MessageChannel::Send | foo'
+        )
+        assert dict(srmock.headers)['etag'] != etag
+
+    def test_sign_errors(self):
+        dictionary_id = self.upload()[1]['id']
+
+        srmock, content = simulate_request(
+            '/sign',
+            {'frames': [0, 1]},
+            query_string='dictionary=unknown',
+        )
+        assert srmock.status == '400 Bad Request'
+        assert json.loads(content.decode('utf-8'))['title'] == (
+            'Unknown dictionary'
+        )
+
+        for frames in ([0, 2], [0, True], [0, -1]):
+            srmock, content = simulate_request(
+                '/sign',
+                {'frames': frames},
+                query_string='dictionary={}'.format(dictionary_id),
+            )
+            assert srmock.status == '400 Bad Request'
+            assert json.loads(content.decode('utf-8'))['title'] == (
+                'Invalid frames'
+            )
+
+        # Ids need a dictionary.
+        srmock, content = simulate_request('/sign', {'frames': [0, 1]})
+        assert srmock.status == '400 Bad Request'
+
+    def test_sign_batch(self):
+        dictionary_id = self.upload()[1]['id']
+        other_id = self.upload(['foo', 'bar'])[1]['id']
+
+        srmock, content = simulate_request(
+            '/sign/batch',
+            {'items': [
+                {'frames': [0, 1]},
+                {'frames': [0, 1], 'dictionary': other_id},
+                {'frames': [0, 1], 'dictionary': 'unknown'},
+            ]},
+            query_string='dictionary={}'.format(dictionary_id),
+        )
+        assert srmock.status == '200 OK'
+        results = [
+            json.loads(x) for x in content.decode('utf-8').splitlines()
+        ]
+        assert results[0]['signature'] == (
+            'mozilla::ipc::MessageChannel::Send'
+        )
+        assert results[1]['signature'] == 'foo'
+        assert results[2]['error']['title'] == 'Unknown dictionary'
+
+
+class TestJavaStackTraces(object):
+    trace = (
+        'java.lang.NullPointerException: oops in Foo@4054b560\n'
+        '\tat Foo.bar(Foo.java:42)\n'
+        '\tat Foo.baz(Foo.java:3)\n'
+    )
+    signature = (
+        'java.lang.NullPointerException: oops in Foo@<addr>: '
+        'at Foo.bar(Foo.java)'
+    )
+
+    def test_sign_field(self):
+        srmock, content = simulate_request(
+            '/sign',
+            {'java_stack_trace': self.trace},
+        )
+        assert srmock.status == '200 OK'
+        result = json.loads(content.decode('utf-8'))
+        assert result['signature'] == self.signature
+        assert result['language'] == 'java'
+        etag = dict(srmock.headers)['etag']
+
+        # Same frames, same result.
+        srmock, _ = simulate_request(
+            '/sign',
+            {'frames': [x.strip() for x in self.trace.splitlines()][:2]},
+            query_string='lang=java',
+        )
+        assert dict(srmock.headers)['etag'] == etag
+
+    def test_sign_text(self):
+        srmock, content = simulate_request(
+            '/sign',
+            self.trace.encode('utf-8'),
+            headers={'Content-Type': 'text/plain; charset=utf-8'},
+        )
+        assert srmock.status == '200 OK'
+        assert json.loads(content.decode('utf-8'))['signature'] == (
+            self.signature
+        )
+
+    def test_sign_text_read_lazily(self):
+        body = (self.trace + '\tat Foo.qux(Foo.java:1)\n' * 100000).encode(
+            'utf-8'
+        )
+        environ = testing.create_environ(
+            path='/sign',
+            method='POST',
+            headers={'Content-Type': 'text/plain'},
+            body=body,
+        )
+        srmock = testing.StartResponseMock()
+        content = b''.join(app(environ, srmock))
+
+        assert srmock.status == '200 OK'
+        assert json.loads(content.decode('utf-8'))['signature'] == (
+            self.signature
+        )
+        # Only the first chunk was read.
+        assert environ['wsgi.input'].tell() < len(body)
+
+    def test_errors(self):
+        srmock, content = simulate_request(
+            '/sign',
+            {'java_stack_trace': self.trace},
+            query_string='lang=c',
+        )
+        assert srmock.status == '400 Bad Request'
+        assert json.loads(content.decode('utf-8'))['title'] == (
+            'Unsupported stack trace'
+        )
+
+        srmock, content = simulate_request(
+            '/sign',
+            {'java_stack_trace': ['foo']},
+        )
+        assert json.loads(content.decode('utf-8'))['title'] == (
+            'Invalid stack trace'
+        )
+
+        srmock, content = simulate_request(
+            '/sign',
+            {'java_stack_trace': ' \n\n'},
+        )
+        assert json.loads(content.decode('utf-8'))['title'] == (
+            'Missing frames'
+        )
+
+        srmock, _ = simulate_request(
+            '/sign/batch',
+            self.trace.encode('utf-8'),
+            headers={'Content-Type': 'text/plain'},
+        )
+        assert srmock.status == '415 Unsupported Media Type'
+
+    def test_sign_batch(self):
+        srmock, content = simulate_request('/sign/batch', {'items': [
+            {'java_stack_trace': self.trace},
+            {'frames': ['foo']},
+            {'java_stack_trace': self.trace, 'lang': 'c'},
+        ]})
+        results = [
+            json.loads(x) for x in content.decode('utf-8').splitlines()
+        ]
+        assert results[0]['signature'] == self.signature
+        assert results[1]['language'] == 'c'
+        assert results[2]['error']['title'] == 'Unsupported stack trace'
+
+
+class TestThreads(object):
+    threads = [
+        ['NtWaitForMultipleObjects', 'idle'],
+        ['foo', 'bar'],
+        [],
+        ['NtWaitForMultipleObjects', 'idle'],
+    ]
+
+    def test_sign(self):
+        srmock, content = simulate_request(
+            '/sign',
+            {'threads': self.threads, 'crashed_thread': 1},
+        )
+        assert srmock.status == '200 OK'
+        assert json.loads(content.decode('utf-8')) == {
+            'signature': 'foo',
+            'notes': [],
+            'language': 'c',
+            'siglists_version': siglists.get_package_siglists().version,
+        }
+        etag = dict(srmock.headers)['etag']
+
+        # The same as signing the crashed thread only.
+        srmock, _ = simulate_request(
+            '/sign',
+            {'frames': ['foo', 'bar']},
+            query_string='crashed_thread=1',
+        )
+        assert dict(srmock.headers)['etag'] == etag
+
+        srmock, content = simulate_request(
+            '/sign',
+            {'threads': self.threads},
+            query_string='crashed_thread=3',
+        )
+        assert json.loads(content.decode('utf-8'))['signature'] == 'idle'
+
+    def test_sign_all_threads(self):
+        srmock, content = simulate_request(
+            '/sign',
+            {'threads': self.threads, 'crashed_thread': 1},
+            query_string='all_threads=true',
+        )
+        assert srmock.status == '200 OK'
+        result = json.loads(content.decode('utf-8'))
+        assert result['signature'] == 'foo'
+        assert [x.get('signature') for x in result['threads']] == [
+            'idle', 'foo', None, 'idle'
+        ]
+        assert result['threads'][2]['error']['title'] == 'Missing frames'
+        etag = dict(srmock.headers)['etag']
+
+        srmock, content = simulate_request(
+            '/sign',
+            {'threads': self.threads, 'crashed_thread': 1, 'all_threads': 1},
+        )
+        assert json.loads(content.decode('utf-8')) == result
+        assert dict(srmock.headers)['etag'] == etag
+
+    def test_sign_all_threads_shared(self):
+        service = SignerService(tools=SignatureToolRegistry())
+        tool = service.tools.get('c')
+        threads = [['foo', 'bar'], ['bar'], ['foo', 'bar']]
+
+        with mock.patch.object(
+            tool, '_classify', wraps=tool._classify
+        ) as m_classify:
+            result = service.get_threads_result(
+                tool, 'c', threads, 0, 'key'
+            )
+        assert [x['signature'] for x in result['threads']] == [
+            'foo', 'bar', 'foo'
+        ]
+        # Each frame is classified once.
+        assert m_classify.call_count == 2
+
+        # Each thread is cached like when signed alone.
+        assert service.sign('c', ['bar'], 1)['signature'] == 'bar'
+        assert service.results.stats()['hits'] == 1
+
+    def test_sign_all_threads_batch(self):
+        service = SignerService(tools=SignatureToolRegistry())
+        tool = service.tools.get('c')
+        threads = [['foo', 'bar'], ['bar'], ['baz']]
+        service.sign('c', ['bar'], 1)
+
+        with mock.patch.object(
+            tool, 'generate_batch', wraps=tool.generate_batch
+        ) as m_generate_batch, mock.patch(
+            'signer.signer_service.metrics.inc'
+        ) as m_inc:
+            result = service.get_threads_result(
+                tool, 'c', threads, 0, 'key'
+            )
+        assert [x['signature'] for x in result['threads']] == [
+            'foo', 'bar', 'baz'
+        ]
+        # Threads already signed alone are not signed again.
+        m_generate_batch.assert_called_once_with(
+            [['foo', 'bar'], ['baz']], [0, 2], None, None
+        )
+        # One signature per request.
+        m_inc.assert_called_once_with('signatures', 'c')
+
+    def test_sign_all_threads_deadline(self):
+        service = SignerService(tools=SignatureToolRegistry())
+        tool = service.tools.get('c')
+        threads = [['Abort'] * 99, ['foo']]
+
+        result = service.get_threads_result(
+            tool, 'c', threads, 1, 'key', deadline=0
+        )
+        assert result['signature'] == 'foo'
+        assert result['threads'][0]['notes'] == [DEADLINE_NOTE]
+
+        # Partial results are not cached.
+        assert service.results.get('key') is None
+        assert service.sign('c', ['foo'], 1)['signature'] == 'foo'
+        assert service.results.stats()['hits'] == 1
+
+    def test_errors(self):
+        for body, query_string, title in (
+            ({'threads': [], 'crashed_thread': 0}, '', 'Invalid threads'),
+            ({'threads': 'foo', 'crashed_thread': 0}, '', 'Invalid threads'),
+            ({'threads': [['foo']]}, '', 'Invalid crashed thread'),
+            ({'threads': [['foo']]}, 'crashed_thread=a',
+             'Invalid crashed thread'),
+            ({'threads': [['foo']], 'crashed_thread': 1}, '',
+             'Invalid crashed thread'),
+            ({'threads': [['foo']], 'crashed_thread': True}, '',
+             'Invalid crashed thread'),
+            ({'threads': [[]], 'crashed_thread': 0}, '', 'Missing frames'),
+        ):
+            srmock, content = simulate_request('/sign', body, query_string)
+            assert srmock.status == '400 Bad Request'
+            assert json.loads(content.decode('utf-8'))['title'] == title
+
+    @mock.patch('signer.signer_service.settings.MAX_THREADS', 2)
+    def test_too_many_threads(self):
+        srmock, content = simulate_request(
+            '/sign',
+            {'threads': [['foo']] * 3, 'crashed_thread': 0},
+        )
+        assert srmock.status == '413 Payload Too Large'
@@ -0,0 +1,5 @@
+"""The WSGI application, for servers: `gunicorn signer.wsgi:app`. """
+from signer.app import create_app
+
+
+app = create_app()